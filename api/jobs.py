@@ -0,0 +1,135 @@
+import asyncio
+import os
+from typing import Optional
+from api.pipeline import FilingPipeline
+from classify.rules import compile_rules
+from data import jobs
+
+DEFAULT_JOB_CONCURRENCY = 16
+DEFAULT_JOB_POLL_SECONDS = 5.0
+
+
+class JobRunner:
+    """
+    Background worker for queued jobs.
+
+    Jobs and their items live in the results database, so the queue survives a restart:
+    on `start()` items a previous process left running go back to pending and unfinished
+    jobs are picked up again. Jobs run one at a time, oldest first; within a job up to
+    JOB_CONCURRENCY items are in flight, each going through the usual FilingPipeline
+    stages (and their limits). Every item's outcome is written as soon as it finishes.
+    """
+
+    def __init__(self, concurrency: int = None, poll_seconds: float = None):
+        self.concurrency = max(1, int(concurrency or os.getenv("JOB_CONCURRENCY", DEFAULT_JOB_CONCURRENCY)))
+        self.poll_seconds = float(poll_seconds or os.getenv("JOB_POLL_SECONDS", DEFAULT_JOB_POLL_SECONDS))
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[str] = None
+        self._items = set()
+
+    async def start(self) -> None:
+        recovered = await asyncio.to_thread(jobs.recover_jobs)
+        if recovered:
+            print(f"Re-queued {recovered} job items interrupted by the last shutdown")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop working. Items in flight stay 'running' and are re-queued by the next start()."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the worker after a job was queued."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job; its items in flight are stopped. Returns False if it had already finished."""
+        cancelled = await asyncio.to_thread(jobs.cancel_job, job_id)
+        if cancelled and self._current == job_id:
+            self._current = None
+            for task in list(self._items):
+                task.cancel()
+        return cancelled
+
+    async def _loop(self) -> None:
+        while True:
+            job = await asyncio.to_thread(jobs.next_job)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving other jobs; this one stays queued/running and is retried
+                print(f"Job {job['id']} failed: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _run_job(self, job: dict) -> None:
+        job_id = job['id']
+        if not await asyncio.to_thread(jobs.set_job_status, job_id, jobs.RUNNING, (jobs.QUEUED, jobs.RUNNING)):
+            return
+        # Jobs store the event configuration (older ones just the list of event types)
+        events = job['events']
+        rules = compile_rules(events) if isinstance(events, dict) else None
+        pipeline = FilingPipeline(list(events), job['template'], config_version=job['config_version'], durable=True,
+                                  rules=rules)
+        limit = asyncio.Semaphore(self.concurrency)
+        self._current = job_id
+        try:
+            items = await asyncio.to_thread(jobs.pending_items, job_id)
+            for position, url in items:
+                await limit.acquire()
+                if self._current != job_id:
+                    limit.release()
+                    break
+                task = asyncio.create_task(self._run_item(pipeline, job_id, position, url))
+                self._items.add(task)
+                task.add_done_callback(lambda t: (self._items.discard(t), limit.release()))
+            if self._items:
+                await asyncio.gather(*self._items, return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in list(self._items):
+                task.cancel()
+            raise
+        finally:
+            self._current = None
+        await asyncio.to_thread(jobs.finish_job, job_id)
+
+    async def _run_item(self, pipeline: FilingPipeline, job_id: str, position: int, url: str) -> None:
+        await asyncio.to_thread(jobs.mark_item, job_id, position, jobs.RUNNING)
+        try:
+            record = await pipeline.process(url)
+        except asyncio.CancelledError:
+            # A cancelled job already marked its items; on shutdown the item stays
+            # 'running' so the next start re-queues it
+            raise
+        except Exception as e:
+            await asyncio.to_thread(jobs.mark_item, job_id, position, jobs.FAILED, None, f"{type(e).__name__}: {e}")
+            return
+        await asyncio.to_thread(jobs.mark_item, job_id, position, jobs.DONE, record['id'])
+
+
+_runner = None
+
+
+def get_runner() -> JobRunner:
+    """Return the process-wide job runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    return _runner
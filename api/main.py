@@ -1,10 +1,33 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from api.jobs import get_runner
 from api.routes import router
+from classify.llm_client import get_backend, warm_up
+from data.migrations import migrate
+from data.writer import get_writer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring the results database to the latest schema version
+    await asyncio.to_thread(migrate)
+    # Load the model before the first request so it doesn't pay the load time
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        print(f"LLM warm-up failed: {e}")
+    # Resume jobs left unfinished by the last run and start taking new ones
+    await get_runner().start()
+    yield
+    await get_runner().stop()
+    # Write out results still queued in the write-behind writer
+    await asyncio.to_thread(get_writer().close)
+    get_backend().close()
 
 def create_app() -> FastAPI:
-    app = FastAPI()
-    
+    app = FastAPI(lifespan=lifespan)
+
     # Add CORS middleware with more permissive settings
     app.add_middleware(
         CORSMiddleware,
@@ -14,7 +37,7 @@ def create_app() -> FastAPI:
         allow_headers=["*"],  # Allow all headers
         expose_headers=["*"]  # Expose all headers
     )
-    
+
     app.include_router(router)
     return app
 
@@ -0,0 +1,282 @@
+import asyncio
+import os
+import re
+import uuid
+import weakref
+from datetime import timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from classify.classify import AUTO_TEMPLATE, answer_path, classify_with_template
+from classify.llm_client import resolve_model
+from classify.rules import RuleSet
+from classify.validator import ClassificationResult
+from data.db import find_reusable_result
+from data.models import utcnow
+from data.writer import get_writer
+from ingestion.ingest import fetch_filing
+from ingestion.parse import extract_text_from_html
+from telemetry.metrics import labels, span
+from telemetry.profiling import current_session, profiled
+
+# Per-stage concurrency limits, overridable through the environment
+DEFAULT_STAGE_LIMITS = {
+    "download": 4,
+    "parse": os.cpu_count() or 2,
+    "llm": 1,
+    "db": 1,
+}
+
+DEFAULT_REUSE_MAX_AGE = 86400
+
+def stage_limits() -> dict:
+    """Read per-stage concurrency limits (BATCH_<STAGE>_CONCURRENCY) from the environment."""
+    return {
+        stage: max(1, int(os.getenv(f"BATCH_{stage.upper()}_CONCURRENCY", default)))
+        for stage, default in DEFAULT_STAGE_LIMITS.items()
+    }
+
+# Stage semaphores shared by every pipeline on an event loop, so the limits hold server-wide
+_stage_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+def stage_semaphores() -> Dict[str, asyncio.Semaphore]:
+    """Return the running loop's shared stage semaphores, created from stage_limits() on first use."""
+    loop = asyncio.get_running_loop()
+    semaphores = _stage_semaphores.get(loop)
+    if semaphores is None:
+        semaphores = _stage_semaphores[loop] = {stage: asyncio.Semaphore(limit) for stage, limit in stage_limits().items()}
+    return semaphores
+
+def extract_company_name(text):
+    # Try to find the line before (Exact name of Registrant as specified in its charter)
+    match = re.search(r'([A-Za-z0-9 .,&\-]+)\s*\(Exact name of Registrant as specified in its charter\)', text)
+    if match:
+        return match.group(1).strip()
+    # Common company suffixes
+    suffixes = r'(Inc\.|Corporation|Corp\.|LLC|Ltd\.|Co\.|Limited|Incorporated)'
+    # Fallback: first line ending with a company suffix
+    match = re.search(rf'^([A-Za-z0-9 .,&\-]+{suffixes})$', text, re.MULTILINE)
+    if match:
+        return match.group(1).strip()
+    # Fallback: first occurrence in text
+    match = re.search(rf'([A-Za-z0-9 .,&\-]+{suffixes})', text)
+    if match:
+        return match.group(1).strip()
+    return 'Unknown'
+
+def template_display_name(template: str) -> str:
+    # Map template to human-readable name
+    if template == AUTO_TEMPLATE:
+        return 'Auto'
+    return 'Chain-of-Thought' if template == 'cot.tpl' else 'Zero-Shot'
+
+def company_name(filing_text: str) -> str:
+    with span("company"):
+        return profiled(extract_company_name, filing_text)
+
+def parse_filing(html_path: str) -> str:
+    # The extractor already collapses whitespace while streaming
+    return extract_text_from_html(html_path)
+
+def classify_filing(filing_text: str, allowed_events: List[str], template: str,
+                    rules: RuleSet = None) -> ClassificationResult:
+    """Classify a filing with the rules or the LLM and validate the output (with bounded repairs and retries)."""
+    return classify_with_template(filing_text, allowed_events, template, rules=rules)
+
+def store_result(row: dict, durable: bool = None) -> None:
+    """Hand a result row to the write-behind writer (waits for the commit when durable)."""
+    get_writer().submit(row, durable)
+
+def reuse_max_age() -> int:
+    """Default freshness window, in seconds, for re-using stored results (RESULT_REUSE_MAX_AGE)."""
+    return int(os.getenv("RESULT_REUSE_MAX_AGE", DEFAULT_REUSE_MAX_AGE))
+
+def find_reusable(url: str, template: str, model: Optional[str], config_version: str,
+                  max_age: float) -> Optional[dict]:
+    """A stored valid result for this filing and settings no older than max_age seconds, as a record."""
+    # A matching row may still be queued in the write-behind writer
+    get_writer().flush()
+    result = find_reusable_result(url, template_display_name(template), model,
+                                  config_version, utcnow() - timedelta(seconds=max_age))
+    if result is None:
+        return None
+    return {
+        'id': result.id,
+        'url': result.url,
+        'model_output': result.model_output,
+        'validation': result.validation,
+        'company': result.company,
+        'retries': result.retries,
+        'repairs': result.repairs,
+        'reused': True,
+    }
+
+class SingleFlight:
+    """
+    Share one execution between concurrent callers with the same key.
+
+    The first caller starts the work; callers arriving while it runs await the same task
+    and get the same result (or exception). A caller that is cancelled only stops waiting;
+    the work is cancelled when its last waiter is gone.
+    """
+
+    def __init__(self):
+        # key -> [task, number of callers waiting on it]
+        self._inflight: Dict[tuple, list] = {}
+        self.executions = 0
+        self.shared = 0
+
+    async def run(self, key: tuple, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """
+        Returns:
+            tuple: (result, whether it came from another caller's execution)
+        """
+        entry = self._inflight.get(key)
+        shared = entry is not None
+        if shared:
+            self.shared += 1
+        else:
+            entry = self._inflight[key] = [asyncio.ensure_future(fn()), 0]
+            entry[0].add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is entry else None)
+            self.executions += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def stats(self) -> dict:
+        return {'in_flight': len(self._inflight), 'executions': self.executions, 'shared': self.shared}
+
+# Identical filings being processed right now, across requests, batches and jobs
+inflight = SingleFlight()
+
+class FilingPipeline:
+    """
+    Staged download -> parse -> LLM -> persist pipeline.
+
+    Each stage runs in worker threads behind its own semaphore, so downloads, parsing and
+    LLM calls for different filings overlap while each stage stays within its limit. The
+    semaphores are shared by all pipelines (requests, batches and jobs) unless `limits`
+    gives this pipeline its own for some stages.
+    """
+
+    def __init__(self, allowed_events: List[str], template: str = 'zero_shot.tpl', limits: dict = None,
+                 config_version: str = None, durable: bool = None, reuse_max_age: float = None,
+                 rules: RuleSet = None):
+        self.allowed_events = allowed_events
+        # Pre-classifier answering unambiguous filings without the LLM
+        self.rules = rules
+        self.template = template
+        self.config_version = config_version
+        # None follows RESULTS_DURABLE; True waits for each result's commit
+        self.durable = durable
+        # Seconds within which a stored result for the same filing is returned instead (None: off)
+        self.reuse_max_age = reuse_max_age
+        # Stages with a limit of their own for this pipeline (semaphores created on first use)
+        self.limits = limits or {}
+        self._own_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, stage: str) -> asyncio.Semaphore:
+        if stage not in self.limits:
+            return stage_semaphores()[stage]
+        if stage not in self._own_semaphores:
+            self._own_semaphores[stage] = asyncio.Semaphore(self.limits[stage])
+        return self._own_semaphores[stage]
+
+    async def _stage(self, stage, fn, *args):
+        async with self._semaphore(stage):
+            # profiled() runs fn under the request's profiler when it is being profiled
+            return await asyncio.to_thread(profiled, fn, *args)
+
+    async def process(self, url: str) -> dict:
+        """
+        Run one filing through every stage and return its result record.
+
+        A filing already being processed with the same template, model and event
+        configuration is joined rather than run again, so both callers get the same
+        record and one row is written. With `reuse_max_age`, a fresh stored result is
+        returned (marked 'reused') without downloading anything.
+        """
+        # The model the LLM backend answers with (LLM_BACKENDS members may serve different ones)
+        model = resolve_model()
+        if self.reuse_max_age:
+            stored = await self._stage("db", find_reusable, url, self.template, model, self.config_version,
+                                       self.reuse_max_age)
+            if stored:
+                return stored
+        key = (url, self.template, model, self.config_version or tuple(self.allowed_events))
+        # Spans of every stage of this filing (in worker threads too) carry its template and model
+        with labels(template=self.template, model=model or ""):
+            if current_session() is not None:
+                # A profiled filing is run on its own so that its stages land in its profile
+                record, shared = await self._process(url, model), False
+            else:
+                record, shared = await inflight.run(key, lambda: self._process(url, model))
+        if shared and self.durable:
+            # The row was handed to the writer by the caller that ran it, which may not wait for the commit
+            await asyncio.to_thread(get_writer().flush)
+        return dict(record)
+
+    async def _process(self, url: str, model: Optional[str] = None) -> dict:
+        html_path = await self._stage("download", fetch_filing, url)
+        filing_text = await self._stage("parse", parse_filing, html_path)
+        result = await self._stage("llm", classify_filing, filing_text, self.allowed_events, self.template, self.rules)
+        req_id = str(uuid.uuid4())
+        record = {
+            'id': req_id,
+            'url': url,
+            'model_output': result.output,
+            'validation': str(result.valid).lower(),
+            'company': company_name(filing_text)
+        }
+        row = dict(
+            record,
+            template=template_display_name(self.template),
+            # Rule answers involve no LLM; they are stored under the configured model
+            model=result.model or model,
+            config_version=self.config_version,
+            retries=result.retries,
+            repairs=result.repairs,
+            answered_by=answer_path(result),
+            escalation=result.escalation,
+        )
+        await self._stage("db", store_result, row, self.durable)
+        record.update(retries=result.retries, repairs=result.repairs, source=result.source,
+                      answered_by=row['answered_by'], escalation=result.escalation)
+        return record
+
+    async def run(self, urls: List[str]) -> List[dict]:
+        """Process all URLs concurrently. Results keep the input order."""
+        tasks = [asyncio.create_task(self.process(url)) for url in urls]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def stream(self, urls: List[str]) -> AsyncIterator[dict]:
+        """
+        Process all URLs concurrently and yield each record as soon as it is stored, in
+        completion order. Records carry the `index` of their URL; a filing that fails yields
+        {'index', 'url', 'error'} instead of ending the stream. Closing the iterator cancels
+        the filings still in progress.
+        """
+        async def run(index, url):
+            try:
+                return dict(await self.process(url), index=index)
+            except Exception as e:
+                return {'index': index, 'url': url, 'error': f"{type(e).__name__}: {e}"}
+
+        tasks = [asyncio.create_task(run(i, url)) for i, url in enumerate(urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,142 +1,261 @@
-from fastapi import APIRouter, HTTPException, Query, status
-from pydantic import BaseModel
-from typing import List, Optional
-from data.db import Session, Result, get_result_by_id, get_results_by_url, result_to_dict, insert_result
-from classify.classify import classify_event
-from ingestion.ingest import download_8k
-from ingestion.parse import extract_text_from_html
-import os
-import uuid
+import asyncio
 import json
+import time
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from data.db import Session, Result, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_result_by_id, get_results_by_url, head_cursor, list_results, list_results_since, result_to_dict
+from api.pipeline import FilingPipeline, reuse_max_age
+from api.jobs import get_runner
+from data import jobs
+from data.writer import get_writer
+from classify.cache import get_cache
+from classify.rules import compile_rules
+from classify.llm_client import get_backend
 from config.config import EventConfig
-import re
+from telemetry.metrics import get_metrics, observe
+from telemetry.profiling import aprofile_request
+
+class TimedRoute(APIRoute):
+    """Times every request into http_request_seconds{method, route, status} (streams until the response starts)."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
 
-router = APIRouter()
+        async def timed_handler(request: Request) -> Response:
+            start = time.perf_counter()
+            status_code = 500
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                observe("http_request_seconds", time.perf_counter() - start,
+                        method=request.method, route=self.path, status=str(status_code))
+        return timed_handler
+
+router = APIRouter(route_class=TimedRoute)
+
+# 'auto' runs zero-shot first and escalates to CoT only when the answer is doubtful
+Template = Literal['zero_shot.tpl', 'cot.tpl', 'auto']
 
 class ClassificationRequest(BaseModel):
     url: str
-    template: str = 'zero_shot.tpl'
+    template: Template = 'zero_shot.tpl'
     config: Optional[str] = None
+    # Return a stored result for the same filing and settings instead of classifying again
+    reuse: bool = False
+    max_age: Optional[int] = None
 
 class BatchRequest(BaseModel):
     urls: List[str]
-    template: str = 'zero_shot.tpl'
+    template: Template = 'zero_shot.tpl'
     config: Optional[str] = None
+    reuse: bool = False
+    max_age: Optional[int] = None
+
+def _reuse_window(req) -> Optional[int]:
+    if not req.reuse:
+        return None
+    return req.max_age if req.max_age is not None else reuse_max_age()
+
+PROFILE_QUERY = Query(False, description="Profile this request (same as header 'X-Profile: 1'); "
+                                          "the report path is returned in X-Profile-Report")
 
-def clean_filing_text(text):
-    return re.sub(r'\s+', ' ', text).strip()
-
-def extract_company_name(text):
-    # Try to find the line before (Exact name of Registrant as specified in its charter)
-    match = re.search(r'([A-Za-z0-9 .,&\-]+)\s*\(Exact name of Registrant as specified in its charter\)', text)
-    if match:
-        return match.group(1).strip()
-    # Common company suffixes
-    suffixes = r'(Inc\.|Corporation|Corp\.|LLC|Ltd\.|Co\.|Limited|Incorporated)'
-    # Fallback: first line ending with a company suffix
-    match = re.search(rf'^([A-Za-z0-9 .,&\-]+{suffixes})$', text, re.MULTILINE)
-    if match:
-        return match.group(1).strip()
-    # Fallback: first occurrence in text
-    match = re.search(rf'([A-Za-z0-9 .,&\-]+{suffixes})', text)
-    if match:
-        return match.group(1).strip()
-    return 'Unknown'
+def _profile_requested(request: Request, profile: bool) -> bool:
+    return profile or request.headers.get("X-Profile", "").lower() in ("1", "true", "on", "yes")
 
 @router.post("/classify/")
-async def classify(req: ClassificationRequest):
+async def classify(req: ClassificationRequest, request: Request, response: Response, profile: bool = PROFILE_QUERY):
     """Classify a single SEC filing."""
     print("TEMPLATE RECEIVED FROM FRONTEND:", req.template)
-    print("USE_COT FLAG:", req.template == 'cot.tpl')
-    DATA_DIR = "data/filings"
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filename = req.url.split('/')[-1]
-    html_path = os.path.join(DATA_DIR, filename)
-    download_8k(req.url, html_path)
-    raw_text = extract_text_from_html(html_path)
-    filing_text = clean_filing_text(raw_text)
     config = EventConfig(req.config)
     allowed_events = config.get_event_types()
-    result = classify_event(filing_text, allowed_events, req.template == 'cot.tpl')
-    if req.template == 'zero_shot.tpl':
-        from classify.validator import validate_zero_shot
-        validation = validate_zero_shot(result, allowed_events)
-    else:
-        from classify.validator import validate_cot
-        validation = validate_cot(result, allowed_events)
-    try:
-        parsed_output = json.loads(result)
-    except Exception:
-        parsed_output = result
-    req_id = str(uuid.uuid4())
-    company_name = extract_company_name(filing_text)
-    single_result = {
-        req_id: {
-            'id': req_id,
-            'url': req.url,
-            'model_output': parsed_output,
-            'validation': str(validation).lower(),
-            'company': company_name
-        }
-    }
-    # Map template to human-readable name
-    template_name = 'Chain-of-Thought' if req.template == 'cot.tpl' else 'Zero-Shot'
-    insert_result(id=req_id, url=req.url, model_output=parsed_output, validation=str(validation).lower(), company=company_name, template=template_name)
-    return single_result
+    pipeline = FilingPipeline(allowed_events, req.template, config_version=config.version,
+                              reuse_max_age=_reuse_window(req), rules=compile_rules(config.events))
+    async with aprofile_request("classify", _profile_requested(request, profile)) as session:
+        record = await pipeline.process(req.url)
+    if session is not None:
+        response.headers["X-Profile-Report"] = session.report_path
+    return {record['id']: record}
 
 @router.post("/batch/")
-async def batch(req: BatchRequest):
+async def batch(req: BatchRequest, request: Request, response: Response, profile: bool = PROFILE_QUERY):
     """Process multiple SEC filings in batch."""
-    DATA_DIR = "data/filings"
-    os.makedirs(DATA_DIR, exist_ok=True)
     config = EventConfig(req.config)
     allowed_events = config.get_event_types()
-    results = []
-    for url in req.urls:
-        filename = url.split('/')[-1]
-        html_path = os.path.join(DATA_DIR, filename)
-        download_8k(url, html_path)
-        raw_text = extract_text_from_html(html_path)
-        filing_text = clean_filing_text(raw_text)
-        result = classify_event(filing_text, allowed_events, req.template == 'cot.tpl')
-        if req.template == 'zero_shot.tpl':
-            from classify.validator import validate_zero_shot
-            validation = validate_zero_shot(result, allowed_events)
-        else:
-            from classify.validator import validate_cot
-            validation = validate_cot(result, allowed_events)
-        try:
-            parsed_output = json.loads(result)
-        except Exception:
-            parsed_output = result
-        req_id = str(uuid.uuid4())
-        company_name = extract_company_name(filing_text)
-        results.append({
-            'id': req_id,
-            'url': url,
-            'model_output': parsed_output,
-            'validation': str(validation).lower(),
-            'company': company_name
-        })
-        # Map template to human-readable name
-        template_name = 'Chain-of-Thought' if req.template == 'cot.tpl' else 'Zero-Shot'
-        insert_result(id=req_id, url=url, model_output=parsed_output, validation=str(validation).lower(), company=company_name, template=template_name)
-    return results
+    pipeline = FilingPipeline(allowed_events, req.template, config_version=config.version,
+                              reuse_max_age=_reuse_window(req), rules=compile_rules(config.events))
+    async with aprofile_request("batch", _profile_requested(request, profile)) as session:
+        records = await pipeline.run(req.urls)
+    if session is not None:
+        response.headers["X-Profile-Report"] = session.report_path
+    return records
+
+@router.post("/batch/stream")
+async def batch_stream(req: BatchRequest, request: Request):
+    """
+    Process multiple filings and stream each result as soon as it is validated and stored.
+    NDJSON by default (one record per line); Server-Sent Events with `Accept: text/event-stream`.
+    Records arrive in completion order and carry the `index` of their URL.
+    """
+    config = EventConfig(req.config)
+    pipeline = FilingPipeline(config.get_event_types(), req.template, config_version=config.version, durable=True,
+                              reuse_max_age=_reuse_window(req), rules=compile_rules(config.events))
+    sse = 'text/event-stream' in request.headers.get('accept', '')
+
+    async def body():
+        async for record in pipeline.stream(req.urls):
+            data = json.dumps(record)
+            yield f"event: result\ndata: {data}\n\n" if sse else data + "\n"
+        if sse:
+            yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type='text/event-stream' if sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(req: BatchRequest):
+    """Queue a batch as a background job and return its id right away."""
+    config = EventConfig(req.config)
+    job_id = await asyncio.to_thread(
+        jobs.create_job, req.urls, req.template, config.events, config.version
+    )
+    get_runner().notify()
+    return {'id': job_id, 'status': jobs.QUEUED, 'total': len(req.urls)}
+
+@router.get('/jobs')
+def list_jobs(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
+    return jobs.list_jobs(limit)
+
+@router.get('/jobs/{job_id}')
+def get_job(
+    job_id: str,
+    after: int = Query(-1, description="'next' from the previous response"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Job status, per-state item counts and the results finished so far (in submission order)."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job['results'], job['next'] = jobs.job_results(job_id, after, limit)
+    return job
+
+@router.post('/jobs/{job_id}/cancel')
+async def cancel_job(job_id: str):
+    if not await get_runner().cancel(job_id):
+        job = await asyncio.to_thread(jobs.get_job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    return {'id': job_id, 'status': jobs.CANCELLED}
+
+@router.get('/llm/backends')
+def llm_backends():
+    """Load, health and latency of each LLM backend (a single entry unless LLM_BACKENDS is set)."""
+    backend = get_backend()
+    if hasattr(backend, 'stats'):
+        return backend.stats()
+    return [{'name': getattr(backend, 'host', backend.name), 'healthy': True}]
+
+@router.get('/metrics')
+def metrics():
+    """Stage latency histograms and pipeline counters in the Prometheus text format."""
+    return Response(get_metrics().render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get('/cache/stats')
+def cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.stats()}
 
 @router.get('/results/{result_id}')
 def get_result(result_id: str):
     result = get_result_by_id(result_id)
+    if not result:
+        # It may still be queued in the write-behind writer
+        get_writer().flush()
+        result = get_result_by_id(result_id)
     if not result:
         raise HTTPException(status_code=404, detail="Result not found")
     return result_to_dict(result)
 
 @router.get('/results/all/')
-def get_all_results():
-    # print('get_all_results called')
-    session = Session()
-    results = session.query(Result).all()
-    session.close()
-    return [result_to_dict(r) for r in results]
+def get_all_results(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns (default: all but text)"),
+    url: Optional[str] = None,
+    company: Optional[str] = None,
+    template: Optional[str] = None,
+):
+    """
+    List results newest first, one page at a time.
+    The body stays a plain list; the cursor for the next page is in the X-Next-Cursor header.
+    The first page also sets X-Since-Cursor, to poll /results/since/ for rows stored after it.
+    """
+    if not cursor:
+        # Taken before listing, so a row stored meanwhile shows up twice rather than never
+        get_writer().flush()
+        response.headers['X-Since-Cursor'] = head_cursor() or ''
+    try:
+        results, next_cursor = list_results(
+            limit=limit,
+            cursor=cursor,
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+            url=url,
+            company=company,
+            template=template,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return results
+
+@router.get('/results/since/')
+def get_results_since(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Since-Cursor or X-Next-Cursor from the previous call"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns (default: all but text)"),
+    url: Optional[str] = None,
+    company: Optional[str] = None,
+    template: Optional[str] = None,
+):
+    """
+    Delta feed: results stored after the cursor, in commit order. Pass the returned
+    X-Next-Cursor on the next poll; a full page means more rows are waiting.
+    """
+    get_writer().flush()
+    try:
+        results, next_cursor = list_results_since(
+            cursor=cursor,
+            limit=limit,
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+            url=url,
+            company=company,
+            template=template,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return results
 
 @router.get('/results/by_url/')
 def get_results_by_url_endpoint(url: str = Query(..., description="Filing URL to search for")):
@@ -146,6 +265,7 @@ def get_results_by_url_endpoint(url: str = Query(..., description="Filing URL to
 
 @router.delete('/results/all/', status_code=status.HTTP_204_NO_CONTENT)
 def delete_all_results():
+    get_writer().flush()
     session = Session()
     session.query(Result).delete()
     session.commit()
@@ -154,6 +274,8 @@ def delete_all_results():
 
 @router.delete('/results/{result_id}', status_code=status.HTTP_204_NO_CONTENT)
 def delete_result(result_id: str):
+    # A just-returned result may still be queued in the write-behind writer
+    get_writer().flush()
     session = Session()
     result = get_result_by_id(result_id)
     if not result:
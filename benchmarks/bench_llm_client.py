@@ -0,0 +1,87 @@
+"""
+Latency comparison between the pooled HTTP Ollama backend and the `ollama run` subprocess path.
+
+Against a real Ollama install:
+    OLLAMA_MODEL=llama3.2:latest PYTHONPATH=. python benchmarks/bench_llm_client.py -n 20
+
+Without Ollama, `--stub` serves canned responses from a local HTTP stub and a fake `ollama`
+executable, which isolates the per-call transport overhead of each path:
+    PYTHONPATH=. python benchmarks/bench_llm_client.py --stub -n 200
+"""
+import argparse
+import json
+import os
+import statistics
+import stat
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from classify.llm_client import OllamaHTTPBackend, SubprocessBackend
+
+STUB_REPLY = '[{"Event Type": "Acquisition", "Relevant": true}]'
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        data = json.dumps({"response": STUB_REPLY, "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub(tmp_dir):
+    """Start the stub HTTP server and put a fake `ollama` CLI first on PATH."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    shim = os.path.join(tmp_dir, "ollama")
+    with open(shim, "w") as f:
+        f.write(f"#!{sys.executable}\nprint({STUB_REPLY!r})\n")
+    os.chmod(shim, os.stat(shim).st_mode | stat.S_IEXEC)
+    os.environ["PATH"] = tmp_dir + os.pathsep + os.environ["PATH"]
+    os.environ.setdefault("OLLAMA_MODEL", "stub")
+    return server
+
+def measure(backend, prompt, n):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        backend.generate(prompt)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<12} n={len(latencies):<5} mean={statistics.mean(latencies):9.2f}ms "
+          f"p50={statistics.median(latencies):9.2f}ms p95={p95:9.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP and subprocess LLM backend latency")
+    parser.add_argument("-n", type=int, default=20, help="Calls per backend")
+    parser.add_argument("--stub", action="store_true", help="Use a local stub server instead of Ollama")
+    parser.add_argument("--prompt-kb", type=int, default=8, help="Prompt size in KB (8-Ks are multi-KB)")
+    args = parser.parse_args()
+
+    prompt = ("The CEO purchased 10,000 shares of Apple stock on the open market. " * 16 * args.prompt_kb)[:args.prompt_kb * 1024]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        host = None
+        if args.stub:
+            server = start_stub(tmp_dir)
+            host = f"http://127.0.0.1:{server.server_port}"
+        http_backend = OllamaHTTPBackend(host=host)
+        http_backend.warm_up()
+        report("http", measure(http_backend, prompt, args.n))
+        report("subprocess", measure(SubprocessBackend(), prompt, args.n))
+        http_backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput and peak RSS of the streaming lxml extractor vs. the previous BeautifulSoup path.
+
+    PYTHONPATH=. python benchmarks/bench_parse.py                 # synthetic 8-K with iXBRL header
+    PYTHONPATH=. python benchmarks/bench_parse.py data/filings/*.htm
+
+Each implementation runs in a fresh process so peak RSS is not shared between them.
+The BeautifulSoup implementation is reproduced here exactly as the pipeline used it:
+html.parser + get_text(separator="\\n") followed by a whole-document whitespace regex.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+
+
+def bs4_extract(path):
+    from bs4 import BeautifulSoup
+    with open(path, 'rb') as f:
+        html = f.read()
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.get_text(separator="\n").strip()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def lxml_extract(path):
+    from ingestion.parse import extract_text_from_html
+    return extract_text_from_html(path)
+
+
+IMPLEMENTATIONS = {"bs4": bs4_extract, "lxml-stream": lxml_extract}
+
+
+def synthetic_filing(path, target_mb):
+    """Write an 8-K-shaped document: hidden iXBRL header, cover table, items and a big exhibit table."""
+    facts = "".join(f'<ix:nonNumeric name="dei:Fact{i}" contextRef="c{i}">value {i}</ix:nonNumeric>' for i in range(2000))
+    row = ("<tr><td style=\"font-family:Times New Roman;font-size:10pt\">Revenue&#160;segment</td>"
+           "<td style=\"text-align:right\">$&#160;1,234,567</td><td>(12.5)%</td></tr>\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<html><head><meta charset="utf-8"><style>td{padding:0}</style></head><body>')
+        f.write(f'<div style="display:none"><ix:header><ix:hidden>{facts}</ix:hidden></ix:header></div>')
+        f.write("<p>UNITED STATES SECURITIES AND EXCHANGE COMMISSION</p><p>FORM 8-K</p>")
+        f.write("<p>Apple Inc.</p><p>(Exact name of Registrant as specified in its charter)</p>")
+        f.write("<p><b>Item 5.02</b> Departure of Directors or Certain Officers.</p>")
+        f.write("<p>" + "The Board approved the appointment of a new Chief Financial Officer. " * 50 + "</p>")
+        f.write("<table>")
+        while f.tell() < target_mb * 1024 * 1024:
+            f.write(row * 500)
+        f.write("</table><script>var x = 1;</script></body></html>")
+
+
+def _run(name, paths, warm_path, queue):
+    fn = IMPLEMENTATIONS[name]
+    # Import parser modules on a tiny document so RSS growth reflects the real ones
+    fn(warm_path)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    chars = 0
+    for path in paths:
+        chars += len(fn(path))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_kb, baseline_kb, chars))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text extraction")
+    parser.add_argument("paths", nargs="*", help="Filing HTML files (default: a synthetic filing)")
+    parser.add_argument("--size-mb", type=float, default=8, help="Size of the synthetic filing")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = args.paths
+        if not paths:
+            paths = [os.path.join(tmp_dir, "synthetic_8k.htm")]
+            synthetic_filing(paths[0], args.size_mb)
+        warm_path = os.path.join(tmp_dir, "warm.htm")
+        with open(warm_path, "w", encoding="utf-8") as f:
+            f.write("<html><body><p>warm-up</p></body></html>")
+        total_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        print(f"{len(paths)} file(s), {total_mb:.1f} MB")
+        ctx = multiprocessing.get_context("spawn")
+        for name in IMPLEMENTATIONS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run, args=(name, paths, warm_path, queue))
+            proc.start()
+            elapsed, peak_kb, baseline_kb, chars = queue.get()
+            proc.join()
+            print(f"{name:<12} {total_mb / elapsed:8.2f} MB/s  {elapsed:7.2f}s  "
+                  f"peak RSS {peak_kb / 1024:8.1f} MB  (+{(peak_kb - baseline_kb) / 1024:.1f} MB for the documents)  "
+                  f"{chars} chars")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
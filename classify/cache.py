@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+DEFAULT_CACHE_PATH = "data/llm_cache.db"
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_key(model: str, template: str, events: List[str], text: str) -> str:
+    """
+    Content-addressed cache key for one classification.
+
+    Hashes everything that determines the prompt and the model that answers it, so a change
+    to the template file, the event list or the filing text never returns a stale answer.
+    """
+    h = hashlib.sha256()
+    for part in (model or "", template, json.dumps(list(events)), text):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache for LLM classification output.
+
+    An in-memory LRU sits in front of a SQLite table that survives restarts. The SQLite
+    tier is bounded by total value size; the least recently used rows are evicted first.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        # Memory hits since the last write; their disk recency is updated in the next put
+        self.touched = {}
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+        self.conn.commit()
+        self.disk_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _remember(self, key: str, value: str) -> None:
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.touched[key] = time.time()
+                self.memory_hits += 1
+                return self.memory[key]
+            row = self.conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            self._remember(key, value)
+            old = self.conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self.disk_bytes += size - (old[0] if old else 0)
+            if self.touched:
+                self.conn.executemany(
+                    "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                    [(ts, k) for k, ts in self.touched.items()],
+                )
+                self.touched.clear()
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        # Drop least recently used rows until the table fits in max_bytes
+        while self.disk_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.disk_bytes = 0
+                return
+            for key, size in rows:
+                if self.disk_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.memory.pop(key, None)
+                self.disk_bytes -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            self.touched.clear()
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+            self.disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self.memory),
+                "disk_entries": entries,
+                "disk_bytes": self.disk_bytes,
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMCache]:
+    """
+    Return the process-wide LLM cache, or None when disabled with LLM_CACHE=off.
+    """
+    global _cache
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES)),
+                    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                )
+    return _cache
@@ -0,0 +1,87 @@
+import os
+from typing import Any, List
+
+# Rough token estimate for English filings with Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+DEFAULT_CONTEXT_TOKENS = 8192
+# Room left in the context window for the model's answer
+DEFAULT_OUTPUT_RESERVE_TOKENS = 1024
+DEFAULT_OVERLAP_TOKENS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def text_token_budget(template: str) -> int:
+    """
+    Tokens available for filing text in one prompt built from `template`.
+    The context size comes from LLM_CONTEXT_TOKENS (default 8192).
+    """
+    context = int(os.getenv("LLM_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS))
+    reserve = int(os.getenv("LLM_OUTPUT_RESERVE_TOKENS", DEFAULT_OUTPUT_RESERVE_TOKENS))
+    return max(256, context - reserve - estimate_tokens(template))
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split text into chunks of at most `max_tokens` that overlap by about `overlap_tokens`.
+
+    Cuts prefer a sentence end, then whitespace, in the last fifth of each window, so an
+    event described across a boundary still appears whole in one of the chunks.
+    """
+    size = max_tokens * CHARS_PER_TOKEN
+    overlap = min(overlap_tokens * CHARS_PER_TOKEN, size // 4)
+    if len(text) <= size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            floor = start + size * 4 // 5
+            cut = text.rfind(". ", floor, end)
+            if cut == -1:
+                cut = text.rfind(" ", floor, end)
+            if cut != -1:
+                end = cut + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Start the next chunk on a word boundary
+        space = text.find(" ", start, end)
+        if space != -1:
+            start = space + 1
+    return [c for c in chunks if c]
+
+
+def _merge_events(event_lists: List[list]) -> list:
+    """Union of events across chunks, first-seen order, Relevant OR-ed per event type."""
+    merged = {}
+    for events in event_lists:
+        for event in events:
+            if not isinstance(event, dict) or "Event Type" not in event:
+                continue
+            key = event["Event Type"]
+            if key in merged:
+                merged[key]["Relevant"] = bool(merged[key].get("Relevant")) or bool(event.get("Relevant"))
+            else:
+                merged[key] = dict(event)
+    return list(merged.values())
+
+
+def merge_outputs(outputs: List[Any], use_cot: bool = False) -> Any:
+    """
+    Merge per-chunk model outputs into one output of the usual shape.
+    Zero-shot outputs are lists of events; CoT outputs are {"Reasoning", "Events"} objects.
+    """
+    if not use_cot:
+        return _merge_events([o for o in outputs if isinstance(o, list)])
+    reasoning = []
+    for output in outputs:
+        for step in output.get("Reasoning", []) if isinstance(output, dict) else []:
+            if step not in reasoning:
+                reasoning.append(step)
+    events = _merge_events([o.get("Events", []) for o in outputs if isinstance(o, dict)])
+    return {"Reasoning": reasoning, "Events": events}
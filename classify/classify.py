@@ -1,9 +1,32 @@
 import json
 import os
 import argparse
-from classify.llm_client import run_llama3
+import contextvars
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from classify.llm_client import resolve_model, run_llama3
+from classify.cache import get_cache, make_key
+from classify.extract import extract_facts
+from classify.chunking import chunk_text, estimate_tokens, merge_outputs, text_token_budget
+from classify.retrieval import DEFAULT_FEWSHOT_K, FEWSHOT_EXAMPLE_TOKENS, format_examples, get_index
+from classify.rules import RuleSet, compile_rules, relevance_rules_enabled, rule_output, rules_enabled
+from classify.templates import CompiledTemplate, get_template
 from config.config import EventConfig
-from classify.validator import extract_json_block
+from classify.validator import ClassificationResult, EventSchema, compile_schema, validate
+from ingestion.segment import substantive_text
+from telemetry.metrics import count, span
+from telemetry.profiling import profiled
+
+# Bounds on extra LLM calls for one prompt (overridable with LLM_MAX_REPAIRS / LLM_MAX_RETRIES)
+DEFAULT_MAX_REPAIRS = 2
+DEFAULT_MAX_RETRIES = 1
+# Longest bad output sent back in a repair prompt
+MAX_REPAIR_CHARS = 8000
+# Template names callers can choose; 'auto' runs zero-shot and escalates to CoT when needed
+AUTO_TEMPLATE = "auto"
+TEMPLATES = ("zero_shot.tpl", "cot.tpl", AUTO_TEMPLATE)
+# Zero-shot answers scoring below this (overridable with AUTO_MIN_CONFIDENCE) go on to CoT
+DEFAULT_AUTO_MIN_CONFIDENCE = 0.6
 
 def load_prompt(template_name: str) -> str:
     """
@@ -15,24 +38,280 @@ def load_prompt(template_name: str) -> str:
     Returns:
         str: The prompt template
     """
-    # Map template names to file names
-    template_files = {
-        "zero_shot.tpl": "zero_shot.tpl",
-        "cot.tpl": "cot.tpl"
-    }
-    
-    if template_name not in template_files:
-        raise ValueError(f"Unknown template: {template_name}")
-    
-    # Get the path to the prompts directory
-    prompts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
-    template_path = os.path.join(prompts_dir, template_files[template_name])
-    
-    # Read the template file
-    with open(template_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    # Templates are read and compiled once per process
+    return get_template(template_name).source
+
+def load_event_types(config_path: str = None) -> list[str]:
+    """
+    Load the configured event types.
+
+    Args:
+        config_path: Optional path to an event configuration file
+
+    Returns:
+        list: Event type names from the EventConfig
+    """
+    return EventConfig(config_path).get_event_types()
+
+def schema_enabled() -> bool:
+    """Constrain generation to the event JSON schema unless LLM_SCHEMA=off."""
+    return os.getenv("LLM_SCHEMA", "on").lower() not in ("off", "0", "false")
+
+def _repair_prompt(response: str, result: ClassificationResult, events: list[str], schema: EventSchema) -> str:
+    """
+    Prompt that sends only the invalid output back (not the filing) to be fixed.
+    """
+    problems = "\n".join(f"- {error}" for error in result.errors)
+    text = f"Problems:\n{problems}\n\nJSON:\n{response[:MAX_REPAIR_CHARS]}"
+    prompt = get_template("repair.tpl").render(text, events, schema=json.dumps(schema.json_schema))
+    prompt.accepts = schema.accepts
+    if schema_enabled():
+        prompt.schema = schema.json_schema
+    return prompt
+
+def _few_shot(template: CompiledTemplate, text: str, use_cot: bool) -> str:
+    """The retrieved examples for a template with an {examples} slot ('' otherwise)."""
+    if not template.has_examples:
+        return ""
+    k = int(os.getenv("FEWSHOT_K", DEFAULT_FEWSHOT_K))
+    return format_examples(get_index().search(text, k), use_cot)
+
+def _call_llm(prompt: str, kind: str, model: str = None) -> str:
+    count("llm_calls_total", kind=kind)
+    with span("llm"):
+        return run_llama3(prompt, model)
+
+def _validate(response: str, events: list[str], use_cot: bool) -> ClassificationResult:
+    with span("validate"):
+        result = validate(response, events, use_cot)
+    if not result.valid:
+        count("validation_failures_total")
+    return result
+
+def _classify_prompt(template: CompiledTemplate, text: str, events: list[str], use_cot: bool,
+                     model: str = None) -> ClassificationResult:
+    """
+    Run one prompt through the LLM (or the cache) and return the validated output.
+
+    Invalid output goes through up to LLM_MAX_REPAIRS repair passes that only resend the
+    output. If it is still not JSON, the full prompt is re-run up to LLM_MAX_RETRIES times.
+    """
+    examples = _few_shot(template, text, use_cot)
+    # The backend only sends the prompt to members serving this model
+    answering_model = resolve_model(model)
+    # Identical model, template, examples, events and text always produce the same prompt
+    cache = get_cache()
+    cache_key = make_key(answering_model or "", template.source + examples, events, text)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        count("llm_cache_requests_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            result = validate(json.loads(cached), events, use_cot)
+            result.model = answering_model
+            return result
+
+    schema = compile_schema(events, use_cot)
+    max_repairs = int(os.getenv("LLM_MAX_REPAIRS", DEFAULT_MAX_REPAIRS))
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+    retries = repairs = 0
+    while True:
+        # Static instructions and examples first, filing text last
+        with span("prompt"):
+            formatted_prompt = template.render(text, events, examples)
+            formatted_prompt.accepts = schema.accepts
+            if schema_enabled():
+                formatted_prompt.schema = schema.json_schema
+        # print("==== PROMPT SENT TO MODEL ====")
+        # print(formatted_prompt)
+        # print("==============================")
+
+        # Get LLM response and parse it once
+        response = _call_llm(formatted_prompt, "classify", model)
+        result = _validate(response, events, use_cot)
+        while not result.valid and repairs < max_repairs:
+            repairs += 1
+            response = _call_llm(_repair_prompt(response, result, events, schema), "repair", model)
+            result = _validate(response, events, use_cot)
+        if result.output is not None or retries >= max_retries:
+            break
+        retries += 1
+
+    result.retries, result.repairs, result.model = retries, repairs, answering_model
+    count("llm_retries_total", retries)
+    count("llm_repairs_total", repairs)
+    if result.output is None:
+        raise ValueError(f"Failed to parse model output as JSON after {retries} retries and {repairs} repairs: "
+                         f"{'; '.join(result.errors)}")
+    if cache is not None and result.valid:
+        cache.put(cache_key, json.dumps(result.output))
+    return result
+
+def _classify_llm(template: CompiledTemplate, text: str, events: list[str], use_cot: bool,
+                  chunked: bool = None, model: str = None) -> ClassificationResult:
+    """Classify with the LLM, as one prompt or (for long texts) chunk by chunk."""
+    budget = text_token_budget(template.source)
+    if template.has_examples:
+        budget = max(256, budget - int(os.getenv("FEWSHOT_K", DEFAULT_FEWSHOT_K)) * FEWSHOT_EXAMPLE_TOKENS)
+    if chunked is None:
+        chunked = estimate_tokens(text) > budget
+    if not chunked:
+        return _classify_prompt(template, text, events, use_cot, model)
+
+    # Map: classify every chunk concurrently; reduce: merge in chunk order
+    chunks = chunk_text(text, budget)
+    workers = min(len(chunks), int(os.getenv("LLM_CHUNK_CONCURRENCY", 4)))
+    # Chunk threads keep the caller's telemetry labels and profile session
+    contexts = [contextvars.copy_context() for _ in chunks]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(
+            lambda context, chunk: context.run(profiled, _classify_prompt, template, chunk, events, use_cot, model),
+            contexts, chunks))
+    merged = validate(merge_outputs([r.output for r in results], use_cot), events, use_cot)
+    merged.retries = sum(r.retries for r in results)
+    merged.repairs = sum(r.repairs for r in results)
+    merged.model = results[0].model
+    return merged
+
+def classify(text: str, events: list[str], use_cot: bool = False, segment: bool = True,
+             chunked: bool = None, rules: RuleSet = None, model: str = None) -> ClassificationResult:
+    """
+    Classify an event and validate the model output against the event schema.
+
+    Args:
+        text: The text to classify
+        events: List of possible event types
+        use_cot: Whether to use chain-of-thought prompting
+        segment: Send only the substantive 8-K Items (with item numbers as hints)
+        chunked: Split the text into overlapping chunks classified in parallel and merge
+            the results. None (default) chunks only when the text exceeds the context budget.
+        rules: Pre-classifier rules (compile_rules(config.events)); an unambiguous match is
+            returned without calling the LLM unless RULES_PRECLASSIFY=off. Their relevance
+            rules then override the relevance of the events found unless RELEVANCE_RULES=off.
+        model: Model to ask (default: the backend's default model)
+
+    Returns:
+        ClassificationResult: Parsed output and its validation outcome
+    """
+    # Load appropriate prompt template; CoT uses retrieved examples when the index is on
+    prompt_name = "zero_shot.tpl"
+    if use_cot:
+        prompt_name = "cot_fewshot.tpl" if get_index() is not None else "cot.tpl"
+    print("Prompt selected:", prompt_name)
+    template = get_template(prompt_name)
+
+    # Drop cover page, signatures and exhibit index; short texts pass through unchanged
+    if segment:
+        text, _ = substantive_text(text)
+
+    match = rules.match(text, events) if rules and rules_enabled() else None
+    if match is not None:
+        result = validate(rule_output(match, use_cot), events, use_cot)
+        result.source = "rules"
+    else:
+        result = _classify_llm(template, text, events, use_cot, chunked, model)
+
+    if rules and result.valid and relevance_rules_enabled():
+        # The cache keeps the model's own answer; the rules are applied after every read
+        output, changed = rules.apply_relevance(result.output, text, use_cot)
+        if changed:
+            result.output = output
+    result.template = prompt_name
+    return result
+
+def confidence(result: ClassificationResult, text: str, rules: RuleSet = None) -> float:
+    """
+    Heuristic confidence in [0, 1] of a valid answer. Each repair or retry the model needed
+    multiplies it by 0.7, and an event whose relevance rules leave it undecided (an amount
+    between the thresholds) halves it.
+    """
+    score = 0.7 ** (result.repairs + result.retries)
+    if rules and relevance_rules_enabled():
+        facts = extract_facts(text)
+        for event in result.events:
+            if rules.relevance_rules.get(event["Event Type"]) and rules.relevance_for(event["Event Type"], facts) is None:
+                score *= 0.5
+                break
+    return score
+
+def escalation_reason(result: ClassificationResult, text: str, rules: RuleSet = None) -> Optional[str]:
+    """
+    Why a zero-shot answer should be redone with CoT, or None to keep it: 'invalid' output,
+    'no events', an 'other' event, 'conflicting' relevance for one event type, or
+    'low confidence' (below AUTO_MIN_CONFIDENCE).
+    """
+    if not result.valid:
+        return "invalid"
+    events = result.events
+    if not events:
+        return "no events"
+    if any(event["Event Type"] == "Other" for event in events):
+        return "other"
+    relevance = {}
+    for event in events:
+        if relevance.setdefault(event["Event Type"], event["Relevant"]) != event["Relevant"]:
+            return "conflicting"
+    min_confidence = float(os.getenv("AUTO_MIN_CONFIDENCE", DEFAULT_AUTO_MIN_CONFIDENCE))
+    if confidence(result, text, rules) < min_confidence:
+        return "low confidence"
+    return None
+
+def classify_auto(text: str, events: list[str], segment: bool = True, chunked: bool = None,
+                  rules: RuleSet = None, model: str = None) -> ClassificationResult:
+    """
+    Classify with the cheap zero-shot prompt and escalate to CoT only when the answer is
+    doubtful (see escalation_reason). Rule answers are never escalated.
+
+    Returns:
+        ClassificationResult: The answer used; `template` says which prompt gave it and
+        `escalation` why CoT was needed (None when zero-shot answered)
+    """
+    if segment:
+        text, _ = substantive_text(text)
+    try:
+        first = classify(text, events, False, False, chunked, rules, model)
+        reason = None if first.source == "rules" else escalation_reason(first, text, rules)
+    except ValueError:
+        first, reason = None, "invalid"
+    if reason is None:
+        return first
+    try:
+        result = classify(text, events, True, False, chunked, rules, model)
+    except ValueError:
+        # Keep a usable zero-shot answer rather than failing the filing
+        if first is None or not first.valid:
+            raise
+        result = first
+    result.escalation = reason
+    if first is not None:
+        result.retries += first.retries
+        result.repairs += first.repairs
+    return result
+
+def answer_path(result: ClassificationResult) -> str:
+    """Display name of what answered: 'Rules', 'Chain-of-Thought' or 'Zero-Shot'."""
+    if result.source == "rules":
+        return "Rules"
+    return "Chain-of-Thought" if result.template and result.template.startswith("cot") else "Zero-Shot"
+
+def classify_with_template(text: str, events: list[str], template: str, segment: bool = True,
+                           chunked: bool = None, rules: RuleSet = None, model: str = None) -> ClassificationResult:
+    """
+    Classify with a template chosen by name: 'zero_shot.tpl', 'cot.tpl' or 'auto'.
+
+    Raises:
+        ValueError: For any other template name
+    """
+    if template not in TEMPLATES:
+        raise ValueError(f"Unknown template {template!r}; expected one of {', '.join(TEMPLATES)}")
+    if template == AUTO_TEMPLATE:
+        result = classify_auto(text, events, segment, chunked, rules, model)
+    else:
+        result = classify(text, events, template == "cot.tpl", segment, chunked, rules, model)
+    count("classifications_total", template=template, answered_by=answer_path(result), escalation=result.escalation or "")
+    return result
 
-def classify_event(text: str, events: list[str], use_cot: bool = False) -> dict:
+def classify_event(text: str, events: list[str], use_cot: bool = False, segment: bool = True,
+                   chunked: bool = None, rules: RuleSet = None, template: str = None):
     """
     Classify an event using either zero-shot or chain-of-thought prompting.
     
@@ -40,43 +319,26 @@ def classify_event(text: str, events: list[str], use_cot: bool = False) -> dict:
         text: The text to classify
         events: List of possible event types
         use_cot: Whether to use chain-of-thought prompting
+        segment: Send only the substantive 8-K Items (with item numbers as hints)
+        chunked: Split the text into overlapping chunks classified in parallel and merge
+            the results. None (default) chunks only when the text exceeds the context budget.
+        rules: Optional pre-classifier rules, see classify()
+        template: 'zero_shot.tpl', 'cot.tpl' or 'auto' (zero-shot first, CoT when needed);
+            overrides use_cot when given
         
     Returns:
-        dict: Classification result with event type and relevance
+        list or dict: Parsed model output (a list of events, or {"Reasoning", "Events"} for CoT)
     """
-    # Load appropriate prompt template
-    prompt_name = "cot.tpl" if use_cot else "zero_shot.tpl"
-    print("Prompt selected:", prompt_name)
-    prompt = load_prompt(prompt_name)
-    
-    # Format prompt with text and events
-    formatted_prompt = prompt.format(text=text, events=json.dumps(events))
-    # print("==== PROMPT SENT TO MODEL ====")
-    # print(formatted_prompt)
-    # print("==============================")
-    
-    # Get LLM response
-    response = run_llama3(formatted_prompt)
-    
-    # Try to parse the response as JSON
-    try:
-        # First try to parse the entire response
-        parsed = json.loads(response)
-        return json.dumps(parsed)
-    except json.JSONDecodeError:
-        # If that fails, try to extract a JSON block
-        try:
-            json_str = extract_json_block(response)
-            parsed = json.loads(json_str)
-            return json.dumps(parsed)
-        except Exception as e:
-            raise ValueError(f"Failed to parse model output as JSON: {str(e)}")
+    if template is not None:
+        return classify_with_template(text, events, template, segment, chunked, rules).output
+    return classify(text, events, use_cot, segment, chunked, rules).output
 
 def main():
     parser = argparse.ArgumentParser(description="Classify events from text")
     parser.add_argument("--text", required=True, help="Text to classify")
     parser.add_argument("--events", required=True, help="JSON array of possible event types")
     parser.add_argument("--use-cot", action="store_true", help="Use chain-of-thought prompting")
+    parser.add_argument("--template", choices=TEMPLATES, help="Template to use; 'auto' escalates from zero-shot to CoT when needed")
     parser.add_argument("--config", help="Path to event configuration file")
     args = parser.parse_args()
     
@@ -84,7 +346,8 @@ def main():
         # Use EventConfig to get event types
         config = EventConfig(args.config)
         events = config.get_event_types()
-        result = classify_event(args.text, events, args.use_cot)
+        result = classify_event(args.text, events, args.use_cot, rules=compile_rules(config.events),
+                                template=args.template)
         print(json.dumps(result, indent=2))
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,282 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from classify.classify import answer_path, classify_with_template
+from classify.extract import extract_facts
+from classify.llm_client import resolve_model
+from classify.rules import RuleSet
+from telemetry.metrics import labels
+from telemetry.profiling import profiled
+
+DEFAULT_EVAL_WORKERS = 4
+
+
+def example_key(example: Dict[str, Any], template: str, events: List[str], model: Optional[str] = None) -> str:
+    """Stable identifier of one example under one template, event list and requested model."""
+    digest = hashlib.sha256()
+    # Runs of the default model keep the keys they had before models could be chosen
+    for part in (template, json.dumps(events), example.get('filing_id', ''), example['text']) + ((model,) if model else ()):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def checkpoint_path(outputs_dir: str, template: str, examples: List[Dict[str, Any]], events: List[str],
+                    model: Optional[str] = None) -> str:
+    """Checkpoint file for one evaluation set, so a rerun of the same set finds it."""
+    digest = hashlib.sha256(json.dumps([template, events, examples] + ([model] if model else []),
+                                       sort_keys=True).encode('utf-8'))
+    name = os.path.splitext(template)[0]
+    return os.path.join(outputs_dir, f"eval_checkpoint_{name}_{digest.hexdigest()[:12]}.jsonl")
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of finished examples.
+
+    Every record is flushed and fsynced as soon as it is written, so a crash or
+    Ctrl-C loses at most the examples that were still running.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Records written by earlier runs, keyed by example key. A torn last line is ignored."""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record['key']] = record
+        return records
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def evaluate_example(example: Dict[str, Any], allowed_events: List[str], template: str,
+                     rules: Optional[RuleSet] = None, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Classify one ground-truth example and compare it with the expected answer.
+    LLM and parsing errors are returned in the record instead of raised.
+    """
+    start = time.perf_counter()
+    try:
+        with labels(template=template, model=resolve_model(model) or ""):
+            result = profiled(classify_with_template, example['text'], allowed_events, template, rules=rules,
+                              model=model)
+        error = None
+    except Exception as e:
+        result = None
+        error = f"{type(e).__name__}: {e}"
+    latency = time.perf_counter() - start
+
+    event = result.first_event if result else None
+    return {
+        'filing_id': example.get('filing_id', 'unknown'),
+        'text': example['text'],
+        'model_output': result.output if result else None,
+        'expected_event': example['expected_event'],
+        'expected_relevance': example['expected_relevance'],
+        'predicted_event': event.get('Event Type') if event else None,
+        'predicted_relevance': event.get('Relevant') if event else None,
+        'validation': result.valid if result else False,
+        'latency_seconds': round(latency, 4),
+        'retries': result.retries if result else 0,
+        'repairs': result.repairs if result else 0,
+        'source': result.source if result else None,
+        'answered_by': answer_path(result) if result else None,
+        'escalation': result.escalation if result else None,
+        'model': result.model if result else None,
+        'error': error,
+    }
+
+
+def run_evaluation(examples: List[Dict[str, Any]], allowed_events: List[str], template: str,
+                   workers: int = DEFAULT_EVAL_WORKERS, checkpoint: Optional[Checkpoint] = None,
+                   on_record=None, rules: Optional[RuleSet] = None,
+                   model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluate examples on a pool of worker threads.
+
+    Examples already present in `checkpoint` are not run again; each newly finished
+    example is appended to it. Examples that failed with an error are not
+    checkpointed, so a resumed run retries them.
+
+    Args:
+        examples: Ground-truth examples
+        allowed_events: List of allowed event types
+        template: 'zero_shot.tpl', 'cot.tpl' or 'auto'
+        workers: Number of examples classified concurrently
+        checkpoint: Optional checkpoint to resume from and write to
+        on_record: Optional callback called with (index, record) as examples finish
+        rules: Optional pre-classifier rules tried before the LLM
+        model: Model to ask (default: the backend's default model)
+
+    Returns:
+        list: One record per example, in input order
+    """
+    keys = [example_key(ex, template, allowed_events, model) for ex in examples]
+    done = checkpoint.load() if checkpoint else {}
+    records: List[Optional[Dict[str, Any]]] = [None] * len(examples)
+    pending = []
+    for i, key in enumerate(keys):
+        if key in done:
+            records[i] = dict(done[key], resumed=True)
+        else:
+            pending.append(i)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Each example runs in a copy of the caller's context (telemetry labels, profile session)
+        futures = {executor.submit(contextvars.copy_context().run, evaluate_example, examples[i], allowed_events, template,
+                                   rules, model): i
+                   for i in pending}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                record = dict(future.result(), key=keys[i])
+                records[i] = record
+                if checkpoint and record['error'] is None:
+                    checkpoint.append(record)
+                if on_record:
+                    on_record(i, record)
+        except BaseException:
+            # Ctrl-C: drop queued examples; finished ones are already checkpointed
+            for future in futures:
+                future.cancel()
+            raise
+    return records
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _accuracy(records: List[Dict[str, Any]], field: str) -> Optional[float]:
+    if not records:
+        return None
+    return sum(1 for r in records if r[f'predicted_{field}'] == r[f'expected_{field}']) / len(records)
+
+
+def rules_report(examples: List[Dict[str, Any]], allowed_events: List[str], rules: RuleSet,
+                 template: str = 'zero_shot.tpl', compare_llm: bool = True,
+                 workers: int = DEFAULT_EVAL_WORKERS, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    How the rule pre-classifier does on ground truth: which examples it answers, how often
+    it is right, and (with `compare_llm`) how often the LLM gives the same answer for them.
+
+    Returns:
+        dict: short_circuit_rate, accuracy against ground truth, llm_agreement and the
+        examples where rules and LLM disagree; relevance_decided and relevance_rule_accuracy
+        say how often the relevance rules decide the expected event's relevance, and how well
+    """
+    answered, decided = [], []
+    for example in examples:
+        match = rules.match(example['text'], allowed_events)
+        if match is not None:
+            answered.append((example, match))
+        relevant = rules.relevance_for(example['expected_event'], extract_facts(example['text']))
+        if relevant is not None:
+            decided.append(relevant == example['expected_relevance'])
+    report = {
+        'total': len(examples),
+        'answered': len(answered),
+        'short_circuit_rate': len(answered) / len(examples) if examples else 0.0,
+        'event_accuracy': (sum(1 for ex, m in answered if m.event_type == ex['expected_event']) / len(answered)
+                           if answered else None),
+        'relevance_accuracy': (sum(1 for ex, m in answered if m.relevant == ex['expected_relevance']) / len(answered)
+                               if answered else None),
+        'relevance_decided': len(decided),
+        'relevance_rule_accuracy': sum(decided) / len(decided) if decided else None,
+    }
+    if not compare_llm or not answered:
+        return report
+    # The same examples through the LLM alone
+    llm_records = run_evaluation([ex for ex, _ in answered], allowed_events, template, workers=workers, model=model)
+    disagreements = []
+    for (example, match), record in zip(answered, llm_records):
+        if (record['predicted_event'], record['predicted_relevance']) != (match.event_type, match.relevant):
+            disagreements.append({
+                'filing_id': example.get('filing_id', 'unknown'),
+                'rules': {'Event Type': match.event_type, 'Relevant': match.relevant, 'evidence': match.evidence},
+                'llm': {'Event Type': record['predicted_event'], 'Relevant': record['predicted_relevance']},
+                'error': record['error'],
+            })
+    report['llm_agreement'] = 1 - len(disagreements) / len(answered)
+    report['disagreements'] = disagreements
+    return report
+
+
+def summarize(records: List[Dict[str, Any]], allowed_events: List[str]) -> Dict[str, Any]:
+    """Accuracy, confusion matrix and latency summary over evaluated examples."""
+    total = len(records)
+    correct_event = sum(1 for r in records if r['predicted_event'] == r['expected_event'])
+    correct_relevance = sum(1 for r in records if r['predicted_relevance'] == r['expected_relevance'])
+    confusion_matrix = {event: {event: 0 for event in allowed_events} for event in allowed_events}
+    for r in records:
+        expected, predicted = r['expected_event'], r['predicted_event']
+        if expected in confusion_matrix and predicted in confusion_matrix[expected]:
+            confusion_matrix[expected][predicted] += 1
+    by_rules = [r for r in records if r.get('source') == 'rules']
+    escalated = [r for r in records if r.get('escalation')]
+    reasons: Dict[str, int] = {}
+    for r in escalated:
+        reasons[r['escalation']] = reasons.get(r['escalation'], 0) + 1
+    # Latency of work done in this run; resumed examples were timed by an earlier one
+    latencies = [r['latency_seconds'] for r in records if not r.get('resumed') and r['error'] is None]
+    return {
+        'total': total,
+        'event_accuracy': correct_event / total if total else 0.0,
+        'relevance_accuracy': correct_relevance / total if total else 0.0,
+        'confusion_matrix': confusion_matrix,
+        'errors': sum(1 for r in records if r['error'] is not None),
+        'retries': sum(r.get('retries', 0) for r in records),
+        'repairs': sum(r.get('repairs', 0) for r in records),
+        'resumed': sum(1 for r in records if r.get('resumed')),
+        'rules': {
+            'answered': len(by_rules),
+            'short_circuit_rate': len(by_rules) / total if total else 0.0,
+            'event_accuracy': _accuracy(by_rules, 'event'),
+            'relevance_accuracy': _accuracy(by_rules, 'relevance'),
+        },
+        'answered_by': {path: sum(1 for r in records if r.get('answered_by') == path)
+                        for path in ('Rules', 'Zero-Shot', 'Chain-of-Thought')},
+        'escalations': {
+            'count': len(escalated),
+            'rate': len(escalated) / total if total else 0.0,
+            'reasons': reasons,
+        },
+        'latency': {
+            'count': len(latencies),
+            'mean_seconds': sum(latencies) / len(latencies) if latencies else None,
+            'p50_seconds': percentile(latencies, 50),
+            'p95_seconds': percentile(latencies, 95),
+            'max_seconds': max(latencies) if latencies else None,
+        },
+    }
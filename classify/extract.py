@@ -0,0 +1,78 @@
+"""
+Extraction of the numbers and titles that decide whether an event is material:
+share quantities, dollar amounts and officer titles.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+_SCALE = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mm": 1e6, "m": 1e6, "mn": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+}
+
+_NUMBER = r"(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?"
+_SHARES = re.compile(
+    _NUMBER + r"\s*(thousand|million|billion)?\s+"
+    r"(?:(?:restricted|common|ordinary|preferred|additional|class [a-c])\s+){0,2}(?:shares|units)\b",
+    re.IGNORECASE,
+)
+_AMOUNT = re.compile(
+    r"(?:\$|US\$|USD\s?)\s?" + _NUMBER + r"(?:\s*(thousand|million|billion|mm|mn|bn|[kmb])\b)?",
+    re.IGNORECASE,
+)
+
+# Normalized title -> pattern. "Chief Officer" stands for any other C-suite title.
+_TITLES = (
+    ("CEO", r"\b(?:chief executive officer|ceo)\b"),
+    ("CFO", r"\b(?:chief financial officer|cfo)\b"),
+    ("COO", r"\b(?:chief operating officer|coo)\b"),
+    ("CTO", r"\b(?:chief technology officer|cto)\b"),
+    ("CLO", r"\b(?:chief legal officer|general counsel|clo)\b"),
+    ("CMO", r"\b(?:chief marketing officer|cmo)\b"),
+    ("CRO", r"\b(?:chief risk officer)\b"),
+    ("Chief Officer", r"\bchief [a-z ]{0,30}officer\b"),
+    ("President", r"(?<!vice )(?<!vice-)\bpresident\b"),
+    ("Chairman", r"\bchair(?:man|woman|person)?\b(?! of the (?:audit|compensation|nominating))"),
+    ("Vice President", r"\b(?:(?:senior |executive )?vice[ -]president|svp|evp|vp)\b"),
+    ("Director", r"\bdirector\b"),
+)
+_TITLE_PATTERNS = [(title, re.compile(pattern, re.IGNORECASE)) for title, pattern in _TITLES]
+
+
+def _value(whole: str, fraction: Optional[str], scale: Optional[str]) -> float:
+    value = float(whole.replace(",", "") + ("." + fraction if fraction else ""))
+    return value * _SCALE.get((scale or "").lower(), 1)
+
+
+@dataclass
+class FilingFacts:
+    """Quantities and titles mentioned in a text."""
+    shares: List[float] = field(default_factory=list)
+    amounts: List[float] = field(default_factory=list)
+    titles: Set[str] = field(default_factory=set)
+
+    @property
+    def max_shares(self) -> Optional[float]:
+        return max(self.shares) if self.shares else None
+
+    @property
+    def max_amount(self) -> Optional[float]:
+        return max(self.amounts) if self.amounts else None
+
+
+def extract_facts(text: str) -> FilingFacts:
+    """
+    Find share quantities ("10,000 shares", "1.2 million shares of common stock"), dollar
+    amounts ("$5 billion", "$250,000") and officer titles (normalized, e.g. 'CFO').
+    """
+    facts = FilingFacts()
+    for match in _SHARES.finditer(text):
+        facts.shares.append(_value(*match.groups()))
+    for match in _AMOUNT.finditer(text):
+        facts.amounts.append(_value(*match.groups()))
+    for title, pattern in _TITLE_PATTERNS:
+        if pattern.search(text):
+            facts.titles.add(title)
+    return facts
@@ -0,0 +1,97 @@
+import json
+from typing import Any, Callable, Optional
+
+_CLOSERS = {"[": "]", "{": "}"}
+
+
+class JSONScanner:
+    """
+    Incremental scanner that finds the first complete top-level JSON array or object in
+    streamed text.
+
+    Text before the value (e.g. "Here is the classification:") is skipped. Brackets are
+    only counted outside JSON strings, so '}' or ']' inside a string value does not end
+    the value early. A balanced candidate that does not parse (e.g. "[see below]") is
+    dropped and scanning continues after its opening bracket.
+
+    With `accept`, a value that parses but is not of the expected shape (e.g. "[5.02]"
+    in "per Item [5.02]" before the answer) is skipped too and scanning continues after
+    it; the first such value is kept in `fallback` for callers that want it when nothing
+    acceptable follows.
+    """
+
+    def __init__(self, accept: Optional[Callable[[Any], bool]] = None):
+        self.text = ""
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.value: Any = None
+        self.accept = accept
+        self.fallback: Any = None
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Add streamed text. Returns True once a complete JSON value has been seen; its
+        parsed form is in `value` and it spans text[start:end].
+        """
+        if self.complete:
+            return True
+        self.text += chunk
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self.start is None:
+                if ch in _CLOSERS:
+                    self.start = i
+                    self._stack = [_CLOSERS[ch]]
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(_CLOSERS[ch])
+            elif ch in "]}":
+                if ch != self._stack.pop():
+                    i = self._restart()
+                    continue
+                if not self._stack:
+                    try:
+                        value = json.loads(text[self.start:i + 1])
+                    except json.JSONDecodeError:
+                        i = self._restart()
+                        continue
+                    if self.accept is not None and not self.accept(value):
+                        if self.fallback is None:
+                            self.fallback = value
+                        self._restart()
+                        i += 1
+                        continue
+                    self.value = value
+                    self.end = i + 1
+                    self._pos = self.end
+                    return True
+            i += 1
+        self._pos = i
+        return False
+
+    def _restart(self) -> int:
+        """Abandon the current candidate and resume scanning just after its opening bracket."""
+        restart = self.start + 1
+        self.start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        return restart
@@ -1,23 +1,599 @@
+import asyncio
+import codecs
+import json
 import subprocess
 import os
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from classify.chunking import estimate_tokens
+from classify.jsonscan import JSONScanner
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_TIMEOUT = 300
+DEFAULT_POOL_SIZE = 8
+DEFAULT_BACKEND_MAX_CONCURRENCY = 2
+DEFAULT_HEALTH_INTERVAL = 10
+DEFAULT_EJECT_AFTER = 3
+
+
+class BackendUnavailable(RuntimeError):
+    """The LLM server could not be reached, as opposed to it answering with an error."""
+
+
+def early_stop_enabled():
+    """Stop generation at the end of the first JSON value unless LLM_EARLY_STOP=off."""
+    return os.getenv("LLM_EARLY_STOP", "on").lower() not in ("off", "0", "false")
+
+
+def generate_until_json(pieces, accept=None):
+    """
+    Consume streamed output until a complete JSON array or object (of a shape `accept`
+    allows, when given) has been produced.
+
+    Closing `pieces` early makes the backend cancel the rest of the generation. Returns
+    the text up to the end of the JSON value, or all of it if none was found.
+    """
+    scanner = JSONScanner(accept)
+    try:
+        for piece in pieces:
+            if scanner.feed(piece):
+                return scanner.text[:scanner.end].strip()
+    finally:
+        pieces.close()
+    return scanner.text.strip()
+
+
+def get_model(model=None):
+    """
+    Resolve the Ollama model name: the explicit argument, else OLLAMA_MODEL.
+    """
+    model = model or os.getenv("OLLAMA_MODEL")
+    if not model:
+        raise ValueError("OLLAMA_MODEL environment variable not set")
+    return model
+
+
+class SubprocessBackend:
+    """
+    Runs each prompt through a fresh `ollama run` process.
+    Kept for environments without the Ollama HTTP server and for latency comparisons.
+    """
+    name = "subprocess"
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+
+    def _command(self, prompt, model):
+        # The CLI only supports the generic JSON grammar, not a full schema
+        if getattr(prompt, "schema", None):
+            return ["ollama", "run", "--format", "json", model, prompt]
+        return ["ollama", "run", model, prompt]
+
+    def stream(self, prompt, model=None):
+        """Yield stdout as it is produced; the process is killed if the consumer stops early."""
+        model = get_model(model)
+        process = subprocess.Popen(self._command(prompt, model), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Same overall limit as the blocking path
+        timer = threading.Timer(self.timeout, process.kill)
+        timer.start()
+        try:
+            while True:
+                data = process.stdout.read1(4096)
+                if not data:
+                    break
+                piece = decoder.decode(data)
+                if piece:
+                    yield piece
+            if process.wait(timeout=self.timeout) != 0:
+                stderr = process.stderr.read().decode("utf-8", "replace").strip()
+                raise RuntimeError(f"Ollama returned an error: {stderr} (model: {model})")
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def generate(self, prompt, model=None):
+        if early_stop_enabled():
+            return generate_until_json(self.stream(prompt, model), getattr(prompt, "accepts", None))
+        model = get_model(model)
+        # If this hangs, check that Ollama is running and the model is available.
+        result = subprocess.run(self._command(prompt, model), capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"Ollama returned an error: {result.stderr.strip()} (model: {model})")
+        return result.stdout.strip()
+
+    def default_model(self):
+        """Model used when a call does not name one."""
+        return os.getenv("OLLAMA_MODEL")
+
+    def warm_up(self, model=None):
+        # Nothing to keep alive between processes
+        return None
+
+    def close(self):
+        return None
+
+
+class OllamaHTTPBackend:
+    """
+    Long-lived client for the Ollama HTTP API.
+
+    Reuses pooled keep-alive connections across calls and asks the server to keep the
+    model loaded (`keep_alive`) so consecutive classifications skip the model load.
+    Responses are streamed and the request is dropped as soon as a complete JSON answer
+    has arrived, which makes Ollama stop generating.
+    """
+    name = "http"
+
+    def __init__(self, host=None, keep_alive=None, timeout=None, pool_size=None, model=None):
+        self.host = (host or os.getenv("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST).rstrip("/")
+        if not self.host.startswith("http"):
+            self.host = f"http://{self.host}"
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)
+        self.timeout = float(timeout or os.getenv("OLLAMA_TIMEOUT", DEFAULT_TIMEOUT))
+        # Model served by this host when the caller does not name one (default: OLLAMA_MODEL)
+        self.model = model
+        pool_size = int(pool_size or os.getenv("OLLAMA_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload):
+        try:
+            response = self.session.post(f"{self.host}{path}", json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise BackendUnavailable(f"Could not reach Ollama at {self.host}: {e}") from e
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama returned an error: {response.text.strip()} (model: {payload.get('model')})")
+        return response.json()
+
+    def _payload(self, prompt, model, stream):
+        payload = {
+            "model": get_model(model or self.model),
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        # Ollama reuses the KV cache of the previous request for the longest common
+        # prompt prefix. Pin the static template prefix so a context shift never drops it.
+        prefix = getattr(prompt, "prefix", None)
+        if prefix:
+            payload["options"] = {"num_keep": estimate_tokens(prefix)}
+        # Constrained decoding: Ollama only samples tokens that keep the output valid
+        schema = getattr(prompt, "schema", None)
+        if schema:
+            payload["format"] = schema
+        return payload
+
+    def stream(self, prompt, model=None):
+        """
+        Yield response fragments as Ollama generates them.
+        Closing the generator early closes the connection, which cancels the generation.
+        """
+        payload = self._payload(prompt, model, True)
+        try:
+            response = self.session.post(f"{self.host}/api/generate", json=payload, timeout=self.timeout, stream=True)
+        except requests.exceptions.RequestException as e:
+            raise BackendUnavailable(f"Could not reach Ollama at {self.host}: {e}") from e
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f"Ollama returned an error: {response.text.strip()} (model: {payload['model']})")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(f"Ollama returned an error: {data['error']} (model: {payload['model']})")
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+        except requests.exceptions.RequestException as e:
+            raise BackendUnavailable(f"Lost connection to Ollama at {self.host}: {e}") from e
+        finally:
+            response.close()
+
+    def generate(self, prompt, model=None):
+        if early_stop_enabled():
+            return generate_until_json(self.stream(prompt, model), getattr(prompt, "accepts", None))
+        data = self._post("/api/generate", self._payload(prompt, model, False))
+        return data.get("response", "").strip()
+
+    def default_model(self):
+        """Model used when a call does not name one."""
+        return self.model or os.getenv("OLLAMA_MODEL")
+
+    def warm_up(self, model=None):
+        """Load the model into memory without generating anything."""
+        model = get_model(model or self.model)
+        self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+
+    def health_check(self):
+        """Raise BackendUnavailable unless the server answers a cheap request."""
+        try:
+            response = self.session.get(f"{self.host}/api/version", timeout=min(self.timeout, 5))
+        except requests.exceptions.RequestException as e:
+            raise BackendUnavailable(f"Could not reach Ollama at {self.host}: {e}") from e
+        if response.status_code != 200:
+            raise BackendUnavailable(f"Ollama at {self.host} is unhealthy (HTTP {response.status_code})")
+
+    def close(self):
+        self.session.close()
+
+
+def parse_backends(spec):
+    """
+    Parse LLM_BACKENDS: comma-separated `host[=model][*max_concurrency]` entries, e.g.
+    `http://gpu1:11434=llama3.2:latest*4,http://gpu2:11434`.
+
+    Returns:
+        list: (host, model or None, max_concurrency or None) tuples
+    """
+    entries = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        entry, _, limit = entry.partition("*")
+        host, _, model = entry.partition("=")
+        entries.append((host.strip(), model.strip() or None, int(limit) if limit else None))
+    return entries
+
+
+class PoolMember:
+    """One endpoint+model of a BackendPool, with its load, health and latency statistics."""
+
+    def __init__(self, backend, max_concurrency):
+        self.backend = backend
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=256)
+
+    @property
+    def model(self):
+        return getattr(self.backend, "model", None) or os.getenv("OLLAMA_MODEL")
+
+    @property
+    def name(self):
+        return f"{getattr(self.backend, 'host', self.backend.name)}/{self.model}"
+
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def stats(self):
+        ordered = sorted(self.latencies)
+        return {
+            "name": self.name,
+            "model": self.model,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "mean_seconds": self.mean_latency() if ordered else None,
+            "p50_seconds": ordered[(len(ordered) - 1) // 2] if ordered else None,
+            "p95_seconds": ordered[max(0, -(-len(ordered) * 95 // 100) - 1)] if ordered else None,
+        }
+
+
+class BackendPool:
+    """
+    Spreads requests over several Ollama servers (LLM_BACKENDS).
+
+    Each request goes to the healthy member with the fewest requests in flight (ties go
+    to the one with the lower recent latency) and never beyond a member's
+    `max_concurrency`; when all are busy the caller waits for a free slot. A member that
+    cannot be reached `eject_after` times in a row, or fails the periodic health check, is
+    taken out of rotation until a health check succeeds again. A request whose member is
+    unreachable before producing output is retried on another member.
+
+    Requests only go to members serving the requested model, so that results, cache
+    entries and metrics are attributed to the model that answered. A request that names
+    no model uses `default_model()`, which refuses to pick among different models.
+    """
+    name = "pool"
+
+    def __init__(self, members=None, max_concurrency=None, health_interval=None, eject_after=None,
+                 acquire_timeout=None):
+        max_concurrency = int(max_concurrency or os.getenv("LLM_BACKEND_MAX_CONCURRENCY", DEFAULT_BACKEND_MAX_CONCURRENCY))
+        if members is None:
+            spec = os.getenv("LLM_BACKENDS", "")
+            members = [
+                PoolMember(OllamaHTTPBackend(host=host, model=model), limit or max_concurrency)
+                for host, model, limit in parse_backends(spec)
+            ]
+        if not members:
+            raise ValueError("LLM_BACKENDS does not list any backend")
+        self.members = members
+        self.eject_after = int(eject_after or os.getenv("LLM_EJECT_AFTER", DEFAULT_EJECT_AFTER))
+        self.acquire_timeout = float(acquire_timeout or os.getenv("OLLAMA_TIMEOUT", DEFAULT_TIMEOUT))
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        interval = float(os.getenv("LLM_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL) if health_interval is None else health_interval)
+        self._health_thread = None
+        if interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, args=(interval,),
+                                                   name="llm-health", daemon=True)
+            self._health_thread.start()
+
+    def default_model(self):
+        """
+        Model for requests that do not name one: OLLAMA_MODEL when a member serves it,
+        else the one model every member serves.
+
+        Raises:
+            ValueError: When members serve different models and OLLAMA_MODEL names none of them
+        """
+        models = {member.model for member in self.members}
+        named = os.getenv("OLLAMA_MODEL")
+        if named in models:
+            return named
+        if len(models) == 1:
+            return models.pop()
+        raise ValueError(f"LLM_BACKENDS serve different models ({', '.join(sorted(map(str, models)))}); "
+                         "set OLLAMA_MODEL to the one to use")
+
+    def _acquire(self, model, tried):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                candidates = [m for m in self.members
+                              if m.healthy and m not in tried and (model is None or m.model == model)]
+                if not candidates:
+                    raise BackendUnavailable("No healthy LLM backend" + (f" serving {model}" if model else ""))
+                free = [m for m in candidates if m.outstanding < m.max_concurrency]
+                if free:
+                    member = min(free, key=lambda m: (m.outstanding, m.mean_latency()))
+                    member.outstanding += 1
+                    return member
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BackendUnavailable("Timed out waiting for a free LLM backend")
+                self._condition.wait(remaining)
+
+    def _release(self, member, started, error=None):
+        with self._condition:
+            member.outstanding -= 1
+            member.requests += 1
+            if error is None:
+                member.consecutive_failures = 0
+                member.latencies.append(time.perf_counter() - started)
+            else:
+                member.failures += 1
+                member.last_error = str(error)
+                if isinstance(error, BackendUnavailable):
+                    member.consecutive_failures += 1
+                    if member.healthy and member.consecutive_failures >= self.eject_after:
+                        member.healthy = False
+                        print(f"LLM backend {member.name} ejected: {error}")
+            self._condition.notify_all()
+
+    def stream(self, prompt, model=None):
+        model = model or self.default_model()
+        tried = set()
+        while True:
+            try:
+                member = self._acquire(model, tried)
+            except BackendUnavailable:
+                if tried:
+                    raise last_error
+                raise
+            started = time.perf_counter()
+            produced = False
+            error = None
+            pieces = member.backend.stream(prompt, model)
+            try:
+                for piece in pieces:
+                    produced = True
+                    yield piece
+                return
+            except GeneratorExit:
+                # The caller stopped early (e.g. the JSON answer is complete)
+                raise
+            except Exception as e:
+                error = e
+                if produced or not isinstance(e, BackendUnavailable):
+                    raise
+            finally:
+                # Close the connection before the slot is given to another request
+                pieces.close()
+                self._release(member, started, error)
+            # Unreachable before any output reached the caller: another member can take over
+            tried.add(member)
+            last_error = error
+
+    def generate(self, prompt, model=None):
+        if early_stop_enabled():
+            return generate_until_json(self.stream(prompt, model), getattr(prompt, "accepts", None))
+        model = model or self.default_model()
+        tried = set()
+        while True:
+            try:
+                member = self._acquire(model, tried)
+            except BackendUnavailable:
+                if tried:
+                    raise last_error
+                raise
+            started = time.perf_counter()
+            try:
+                output = member.backend.generate(prompt, model)
+            except BackendUnavailable as e:
+                self._release(member, started, e)
+                tried.add(member)
+                last_error = e
+                continue
+            except Exception as e:
+                self._release(member, started, e)
+                raise
+            self._release(member, started)
+            return output
+
+    def check_health(self):
+        """Probe every member once, ejecting unreachable ones and re-admitting recovered ones."""
+        for member in self.members:
+            try:
+                member.backend.health_check()
+                error = None
+            except Exception as e:
+                error = e
+            with self._condition:
+                if error is None:
+                    if not member.healthy:
+                        print(f"LLM backend {member.name} re-admitted")
+                    member.healthy = True
+                    member.consecutive_failures = 0
+                else:
+                    if member.healthy:
+                        print(f"LLM backend {member.name} ejected: {error}")
+                    member.healthy = False
+                    member.last_error = str(error)
+                self._condition.notify_all()
+
+    def _health_loop(self, interval):
+        while not self._stopped.wait(interval):
+            self.check_health()
+
+    def warm_up(self, model=None):
+        for member in self.members:
+            try:
+                member.backend.warm_up(model)
+            except Exception as e:
+                print(f"LLM warm-up failed for {member.name}: {e}")
+
+    def stats(self):
+        """Per-member load, health and latency."""
+        with self._condition:
+            return [member.stats() for member in self.members]
+
+    def close(self):
+        self._stopped.set()
+        for member in self.members:
+            member.backend.close()
+
+
+BACKENDS = {
+    "http": OllamaHTTPBackend,
+    "subprocess": SubprocessBackend,
+    "pool": BackendPool,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Return the process-wide LLM backend, creating it on first use.
+    The backend is chosen with the LLM_BACKEND environment variable ('http', 'subprocess' or
+    'pool'); it defaults to 'pool' when LLM_BACKENDS is set and 'http' otherwise.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = os.getenv("LLM_BACKEND") or ("pool" if os.getenv("LLM_BACKENDS") else "http")
+                if name not in BACKENDS:
+                    raise ValueError(f"Unknown LLM backend: {name}")
+                _backend = BACKENDS[name]()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (e.g. for tests or benchmarks)."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _backend = backend
+
+
+def resolve_model(model=None):
+    """
+    Name of the model that answers a call for `model` (None: the backend's default), used
+    to attribute stored results, cache entries and metrics. None when no model is configured.
+    """
+    if model:
+        return model
+    default_model = getattr(get_backend(), "default_model", None)
+    return default_model() if default_model else os.getenv("OLLAMA_MODEL")
+
+
+def warm_up(model=None):
+    """Ask the active backend to load the model so the first request is fast."""
+    get_backend().warm_up(model)
+
 
 def run_llama3(prompt, model=None):
     """
     Run a prompt through the local Ollama LLM.
     Returns the model's output as a string.
     """
-    # Only use model from .env file
-    model = os.getenv("OLLAMA_MODEL")
-    if not model:
-        raise ValueError("OLLAMA_MODEL environment variable not set")
-        
-    # If this hangs, check that Ollama is running and the model is available.
-    result = subprocess.run([
-        "ollama", "run", model, prompt
-    ], capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"Ollama returned an error: {result.stderr.strip()} (model: {model})")
-    return result.stdout.strip()
+    return get_backend().generate(prompt, model)
+
+
+async def astream_llama3(prompt, model=None, stop_at_json=True):
+    """
+    Async iterator over the model's output fragments as they are generated.
+
+    The blocking backend stream runs in a worker thread. With `stop_at_json` the stream
+    ends (and generation is cancelled) once a complete JSON value has been produced; the
+    last fragment is trimmed to the end of that value. Leaving the loop early also
+    cancels the generation.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed; nobody is listening any more
+            stopped.set()
+
+    def produce():
+        scanner = JSONScanner(getattr(prompt, "accepts", None)) if stop_at_json else None
+        pieces = get_backend().stream(prompt, model)
+        try:
+            for piece in pieces:
+                if stopped.is_set():
+                    break
+                if scanner is not None and scanner.feed(piece):
+                    put(piece[:len(piece) - (len(scanner.text) - scanner.end)])
+                    break
+                put(piece)
+        except Exception as e:
+            put(e)
+        finally:
+            pieces.close()
+            put(done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item:
+                yield item
+    finally:
+        stopped.set()
+        await asyncio.shield(producer)
 
 if __name__ == "__main__":
     # Quick test: classify a sample acquisition event
@@ -0,0 +1,217 @@
+"""
+Few-shot examples picked per filing from a TF-IDF index over labelled examples.
+
+The index holds every example of `config/ground_truth.json` and the curated
+`config/example_bank.json` (which can add reasoning). Raw term counts are persisted
+with NumPy, so when example files change only the new examples are tokenized; IDF
+weights and the normalized matrix are recomputed from the counts, which is cheap.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config.config import DEFAULT_GROUND_TRUTH_PATH
+
+DEFAULT_EXAMPLE_BANK_PATH = "config/example_bank.json"
+DEFAULT_INDEX_PATH = "data/fewshot_index.npz"
+DEFAULT_FEWSHOT_K = 4
+# Prompt tokens set aside per example when sizing filing chunks
+FEWSHOT_EXAMPLE_TOKENS = 160
+
+_WORD = re.compile(r"[a-z]+(?:-[a-z0-9]+)*|\d[\d,]*(?:\.\d+)?")
+
+
+def retrieval_enabled() -> bool:
+    """Use retrieved few-shot examples for CoT prompts unless FEWSHOT_RETRIEVAL=off."""
+    return os.getenv("FEWSHOT_RETRIEVAL", "on").lower() not in ("off", "0", "false")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased words and adjacent word pairs. Numbers become their order of magnitude
+    ('#5' for 10,000-99,999) so that examples with similar amounts score as similar.
+    """
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word[0].isdigit():
+            word = "#" + str(len(word.split(".")[0].replace(",", "")))
+        words.append(word)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def example_key(example: Dict[str, Any]) -> str:
+    """Content hash of an example; an edited example is a new one."""
+    return hashlib.sha256(json.dumps(example, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_examples(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Examples from JSON files in order, one per distinct text (the first file that has a
+    text wins, so list the curated bank first). Missing files are skipped.
+    """
+    examples, seen = [], set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for example in json.load(f):
+                if example["text"] not in seen:
+                    seen.add(example["text"])
+                    examples.append(example)
+    return examples
+
+
+class ExampleIndex:
+    """
+    TF-IDF index over labelled examples, persisted as raw term counts.
+
+    Args:
+        path: .npz file to load from and save to (None keeps it in memory)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.keys: List[str] = []
+        self.examples: List[Dict[str, Any]] = []
+        self.vocab: Dict[str, int] = {}
+        self.counts = np.zeros((0, 0), dtype=np.float32)
+        self._matrix = None
+        self._idf = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def _load(self) -> None:
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            self.counts = data["counts"]
+        self.keys, self.examples = meta["keys"], meta["examples"]
+        self.vocab = {term: i for i, term in enumerate(meta["terms"])}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        meta = {"keys": self.keys, "examples": self.examples, "terms": list(self.vocab)}
+        tmp = self.path + ".tmp.npz"
+        np.savez_compressed(tmp, counts=self.counts, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, self.path)
+
+    def sync(self, examples: List[Dict[str, Any]]) -> int:
+        """
+        Make the index hold exactly `examples`: tokenize only those not indexed yet and
+        drop those that are gone. Saves the index if anything changed.
+
+        Returns:
+            int: Number of examples added
+        """
+        wanted = {example_key(example): example for example in examples}
+        with self._lock:
+            keep = [i for i, key in enumerate(self.keys) if key in wanted]
+            removed = len(self.keys) - len(keep)
+            if removed:
+                self.keys = [self.keys[i] for i in keep]
+                self.examples = [self.examples[i] for i in keep]
+                self.counts = self.counts[keep]
+            indexed = set(self.keys)
+            added = [(key, example) for key, example in wanted.items() if key not in indexed]
+            if added:
+                self._add(added)
+            if added or removed:
+                self._matrix = None
+                self.save()
+        return len(added)
+
+    def add(self, examples: List[Dict[str, Any]]) -> int:
+        """Index more examples (already indexed ones are skipped). Returns how many were added."""
+        return self.sync(self.examples + list(examples))
+
+    def _add(self, added) -> None:
+        rows = []
+        for key, example in added:
+            row: Dict[int, int] = {}
+            for term in tokenize(example["text"]):
+                column = self.vocab.setdefault(term, len(self.vocab))
+                row[column] = row.get(column, 0) + 1
+            rows.append(row)
+            self.keys.append(key)
+            self.examples.append(example)
+        # New terms widen the existing rows with zero counts
+        counts = np.zeros((len(self.keys), len(self.vocab)), dtype=np.float32)
+        counts[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+        for i, row in enumerate(rows, start=self.counts.shape[0]):
+            counts[i, list(row)] = list(row.values())
+        self.counts = counts
+
+    def _weights(self):
+        if self._matrix is None:
+            df = np.count_nonzero(self.counts, axis=0)
+            self._idf = np.log((1 + len(self.keys)) / (1 + df)).astype(np.float32) + 1
+            matrix = (1 + np.log(np.maximum(self.counts, 1))) * (self.counts > 0) * self._idf
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.maximum(norms, 1e-12)
+        return self._matrix, self._idf
+
+    def search(self, text: str, k: int = DEFAULT_FEWSHOT_K) -> List[Dict[str, Any]]:
+        """
+        The k examples most similar to a text (cosine similarity of TF-IDF vectors). An
+        example with exactly this text is never returned, so ground truth cannot answer itself.
+        """
+        with self._lock:
+            if not self.keys:
+                return []
+            matrix, idf = self._weights()
+            query = np.zeros(len(self.vocab), dtype=np.float32)
+            for term in tokenize(text):
+                column = self.vocab.get(term)
+                if column is not None:
+                    query[column] += 1
+            query = (1 + np.log(np.maximum(query, 1))) * (query > 0) * idf
+            scores = matrix @ query
+            order = np.argsort(-scores, kind="stable")
+            examples = self.examples
+        stripped = text.strip()
+        return [examples[i] for i in order if examples[i]["text"].strip() != stripped][:k]
+
+
+def format_examples(examples: List[Dict[str, Any]], use_cot: bool = True) -> str:
+    """Few-shot block for a prompt: input, optional reasoning and the expected events per example."""
+    blocks = []
+    for example in examples:
+        events = [{"Event Type": example["expected_event"], "Relevant": example["expected_relevance"]}]
+        output = {"Reasoning": example.get("reasoning", []), "Events": events} if use_cot else events
+        blocks.append(f"Input: {json.dumps(example['text'])}\nOutput: {json.dumps(output)}")
+    return "\n\n".join(blocks)
+
+
+_index = None
+_index_sources = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[ExampleIndex]:
+    """
+    Return the process-wide example index, or None when disabled with FEWSHOT_RETRIEVAL=off.
+    It is loaded from FEWSHOT_INDEX_PATH and re-synced whenever an example file changes.
+    """
+    global _index, _index_sources
+    if not retrieval_enabled():
+        return None
+    paths = [os.getenv("FEWSHOT_EXAMPLE_BANK", DEFAULT_EXAMPLE_BANK_PATH),
+             os.getenv("FEWSHOT_GROUND_TRUTH", DEFAULT_GROUND_TRUTH_PATH)]
+    sources = tuple((path, os.path.getmtime(path) if os.path.exists(path) else None) for path in paths)
+    if _index is None or sources != _index_sources:
+        with _index_lock:
+            if _index is None or sources != _index_sources:
+                index = _index or ExampleIndex(os.getenv("FEWSHOT_INDEX_PATH", DEFAULT_INDEX_PATH))
+                index.sync(load_examples(paths))
+                _index, _index_sources = index, sources
+    return _index
@@ -0,0 +1,184 @@
+"""
+Deterministic pre-classifier that answers obvious filings without an LLM call.
+
+Event types can declare case-insensitive regular expressions in config/events.json,
+next to their `relevant` flag:
+
+    "Automatic Sale under Rule 10b5-1": {"relevant": false, "patterns": ["\\b10b5-1\\b"]}
+
+When the patterns of exactly one event type match the filing text, that event (with
+its configured relevance) is the answer. Text matching no event type, or several, is
+ambiguous and goes to the LLM. Event types whose relevance depends on amounts should
+not declare patterns.
+
+Event types can also declare `relevance_rules`, evaluated in order against the share
+counts, dollar amounts and titles found by classify.extract; the first rule whose
+conditions all hold decides the event's relevance, whatever the LLM said:
+
+    "Open Market Purchase": {"relevant": true, "relevance_rules": [
+        {"shares_at_least": 10000, "relevant": true},
+        {"shares_below": 1000, "relevant": false}
+    ]}
+
+Conditions compare the largest quantity mentioned (shares_at_least, shares_below,
+amount_at_least, amount_below) or require one of a list of titles ("titles"). When no
+rule applies, the LLM's relevance stands.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from classify.extract import FilingFacts, extract_facts
+
+
+def rules_enabled() -> bool:
+    """Run the rule pre-classifier before the LLM unless RULES_PRECLASSIFY=off."""
+    return os.getenv("RULES_PRECLASSIFY", "on").lower() not in ("off", "0", "false")
+
+
+def relevance_rules_enabled() -> bool:
+    """Let configured relevance rules override the LLM's relevance unless RELEVANCE_RULES=off."""
+    return os.getenv("RELEVANCE_RULES", "on").lower() not in ("off", "0", "false")
+
+
+_CONDITIONS = {
+    "shares_at_least": lambda facts, v: facts.max_shares is not None and facts.max_shares >= v,
+    "shares_below": lambda facts, v: facts.max_shares is not None and facts.max_shares < v,
+    "amount_at_least": lambda facts, v: facts.max_amount is not None and facts.max_amount >= v,
+    "amount_below": lambda facts, v: facts.max_amount is not None and facts.max_amount < v,
+    "titles": lambda facts, v: bool(facts.titles & set(v)),
+}
+
+
+def _check_relevance_rule(event: str, rule: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = set(rule) - set(_CONDITIONS) - {"relevant"}
+    if unknown:
+        raise ValueError(f"{event}: unknown relevance rule condition(s) {sorted(unknown)}")
+    if not isinstance(rule.get("relevant"), bool) or len(rule) < 2:
+        raise ValueError(f"{event}: a relevance rule needs at least one condition and a boolean 'relevant'")
+    return rule
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    """The single event type whose patterns matched, and the text that matched."""
+    event_type: str
+    relevant: bool
+    evidence: str
+
+
+class RuleSet:
+    """Compiled per-event patterns; one alternation regex per event type."""
+
+    def __init__(self, patterns: Dict[str, List[str]], relevance: Dict[str, bool],
+                 relevance_rules: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.relevance = relevance
+        self.relevance_rules = {
+            event: [_check_relevance_rule(event, rule) for rule in rules]
+            for event, rules in (relevance_rules or {}).items() if rules
+        }
+        self._regexes: List[Tuple[str, re.Pattern]] = [
+            (event, re.compile("|".join(f"(?:{p})" for p in event_patterns), re.IGNORECASE))
+            for event, event_patterns in patterns.items() if event_patterns
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self._regexes or self.relevance_rules)
+
+    def matches(self, text: str) -> Dict[str, str]:
+        """Every event type whose patterns match, with the first matching text."""
+        found = {}
+        for event, regex in self._regexes:
+            match = regex.search(text)
+            if match:
+                found[event] = match.group(0)
+        return found
+
+    def match(self, text: str, allowed_events: Optional[List[str]] = None) -> Optional[RuleMatch]:
+        """
+        The unambiguous answer for a text, or None if it should go to the LLM.
+
+        Args:
+            text: Filing text
+            allowed_events: Only answer with one of these event types
+        """
+        found = self.matches(text)
+        if len(found) != 1:
+            return None
+        event, evidence = next(iter(found.items()))
+        if allowed_events is not None and event not in allowed_events:
+            return None
+        relevant = self.relevance_for(event, extract_facts(text)) if relevance_rules_enabled() else None
+        return RuleMatch(event, self.relevance.get(event, False) if relevant is None else relevant, evidence)
+
+    def relevance_for(self, event_type: str, facts: FilingFacts) -> Optional[bool]:
+        """Relevance decided by the first applicable rule of an event type, or None."""
+        for rule in self.relevance_rules.get(event_type, ()):
+            if all(_CONDITIONS[key](facts, value) for key, value in rule.items() if key != "relevant"):
+                return rule["relevant"]
+        return None
+
+    def apply_relevance(self, output: Any, text: str, use_cot: bool = False) -> Tuple[Any, int]:
+        """
+        Override the relevance of the events in a model output where a rule decides it.
+
+        Args:
+            output: Validated model output (an event list, or {"Reasoning", "Events"} for CoT)
+            text: The text that was classified
+            use_cot: Whether the output has the CoT shape; decisions are added to its reasoning
+
+        Returns:
+            tuple: (new output, number of events whose relevance was changed)
+        """
+        if not self.relevance_rules:
+            return output, 0
+        facts = extract_facts(text)
+        events = output["Events"] if use_cot else output
+        decided, notes = [], []
+        for event in events:
+            relevant = self.relevance_for(event["Event Type"], facts)
+            if relevant is not None and relevant != event["Relevant"]:
+                event = {**event, "Relevant": relevant}
+                notes.append(f"Relevance rule for {event['Event Type']}: {'relevant' if relevant else 'not relevant'} "
+                             f"(shares {facts.max_shares}, amount {facts.max_amount}, titles {sorted(facts.titles)})")
+            decided.append(event)
+        if use_cot:
+            return {**output, "Reasoning": list(output["Reasoning"]) + notes, "Events": decided}, len(notes)
+        return decided, len(notes)
+
+
+@lru_cache(maxsize=16)
+def _compile_rules(events_json: str) -> RuleSet:
+    events = json.loads(events_json)
+    return RuleSet(
+        {event: spec.get("patterns", []) for event, spec in events.items()},
+        {event: bool(spec.get("relevant", False)) for event, spec in events.items()},
+        {event: spec.get("relevance_rules", []) for event, spec in events.items()},
+    )
+
+
+def compile_rules(events: Dict[str, Dict[str, Any]]) -> RuleSet:
+    """
+    Build (or reuse) the rule set of an event configuration.
+
+    Args:
+        events: EventConfig.events, i.e. {event type: {"relevant": ..., "patterns": [...],
+            "relevance_rules": [...]}}
+
+    Returns:
+        RuleSet: Compiled rules (empty if no event declares patterns or relevance rules)
+
+    Raises:
+        ValueError: If a relevance rule uses an unknown condition or has no boolean 'relevant'
+    """
+    return _compile_rules(json.dumps(events, sort_keys=True))
+
+
+def rule_output(match: RuleMatch, use_cot: bool = False) -> Any:
+    """Model-shaped output for a rule answer (the CoT shape carries the evidence as reasoning)."""
+    events = [{"Event Type": match.event_type, "Relevant": match.relevant}]
+    if use_cot:
+        return {"Reasoning": [f"Rule match for {match.event_type}: {match.evidence!r}"], "Events": events}
+    return events
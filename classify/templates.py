@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+# Map template names to file names
+TEMPLATE_FILES = {
+    "zero_shot.tpl": "zero_shot.tpl",
+    "cot.tpl": "cot.tpl",
+    "cot_fewshot.tpl": "cot_fewshot.tpl",
+    "repair.tpl": "repair.tpl",
+}
+
+
+class RenderedPrompt(str):
+    """
+    A prompt string that remembers how long its static prefix is.
+
+    It is a plain `str` everywhere else; LLM backends that can reuse server-side
+    state for a shared prefix read `prefix` from it, and constrain decoding to
+    `schema` (a JSON Schema dict) when one is set. `accepts` (e.g. EventSchema.accepts)
+    tells streaming backends which JSON value is the answer, so they stop there.
+    """
+
+    def __new__(cls, prefix: str, suffix: str, schema: dict = None):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.schema = schema
+        prompt.accepts = None
+        return prompt
+
+
+class CompiledTemplate:
+    """
+    A prompt template split into a static prefix and the per-filing text.
+
+    Everything before `{text}` (instructions, few-shot examples, the event list) is
+    rendered once per event configuration and reused byte for byte, so an LLM server
+    that caches by prompt prefix only has to process the filing text on each call.
+    A template may also have an `{examples}` placeholder for few-shot examples chosen per
+    filing; the prefix then ends before it.
+    """
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        if source.count("{text}") != 1:
+            raise ValueError(f"Template {name} must contain exactly one {{text}} placeholder")
+        self.head, self.tail = source.split("{text}")
+        self.head, _, self.middle = self.head.partition("{examples}")
+        self.has_examples = "{examples}" in source
+        if "{" in self.tail.replace("{{", "").replace("}}", ""):
+            raise ValueError(f"Template {name} must not have placeholders after {{text}}")
+        self.suffix_tail = self.tail.format()
+        self._prefixes: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def prefix(self, events: List[str], **fields: str) -> str:
+        """The static part of the prompt for an event list (and other fields), rendered once."""
+        return self._render_static(events, fields)[0]
+
+    def _render_static(self, events: List[str], fields: Dict[str, str]) -> Tuple[str, str]:
+        key = (tuple(events), tuple(sorted(fields.items())))
+        static = self._prefixes.get(key)
+        if static is None:
+            events_json = json.dumps(list(events))
+            static = (self.head.format(events=events_json, **fields), self.middle.format(events=events_json, **fields))
+            with self._lock:
+                self._prefixes[key] = static
+        return static
+
+    def render(self, text: str, events: List[str], examples: str = "", **fields: str) -> RenderedPrompt:
+        """Full prompt: the cached prefix followed by the few-shot examples (if any) and the filing text."""
+        prefix, middle = self._render_static(events, fields)
+        if self.has_examples:
+            return RenderedPrompt(prefix, examples + middle + text + self.suffix_tail)
+        return RenderedPrompt(prefix, text + self.suffix_tail)
+
+
+_templates: Dict[str, CompiledTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(template_name: str) -> CompiledTemplate:
+    """
+    Load and compile a template from the prompts directory. Each template is read once.
+    """
+    template = _templates.get(template_name)
+    if template is not None:
+        return template
+    if template_name not in TEMPLATE_FILES:
+        raise ValueError(f"Unknown template: {template_name}")
+    with open(os.path.join(PROMPTS_DIR, TEMPLATE_FILES[template_name]), 'r', encoding='utf-8') as f:
+        template = CompiledTemplate(template_name, f.read())
+    with _templates_lock:
+        return _templates.setdefault(template_name, template)
+
+
+def clear_templates() -> None:
+    """Forget compiled templates so edited files are read again."""
+    with _templates_lock:
+        _templates.clear()
@@ -1,107 +1,208 @@
 import json
-import re
-from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Union
+from classify.jsonscan import JSONScanner
 from config.config import EventConfig
 
-def extract_json_block(text):
-    # Extract the first JSON array or object from the LLM output (handles extra text)
-    match = re.search(r'(\[.*?\]|\{.*?\})', text, re.DOTALL)
-    if match:
-        return match.group(1)
+def extract_json_block(text, accept=None):
+    # Extract the first complete JSON array or object (of the accepted shape) from the LLM output
+    scanner = JSONScanner(accept)
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end]
     raise ValueError("Could not find a JSON array or object in the LLM output.")
 
-def validate_zero_shot(result: str, allowed_events: List[str]) -> bool:
+def parse_output(result: str, accept=None) -> Any:
+    """
+    Parse raw model output in one pass: the whole string if it is JSON, otherwise the
+    first complete JSON value embedded in it. With `accept` (e.g. EventSchema.accepts),
+    values of another shape are skipped, and the first of them is only returned when no
+    accepted value follows, so that it can still be repaired.
+
+    Raises:
+        ValueError: If the output contains no parseable JSON array or object
+    """
+    try:
+        return json.loads(result)
+    except json.JSONDecodeError:
+        pass
+    scanner = JSONScanner(accept)
+    if scanner.feed(result):
+        return scanner.value
+    if scanner.fallback is not None:
+        return scanner.fallback
+    raise ValueError("Could not find a JSON array or object in the LLM output.")
+
+@dataclass(frozen=True)
+class EventSchema:
+    """Expected output shape, compiled once per event list and template."""
+    event_types: frozenset
+    use_cot: bool
+    # JSON Schema of the same shape, for constrained decoding (Ollama `format`)
+    json_schema: dict = field(hash=False, compare=False, default=None)
+
+    def accepts(self, value: Any) -> bool:
+        """Whether a JSON value has the top-level shape of an answer: an object for CoT, a list of objects otherwise."""
+        if self.use_cot:
+            return isinstance(value, dict)
+        return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+def _event_list_schema(events: tuple) -> dict:
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "Event Type": {"type": "string", "enum": list(events)},
+                "Relevant": {"type": "boolean"},
+            },
+            "required": ["Event Type", "Relevant"],
+        },
+    }
+
+@lru_cache(maxsize=64)
+def _compile_schema(events: tuple, use_cot: bool) -> EventSchema:
+    json_schema = _event_list_schema(events)
+    if use_cot:
+        json_schema = {
+            "type": "object",
+            "properties": {
+                "Reasoning": {"type": "array", "items": {"type": "string"}},
+                "Events": json_schema,
+            },
+            "required": ["Reasoning", "Events"],
+        }
+    return EventSchema(frozenset(events), use_cot, json_schema)
+
+def compile_schema(allowed_events: List[str], use_cot: bool = False) -> EventSchema:
+    """
+    Build (or reuse) the schema for an event list.
+
+    Args:
+        allowed_events: List of allowed event types, e.g. EventConfig.get_event_types()
+        use_cot: Whether outputs follow the chain-of-thought shape
+
+    Returns:
+        EventSchema: Schema with a frozenset of the allowed event types
+    """
+    return _compile_schema(tuple(allowed_events), use_cot)
+
+@dataclass
+class ClassificationResult:
+    """
+    Parsed and validated model output.
+
+    `output` is the parsed JSON (a list of events for zero-shot, a {"Reasoning", "Events"}
+    object for CoT), or None when the model output was not JSON. `errors` says why a
+    result is invalid; `retries` and `repairs` count the extra LLM calls it needed.
+    `source` says what produced it: 'llm' or 'rules' (the pre-classifier). `template` is
+    the prompt template of the answer, and with the auto cascade `escalation` says why it
+    went on from zero-shot to CoT. `model` is the LLM that answered (None for rule answers).
+    """
+    output: Any
+    valid: bool
+    errors: List[str] = field(default_factory=list)
+    # Full-prompt re-runs and output-only repair passes it took to get here
+    retries: int = 0
+    repairs: int = 0
+    source: str = "llm"
+    template: Optional[str] = None
+    escalation: Optional[str] = None
+    model: Optional[str] = None
+
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        events = self.output.get("Events") if isinstance(self.output, dict) else self.output
+        return [e for e in events if isinstance(e, dict)] if isinstance(events, list) else []
+
+    @property
+    def first_event(self) -> Optional[Dict[str, Any]]:
+        events = self.events
+        return events[0] if events else None
+
+def _check_events(events: Any, schema: EventSchema, errors: List[str]) -> None:
+    if not isinstance(events, list):
+        errors.append("events must be a list")
+        return
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            errors.append(f"event {i} is not an object")
+            continue
+        if "Event Type" not in event:
+            errors.append(f"event {i} is missing 'Event Type'")
+        elif event["Event Type"] not in schema.event_types:
+            errors.append(f"event {i} has unknown type {event['Event Type']!r}")
+        if "Relevant" not in event:
+            errors.append(f"event {i} is missing 'Relevant'")
+        elif not isinstance(event["Relevant"], bool):
+            errors.append(f"event {i} has a non-boolean 'Relevant'")
+
+def check_output(output: Any, schema: EventSchema) -> List[str]:
+    """Validate already-parsed output against a schema. Returns the list of problems."""
+    errors: List[str] = []
+    if schema.use_cot:
+        if not isinstance(output, dict):
+            errors.append("output must be an object")
+            return errors
+        if "Reasoning" not in output:
+            errors.append("missing 'Reasoning'")
+        if "Events" not in output:
+            errors.append("missing 'Events'")
+        else:
+            _check_events(output["Events"], schema, errors)
+    else:
+        if not isinstance(output, list):
+            errors.append("output must be a list")
+            return errors
+        _check_events(output, schema, errors)
+    return errors
+
+def validate(result: Union[str, Any], allowed_events: List[str], use_cot: bool = False) -> ClassificationResult:
+    """
+    Parse (if needed) and validate model output in one pass.
+
+    Args:
+        result: Raw model output string, or output that has already been parsed
+        allowed_events: List of allowed event types
+        use_cot: Whether to validate the chain-of-thought shape
+
+    Returns:
+        ClassificationResult: Parsed output with its validation outcome
+    """
+    schema = compile_schema(allowed_events, use_cot)
+    if isinstance(result, str):
+        try:
+            result = parse_output(result, schema.accepts)
+        except ValueError as e:
+            return ClassificationResult(None, False, [str(e)])
+    errors = check_output(result, schema)
+    return ClassificationResult(result, not errors, errors)
+
+def validate_zero_shot(result: Union[str, Any], allowed_events: List[str]) -> bool:
     """
     Validate zero-shot classification output.
-    
+
     Args:
-        result: Raw model output string
+        result: Raw model output string or parsed output
         allowed_events: List of allowed event types
-        
+
     Returns:
         bool: True if validation passes, False otherwise
     """
-    try:
-        # Try to parse as JSON
-        parsed = json.loads(result)
-        
-        # Check if it's a list
-        if not isinstance(parsed, list):
-            return False
-            
-        # Validate each event
-        for event in parsed:
-            if not isinstance(event, dict):
-                return False
-                
-            if "Event Type" not in event:
-                return False
-                
-            if "Relevant" not in event:
-                return False
-                
-            if event["Event Type"] not in allowed_events:
-                return False
-                
-            if not isinstance(event["Relevant"], bool):
-                return False
-                
-        return True
-        
-    except json.JSONDecodeError:
-        return False
+    return validate(result, allowed_events, use_cot=False).valid
 
-def validate_cot(result: str, allowed_events: List[str]) -> bool:
+def validate_cot(result: Union[str, Any], allowed_events: List[str]) -> bool:
     """
     Validate chain-of-thought classification output.
-    
+
     Args:
-        result: Raw model output string
+        result: Raw model output string or parsed output
         allowed_events: List of allowed event types
-        
+
     Returns:
         bool: True if validation passes, False otherwise
     """
-    try:
-        # Try to parse as JSON
-        parsed = json.loads(result)
-        
-        # Check if it's a dictionary
-        if not isinstance(parsed, dict):
-            return False
-            
-        # Check for required fields
-        if "Events" not in parsed:
-            return False
-            
-        if "Reasoning" not in parsed:
-            return False
-            
-        # Validate events list
-        if not isinstance(parsed["Events"], list):
-            return False
-            
-        # Validate each event
-        for event in parsed["Events"]:
-            if not isinstance(event, dict):
-                return False
-                
-            if "Event Type" not in event:
-                return False
-                
-            if "Relevant" not in event:
-                return False
-                
-            if event["Event Type"] not in allowed_events:
-                return False
-                
-            if not isinstance(event["Relevant"], bool):
-                return False
-                
-        return True
-        
-    except json.JSONDecodeError:
-        return False
+    return validate(result, allowed_events, use_cot=True).valid
 
 if __name__ == "__main__":
     config = EventConfig()
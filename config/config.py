@@ -1,5 +1,6 @@
 import os
 import json
+import hashlib
 import argparse
 from typing import Dict, Any, List, Optional
 
@@ -57,6 +58,12 @@ class EventConfig:
             self.events[event_type]["relevant"] = relevant
             self._save_config(self.events)
     
+    @property
+    def version(self) -> str:
+        """Short content hash of the event configuration, stored with each result."""
+        digest = hashlib.sha256(json.dumps(self.events, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()[:12]
+
     def get_event_types(self) -> List[str]:
         """Get list of configured event types."""
         return list(self.events.keys())
@@ -65,6 +72,10 @@ class EventConfig:
         """Check if an event type is marked as relevant by default."""
         return self.events.get(event_type, {}).get("relevant", False)
 
+    def get_relevance_rules(self, event_type: str) -> List[Dict[str, Any]]:
+        """Get the relevance rules of an event type (thresholds on shares, amounts and titles)."""
+        return self.events.get(event_type, {}).get("relevance_rules", [])
+
 def parse_args() -> argparse.Namespace:
     """Parse command line arguments for configuration."""
     parser = argparse.ArgumentParser(description="SEC 8-K Event Classifier Configuration")
@@ -104,6 +115,9 @@ def main():
         for event_type in config.get_event_types():
             relevant = config.is_relevant(event_type)
             print(f"- {event_type} (Default Relevant: {relevant})")
+            for rule in config.get_relevance_rules(event_type):
+                conditions = ", ".join(f"{k}={v}" for k, v in rule.items() if k != "relevant")
+                print(f"    if {conditions}: Relevant {rule['relevant']}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,14 +1,93 @@
-from sqlalchemy import create_engine
+import base64
+import json
+import os
+from datetime import datetime
+from sqlalchemy import create_engine, event, func, insert, select, tuple_
 from sqlalchemy.orm import sessionmaker
-from data.models import Result
+from data.models import Result, utcnow
+from telemetry.metrics import timed
 
-DB_PATH = 'sqlite:///data/filings.db'
-engine = create_engine(DB_PATH)
+DB_PATH = os.getenv("RESULTS_DB_URL", 'sqlite:///data/filings.db')
+
+# Applied to every new SQLite connection. WAL lets the UI's reads run alongside writes.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",       # durable at checkpoints; safe with WAL
+    "PRAGMA busy_timeout=5000",        # wait for a writer instead of failing with 'database is locked'
+    "PRAGMA cache_size=-65536",        # 64 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+# seq only orders the delta feed; it is not part of a result
+RESULT_FIELDS = tuple(c.name for c in Result.__table__.columns if c.name != 'seq')
+# Listing leaves out the filing text unless it is asked for
+LIST_FIELDS = tuple(f for f in RESULT_FIELDS if f != 'text')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def make_engine(url: str = DB_PATH):
+    """Create an engine for the results database; SQLite connections get SQLITE_PRAGMAS."""
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _configure_sqlite)
+    return engine
+
+engine = make_engine()
 Session = sessionmaker(bind=engine)
 
-def insert_result(id, url=None, text=None, model_output=None, validation=None, expected=None, company=None, template=None):
+def result_row(id, url=None, text=None, model_output=None, validation=None, expected=None, company=None,
+               template=None, model=None, config_version=None, retries=0, repairs=0, created_at=None,
+               answered_by=None, escalation=None):
+    """A complete `results` row with defaults filled in, ready for a bulk insert."""
+    return {
+        'id': id,
+        'url': url,
+        'text': text,
+        'model_output': model_output,
+        'validation': validation,
+        'expected': expected,
+        'company': company,
+        'template': template,
+        'model': model,
+        'config_version': config_version,
+        'retries': retries,
+        'repairs': repairs,
+        'created_at': created_at or utcnow(),
+        'answered_by': answered_by,
+        'escalation': escalation,
+    }
+
+@timed("db_insert")
+def insert_results(rows):
+    """
+    Insert many results in a single transaction (one commit, one fsync).
+
+    Args:
+        rows: Dicts with the keyword arguments of insert_result
+    """
+    if not rows:
+        return
     session = Session()
-    result = Result(
+    try:
+        session.execute(insert(Result), [result_row(**row) for row in rows])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def insert_result(id, url=None, text=None, model_output=None, validation=None, expected=None, company=None,
+                  template=None, model=None, config_version=None, retries=0, repairs=0,
+                  answered_by=None, escalation=None):
+    insert_results([dict(
         id=id,
         url=url,
         text=text,
@@ -16,11 +95,14 @@ def insert_result(id, url=None, text=None, model_output=None, validation=None, e
         validation=validation,
         expected=expected,
         company=company,
-        template=template
-    )
-    session.add(result)
-    session.commit()
-    session.close()
+        template=template,
+        model=model,
+        config_version=config_version,
+        retries=retries,
+        repairs=repairs,
+        answered_by=answered_by,
+        escalation=escalation
+    )])
 
 
 def get_result_by_id(result_id):
@@ -36,16 +118,140 @@ def get_results_by_url(url):
     session.close()
     return results
 
+
+def find_reusable_result(url, template, model, config_version, since):
+    """
+    Newest valid result for the same filing, template, model and event configuration
+    stored at or after `since`, or None.
+    """
+    query = (
+        select(Result)
+        .where(Result.url == url, Result.template == template, Result.model == model,
+               Result.config_version == config_version, Result.validation == 'true', Result.created_at >= since)
+        .order_by(Result.created_at.desc())
+        .limit(1)
+    )
+    session = Session()
+    try:
+        return session.execute(query).scalar_one_or_none()
+    finally:
+        session.close()
+
+
+def encode_cursor(created_at, result_id):
+    """Opaque keyset cursor pointing just past a row."""
+    raw = json.dumps([created_at.isoformat(sep=' '), result_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, result_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), result_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _result_query(fields, url, company, template):
+    fields = list(fields or LIST_FIELDS)
+    unknown = [f for f in fields if f not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    # created_at is always selected so the page can produce the next cursor
+    columns = [getattr(Result, f) for f in fields] + [Result.created_at.label('_created_at')]
+    query = select(*columns)
+    for column, value in ((Result.url, url), (Result.company, company), (Result.template, template)):
+        if value is not None:
+            query = query.where(column == value)
+    return query, fields
+
+@timed("db_query")
+def _fetch(query):
+    session = Session()
+    try:
+        return session.execute(query).all()
+    finally:
+        session.close()
+
+def list_results(limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None, url=None, company=None, template=None):
+    """
+    One page of results, newest first, using keyset pagination on (created_at, id).
+
+    Args:
+        limit: Page size (at most MAX_PAGE_SIZE)
+        cursor: `next_cursor` from the previous page, or None for the first page
+        fields: Columns to return (default LIST_FIELDS; 'id' is always included)
+        url, company, template: Optional exact-match filters
+
+    Returns:
+        tuple: (list of result dicts, next_cursor or None on the last page)
+    """
+    query, fields = _result_query(fields, url, company, template)
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if cursor:
+        created_at, result_id = decode_cursor(cursor)
+        query = query.where(tuple_(Result.created_at, Result.id) < (created_at, result_id))
+    query = query.order_by(Result.created_at.desc(), Result.id.desc()).limit(limit + 1)
+
+    rows = _fetch(query)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._created_at, rows[-1].id)
+    return [_row_to_dict(row, fields) for row in rows], next_cursor
+
+def encode_since_cursor(seq):
+    """Opaque delta-feed cursor pointing just past the row with this seq."""
+    return base64.urlsafe_b64encode(json.dumps({'seq': seq}).encode()).decode()
+
+def decode_since_cursor(cursor):
+    try:
+        seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))['seq']
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(seq, int):
+        raise ValueError("Invalid cursor")
+    return seq
+
+def list_results_since(cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None, url=None, company=None, template=None):
+    """
+    Results committed after a cursor, in commit order: the delta feed for polling clients.
+    Follows `seq` rather than created_at, which is taken before a row is queued for the
+    writer, so a row committed late with an earlier created_at is still returned.
+
+    Args:
+        cursor: Cursor from a previous call or from head_cursor; None starts from the oldest result
+        limit: Page size (at most MAX_PAGE_SIZE); a full page means more rows are waiting
+        fields, url, company, template: As for list_results
+
+    Returns:
+        tuple: (list of result dicts, cursor for the next call; the given cursor if nothing is new)
+    """
+    query, fields = _result_query(fields, url, company, template)
+    query = query.add_columns(Result.seq.label('_seq'))
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if cursor:
+        query = query.where(Result.seq > decode_since_cursor(cursor))
+    query = query.order_by(Result.seq).limit(limit)
+
+    rows = _fetch(query)
+    if rows:
+        cursor = encode_since_cursor(rows[-1]._seq)
+    return [_row_to_dict(row, fields) for row in rows], cursor
+
+def head_cursor():
+    """Cursor at the last committed result, to follow with list_results_since."""
+    seq = _fetch(select(func.max(Result.seq)))[0][0]
+    return encode_since_cursor(seq) if seq is not None else None
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _row_to_dict(row, fields):
+    mapping = row._mapping
+    return {f: _serialize(mapping[f]) for f in fields}
+
 def result_to_dict(result):
     if not result:
         return None
-    return {
-        'id': result.id,
-        'url': result.url,
-        'text': result.text,
-        'model_output': result.model_output,
-        'validation': result.validation,
-        'expected': result.expected,
-        'company': result.company,
-        'template': result.template
-    } 
\ No newline at end of file
+    return {f: _serialize(getattr(result, f)) for f in RESULT_FIELDS}
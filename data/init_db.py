@@ -1,6 +1,5 @@
-from sqlalchemy import create_engine
-from data.models import Base
- 
-engine = create_engine('sqlite:///data/filings.db')
-Base.metadata.create_all(engine)
-print('Database and tables created.') 
\ No newline at end of file
+from data.migrations import migrate
+
+# Creates the database or upgrades it to the latest schema version
+version = migrate(verbose=True)
+print(f'Database and tables created (schema version {version}).')
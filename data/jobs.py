@@ -0,0 +1,230 @@
+import uuid
+from typing import List, Optional, Tuple
+from sqlalchemy import func, insert, select, update
+from data import db
+from data.models import Job, JobItem, Result, utcnow
+
+# Job states; 'running' jobs found at startup are resumed
+QUEUED, RUNNING, COMPLETED, CANCELLED = 'queued', 'running', 'completed', 'cancelled'
+# Item states; 'running' items found at startup go back to 'pending'
+PENDING, DONE, FAILED = 'pending', 'done', 'failed'
+# A finished job is 'completed' if no item failed, 'failed' if every item did, else 'partial'
+PARTIAL = 'partial'
+ITEM_STATES = (PENDING, RUNNING, DONE, FAILED, CANCELLED)
+
+
+def _job_to_dict(job: Job) -> dict:
+    return {
+        'id': job.id,
+        'status': job.status,
+        'template': job.template,
+        'config_version': job.config_version,
+        'total': job.total,
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat(),
+    }
+
+
+def create_job(urls: List[str], template: str, events, config_version: str = None) -> str:
+    """
+    Queue a job and all of its items in one transaction.
+
+    Args:
+        urls: Filing URLs, processed in this order
+        template: Prompt template name
+        events: Event configuration (EventConfig.events) or a list of event types
+        config_version: EventConfig.version
+
+    Returns:
+        str: The new job id
+    """
+    job_id = str(uuid.uuid4())
+    now = utcnow()
+    session = db.Session()
+    try:
+        session.add(Job(id=job_id, status=QUEUED, template=template, events=events if isinstance(events, dict) else list(events),
+                        config_version=config_version, total=len(urls), created_at=now, updated_at=now))
+        session.flush()
+        if urls:
+            session.execute(insert(JobItem), [
+                {'job_id': job_id, 'position': i, 'url': url, 'status': PENDING}
+                for i, url in enumerate(urls)
+            ])
+        session.commit()
+    finally:
+        session.close()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Job status with per-state item counts, or None if there is no such job."""
+    session = db.Session()
+    try:
+        job = session.get(Job, job_id)
+        if job is None:
+            return None
+        counts = dict.fromkeys(ITEM_STATES, 0)
+        rows = session.execute(
+            select(JobItem.status, func.count()).where(JobItem.job_id == job_id).group_by(JobItem.status)
+        )
+        counts.update({status: count for status, count in rows})
+        return dict(_job_to_dict(job), counts=counts)
+    finally:
+        session.close()
+
+
+def list_jobs(limit: int = 50) -> List[dict]:
+    """Most recent jobs first, without item counts."""
+    session = db.Session()
+    try:
+        jobs = session.execute(select(Job).order_by(Job.created_at.desc()).limit(limit)).scalars()
+        return [_job_to_dict(job) for job in jobs]
+    finally:
+        session.close()
+
+
+def job_results(job_id: str, after: int = -1, limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+    """
+    Finished items of a job in submission order, with their results.
+
+    Args:
+        job_id: Job id
+        after: Only items with a position greater than this (the `next` value of the previous page)
+        limit: Page size
+
+    Returns:
+        tuple: (items, position to pass as `after` for the next page, or None)
+    """
+    query = (
+        select(JobItem.position, JobItem.url, JobItem.status, JobItem.error, JobItem.result_id,
+               Result.model_output, Result.validation, Result.company)
+        .outerjoin(Result, Result.id == JobItem.result_id)
+        .where(JobItem.job_id == job_id, JobItem.position > after, JobItem.status.in_((DONE, FAILED)))
+        .order_by(JobItem.position)
+        .limit(limit + 1)
+    )
+    session = db.Session()
+    try:
+        rows = session.execute(query).all()
+    finally:
+        session.close()
+    next_after = rows[limit - 1].position if len(rows) > limit else None
+    items = []
+    for row in rows[:limit]:
+        item = {'position': row.position, 'url': row.url, 'status': row.status}
+        if row.status == DONE:
+            item['result'] = {'id': row.result_id, 'model_output': row.model_output,
+                              'validation': row.validation, 'company': row.company}
+        else:
+            item['error'] = row.error
+        items.append(item)
+    return items, next_after
+
+
+def next_job() -> Optional[dict]:
+    """The oldest job that still has work: an interrupted 'running' job first, then 'queued'."""
+    session = db.Session()
+    try:
+        for status in (RUNNING, QUEUED):
+            job = session.execute(
+                select(Job).where(Job.status == status).order_by(Job.created_at).limit(1)
+            ).scalar_one_or_none()
+            if job is not None:
+                return dict(_job_to_dict(job), events=job.events)
+        return None
+    finally:
+        session.close()
+
+
+def pending_items(job_id: str) -> List[Tuple[int, str]]:
+    """(position, url) of the items that still need processing."""
+    session = db.Session()
+    try:
+        rows = session.execute(
+            select(JobItem.position, JobItem.url)
+            .where(JobItem.job_id == job_id, JobItem.status == PENDING)
+            .order_by(JobItem.position)
+        )
+        return [(position, url) for position, url in rows]
+    finally:
+        session.close()
+
+
+def set_job_status(job_id: str, status: str, only_from: Tuple[str, ...] = None) -> bool:
+    """Update a job's status, optionally only from the given states. Returns whether it changed."""
+    query = update(Job).where(Job.id == job_id)
+    if only_from:
+        query = query.where(Job.status.in_(only_from))
+    session = db.Session()
+    try:
+        changed = session.execute(query.values(status=status, updated_at=utcnow())).rowcount
+        session.commit()
+        return bool(changed)
+    finally:
+        session.close()
+
+
+def finish_job(job_id: str) -> Optional[str]:
+    """Set a running job's final status from its item outcomes. Returns it, or None if the job was not running."""
+    counts = get_job(job_id)['counts']
+    if not counts[FAILED]:
+        status = COMPLETED
+    elif counts[DONE]:
+        status = PARTIAL
+    else:
+        status = FAILED
+    return status if set_job_status(job_id, status, (RUNNING,)) else None
+
+
+def mark_item(job_id: str, position: int, status: str, result_id: str = None, error: str = None) -> None:
+    """Persist the progress of one item. Cancelled items stay cancelled."""
+    session = db.Session()
+    try:
+        session.execute(
+            update(JobItem)
+            .where(JobItem.job_id == job_id, JobItem.position == position, JobItem.status != CANCELLED)
+            .values(status=status, result_id=result_id, error=error, updated_at=utcnow())
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    Cancel a queued or running job: the job and its not-yet-finished items become 'cancelled'.
+    Returns False if the job does not exist or has already finished.
+    """
+    session = db.Session()
+    try:
+        now = utcnow()
+        changed = session.execute(
+            update(Job).where(Job.id == job_id, Job.status.in_((QUEUED, RUNNING)))
+            .values(status=CANCELLED, updated_at=now)
+        ).rowcount
+        if changed:
+            session.execute(
+                update(JobItem)
+                .where(JobItem.job_id == job_id, JobItem.status.in_((PENDING, RUNNING)))
+                .values(status=CANCELLED, updated_at=now)
+            )
+        session.commit()
+        return bool(changed)
+    finally:
+        session.close()
+
+
+def recover_jobs() -> int:
+    """
+    Put items left 'running' by a stopped process back to 'pending' so they run again.
+    Returns the number of items recovered.
+    """
+    session = db.Session()
+    try:
+        recovered = session.execute(
+            update(JobItem).where(JobItem.status == RUNNING).values(status=PENDING, updated_at=utcnow())
+        ).rowcount
+        session.commit()
+        return recovered
+    finally:
+        session.close()
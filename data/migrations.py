@@ -0,0 +1,159 @@
+"""
+Versioned schema migrations for the results database.
+
+The applied version is kept in SQLite's `PRAGMA user_version`. Each migration runs in
+its own transaction and is written so that re-running it on a database created by the
+old `Base.metadata.create_all` script is harmless.
+
+    PYTHONPATH=. python -m data.migrations
+"""
+from typing import Callable, List, Tuple
+from sqlalchemy.engine import Connection, Engine
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _create_results(conn: Connection) -> None:
+    # The original schema, as data/init_db.py used to create it
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS results (
+            id VARCHAR NOT NULL PRIMARY KEY,
+            url VARCHAR,
+            text TEXT,
+            model_output JSON NOT NULL,
+            validation VARCHAR,
+            expected JSON,
+            company VARCHAR,
+            template VARCHAR
+        )
+    """)
+
+
+def _add_result_metadata(conn: Connection) -> None:
+    existing = _columns(conn, "results")
+    for name, ddl in (
+        ("created_at", "DATETIME"),
+        ("model", "VARCHAR"),
+        ("config_version", "VARCHAR"),
+        ("retries", "INTEGER DEFAULT 0"),
+        ("repairs", "INTEGER DEFAULT 0"),
+    ):
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE results ADD COLUMN {name} {ddl}")
+    # Existing rows get the migration time; ids break the tie for pagination
+    conn.exec_driver_sql(
+        "UPDATE results SET created_at = strftime('%Y-%m-%d %H:%M:%S.000000', 'now') WHERE created_at IS NULL"
+    )
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_results_url ON results (url)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_results_company ON results (company)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_results_template ON results (template)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_results_created_at_id ON results (created_at, id)")
+
+
+def _create_jobs(conn: Connection) -> None:
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id VARCHAR NOT NULL PRIMARY KEY,
+            status VARCHAR NOT NULL,
+            template VARCHAR NOT NULL,
+            events JSON NOT NULL,
+            config_version VARCHAR,
+            total INTEGER NOT NULL,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_jobs_status_created_at ON jobs (status, created_at)")
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS job_items (
+            job_id VARCHAR NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            url VARCHAR NOT NULL,
+            status VARCHAR NOT NULL,
+            result_id VARCHAR,
+            error TEXT,
+            updated_at DATETIME,
+            PRIMARY KEY (job_id, position)
+        )
+    """)
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_job_items_job_id_status ON job_items (job_id, status)")
+
+
+def _add_answer_path(conn: Connection) -> None:
+    existing = _columns(conn, "results")
+    for name in ("answered_by", "escalation"):
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE results ADD COLUMN {name} VARCHAR")
+
+
+def _add_result_seq(conn: Connection) -> None:
+    # created_at is taken before a row is queued for the writer, so rows can commit out of
+    # created_at order; the delta feed follows seq, which the insert trigger hands out as
+    # rows are written (SQLite has one writer at a time, so seq order is commit order).
+    # The counter lives in its own table so deleting the newest rows never reuses a seq.
+    if "seq" not in _columns(conn, "results"):
+        conn.exec_driver_sql("ALTER TABLE results ADD COLUMN seq INTEGER")
+    conn.exec_driver_sql("""
+        UPDATE results SET seq = ordered.n
+        FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY created_at, id) AS n FROM results) AS ordered
+        WHERE results.id = ordered.id AND results.seq IS NULL
+    """)
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_results_seq ON results (seq)")
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS result_seq (value INTEGER NOT NULL)")
+    conn.exec_driver_sql(
+        "INSERT INTO result_seq (value) SELECT COALESCE(MAX(seq), 0) FROM results WHERE NOT EXISTS (SELECT 1 FROM result_seq)"
+    )
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS results_assign_seq AFTER INSERT ON results
+        BEGIN
+            UPDATE result_seq SET value = value + 1;
+            UPDATE results SET seq = (SELECT value FROM result_seq) WHERE rowid = NEW.rowid;
+        END
+    """)
+
+
+# (version, description, upgrade); append new migrations with the next version number
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create results table", _create_results),
+    (2, "add created_at, model, config_version, retry counts and indexes", _add_result_metadata),
+    (3, "create jobs and job_items tables", _create_jobs),
+    (4, "add answered_by and escalation to results", _add_answer_path),
+    (5, "add a commit-ordered seq to results for the delta feed", _add_result_seq),
+]
+
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine = None, verbose: bool = False) -> int:
+    """
+    Apply pending migrations in order.
+
+    Args:
+        engine: Engine to migrate (defaults to the results database)
+        verbose: Print each migration as it is applied
+
+    Returns:
+        int: Schema version after migrating
+    """
+    if engine is None:
+        from data.db import engine
+    version = current_version(engine)
+    for target, description, upgrade in MIGRATIONS:
+        if target <= version:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(target)}")
+        version = target
+        if verbose:
+            print(f"Applied migration {target}: {description}")
+    return version
+
+
+if __name__ == "__main__":
+    print(f"Database schema at version {migrate(verbose=True)}.")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Text
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
@@ -8,8 +9,22 @@ Base = declarative_base()
 def generate_uuid():
     return str(uuid.uuid4())
 
+def utcnow():
+    # Naive UTC, which is how SQLite stores DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Result(Base):
     __tablename__ = 'results'
+    # The schema is created and upgraded by data/migrations.py; keep both in sync
+    __table_args__ = (
+        Index('ix_results_url', 'url'),
+        Index('ix_results_company', 'company'),
+        Index('ix_results_template', 'template'),
+        # Newest-first keyset pagination walks this index
+        Index('ix_results_created_at_id', 'created_at', 'id'),
+        # The delta feed (/results/since/) walks this one
+        Index('ix_results_seq', 'seq', unique=True),
+    )
     id = Column(String, primary_key=True, default=generate_uuid)
     url = Column(String, nullable=True)
     text = Column(Text, nullable=True)
@@ -17,4 +32,44 @@ class Result(Base):
     validation = Column(String, nullable=True)
     expected = Column(SQLiteJSON, nullable=True)
     company = Column(String, nullable=True)
-    template = Column(String, nullable=True) 
\ No newline at end of file
+    template = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=True, default=utcnow)
+    model = Column(String, nullable=True)
+    config_version = Column(String, nullable=True)
+    retries = Column(Integer, nullable=True, default=0)
+    repairs = Column(Integer, nullable=True, default=0)
+    # Which path produced the answer ('Zero-Shot', 'Chain-of-Thought' or 'Rules') and,
+    # for the auto template, why zero-shot was escalated to CoT
+    answered_by = Column(String, nullable=True)
+    escalation = Column(String, nullable=True)
+    # Commit order, set by an insert trigger (see data/migrations.py); never written by the app
+    seq = Column(Integer, nullable=True)
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_created_at', 'status', 'created_at'),
+    )
+    id = Column(String, primary_key=True, default=generate_uuid)
+    # queued -> running -> completed / partial / failed (by item outcomes), or cancelled
+    status = Column(String, nullable=False, default='queued')
+    template = Column(String, nullable=False)
+    events = Column(SQLiteJSON, nullable=False)
+    config_version = Column(String, nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    updated_at = Column(DateTime, nullable=False, default=utcnow)
+
+class JobItem(Base):
+    __tablename__ = 'job_items'
+    __table_args__ = (
+        Index('ix_job_items_job_id_status', 'job_id', 'status'),
+    )
+    job_id = Column(String, ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+    # pending -> running -> done / failed, or cancelled
+    status = Column(String, nullable=False, default='pending')
+    result_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
@@ -0,0 +1,143 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from data import db
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_MS = 200
+
+
+def durable_default() -> bool:
+    """Whether writes wait for their commit by default (RESULTS_DURABLE=on)."""
+    return os.getenv("RESULTS_DURABLE", "off").lower() in ("on", "1", "true")
+
+
+class ResultWriter:
+    """
+    Write-behind persistence for results.
+
+    Rows submitted from any thread are queued and written by one background thread,
+    one transaction per `batch_size` rows or per `flush_ms` milliseconds, whichever
+    comes first. `submit(row)` returns at once; `submit(row, durable=True)` blocks until
+    the transaction holding the row has committed (group commit, so durable callers still
+    share fsyncs). Queued rows are flushed by `flush()`, `close()` and at interpreter exit.
+    """
+
+    def __init__(self, batch_size: int = None, flush_ms: int = None, insert=None):
+        self.batch_size = max(1, int(batch_size or os.getenv("RESULTS_WRITE_BATCH", DEFAULT_BATCH_SIZE)))
+        self.flush_seconds = int(flush_ms or os.getenv("RESULTS_WRITE_FLUSH_MS", DEFAULT_FLUSH_MS)) / 1000
+        # Looked up at call time so tests can point db.insert_results elsewhere
+        self._insert = insert or (lambda rows: db.insert_results(rows))
+        self._queue: "queue.Queue[Tuple[Optional[dict], Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.rows_written = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, row: dict, durable: bool = None) -> Future:
+        """
+        Queue one row (the keyword arguments of insert_result).
+
+        Args:
+            row: Result row
+            durable: Wait for the commit before returning (default: RESULTS_DURABLE)
+
+        Returns:
+            Future: Resolves once the row is committed; carries the exception if it failed
+        """
+        if self._closed:
+            raise RuntimeError("ResultWriter is closed")
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((row, future))
+        if durable_default() if durable is None else durable:
+            future.result()
+        return future
+
+    def flush(self, timeout: float = None) -> None:
+        """Block until every row queued so far has been written."""
+        if self._thread is None:
+            return
+        marker = Future()
+        self._queue.put((None, marker))
+        marker.result(timeout)
+
+    def close(self) -> None:
+        """Flush queued rows and refuse new ones."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+
+    def _next_batch(self) -> List[Tuple[Optional[dict], Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size and batch[-1][0] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, entries: List[Tuple[dict, Future]]) -> None:
+        try:
+            self._insert([row for row, _ in entries])
+        except Exception as e:
+            if len(entries) == 1:
+                self._fail(entries[0], e)
+                return
+            # One bad row (e.g. a duplicate id) must not lose the rest of the batch
+            for entry in entries:
+                self._write([entry])
+            return
+        self.batches += 1
+        self.rows_written += len(entries)
+        for _, future in entries:
+            future.set_result(None)
+
+    def _fail(self, entry: Tuple[dict, Future], error: Exception) -> None:
+        self.failed += 1
+        print(f"Result writer failed to store {entry[0].get('id')}: {error}")
+        entry[1].set_exception(error)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            rows = [(row, future) for row, future in batch if row is not None]
+            if rows:
+                self._write(rows)
+            for row, future in batch:
+                if row is None:
+                    future.set_result(None)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ResultWriter:
+    """Return the process-wide result writer, creating it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ResultWriter()
+                atexit.register(_writer.close)
+    return _writer
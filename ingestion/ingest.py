@@ -1,41 +1,137 @@
 import os
+import shutil
+import threading
 import requests
 import time
+from email.utils import parsedate_to_datetime
 from urllib.parse import unquote
+from requests.adapters import HTTPAdapter
+from ingestion.ratelimit import get_limiter
+from ingestion.store import FilingStore
+from telemetry.metrics import timed
 
-def download_8k(url: str, output_path: str) -> None:
+# SEC EDGAR requires specific headers
+SEC_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; SEC-CaseStudyBot/1.0; +https://yourdomain.com)',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+# Statuses EDGAR uses for throttling / temporary unavailability
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+
+_store = None
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_store() -> FilingStore:
+    """Return the default on-disk filing store."""
+    global _store
+    if _store is None:
+        _store = FilingStore()
+    return _store
+
+def get_session() -> requests.Session:
     """
-    Download an 8-K filing from SEC EDGAR.
-    
+    Return the process-wide keep-alive session used for EDGAR requests.
+    Connections are pooled, so repeat downloads skip the TCP/TLS handshake.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("EDGAR_POOL_SIZE", 16)))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(SEC_HEADERS)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+def retry_after_seconds(response, attempt: int) -> float:
+    """Delay requested by a Retry-After header (seconds or HTTP date), else exponential backoff."""
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(60.0, 2.0 ** attempt)
+
+def edgar_get(url: str, headers: dict = None) -> requests.Response:
+    """
+    GET a URL from EDGAR through the shared rate limiter.
+
+    429/503 responses pause every user of the limiter for the Retry-After period before
+    retrying. The response is streamed; read it with iter_content.
+    """
+    limiter = get_limiter()
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        response = session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        delay = retry_after_seconds(response, attempt)
+        response.close()
+        print(f"EDGAR returned {response.status_code}, backing off {delay:.1f}s: {url}")
+        limiter.block_for(delay)
+    return response
+
+@timed("download")
+def fetch_filing(url: str, store: FilingStore = None) -> str:
+    """
+    Return the local path of a filing, downloading it only when needed.
+
+    A stored copy younger than the freshness window is returned without touching the
+    network. An older copy is revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged filing costs a 304 instead of a full download.
+
     Args:
         url: URL of the 8-K filing
-        output_path: Path to save the downloaded file
+        store: Filing store to use (defaults to data/filings)
+
+    Returns:
+        str: Path to the raw filing bytes
     """
-    # Clean up the URL and filename
-    url = unquote(url)  # Decode URL-encoded characters
-    filename = os.path.basename(url).strip()  # Remove any whitespace
-    
-    # SEC EDGAR requires specific headers
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; SEC-CaseStudyBot/1.0; +https://yourdomain.com)',
-        'Accept-Encoding': 'gzip, deflate',
-        'Host': 'www.sec.gov'
-    }
-    
+    store = store or get_store()
+    # Clean up the URL
+    url = unquote(url).strip()  # Decode URL-encoded characters
+    meta = store.metadata(url)
+    if store.is_fresh(meta):
+        return store.path_for(url)
+
     try:
-        # SEC requires 10 requests per second limit
-        time.sleep(0.1)  # Add a small delay to respect rate limits
-        
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Save the file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-            
+        response = edgar_get(url, headers=store.conditional_headers(meta))
+        with response:
+            if response.status_code == 304 and meta:
+                return store.touch(url, meta)
+            response.raise_for_status()  # Raise an exception for bad status codes
+            # iter_content decodes gzip on the fly while writing to disk
+            return store.save(url, response.iter_content(CHUNK_SIZE), response.headers)
     except requests.exceptions.RequestException as e:
         print(f"Failed to download filing (status {getattr(e.response, 'status_code', 'unknown')}): {url}")
         raise
+
+def download_8k(url: str, output_path: str) -> None:
+    """
+    Download an 8-K filing from SEC EDGAR.
+
+    Args:
+        url: URL of the 8-K filing
+        output_path: Path to save the downloaded file
+    """
+    path = fetch_filing(url)
+
+    # Create directory if it doesn't exist
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    # Save the raw bytes
+    if os.path.abspath(path) != os.path.abspath(output_path):
+        shutil.copyfile(path, output_path)
@@ -1,13 +1,123 @@
-from bs4 import BeautifulSoup
+import codecs
+import io
+import re
+from lxml import etree
+from telemetry.metrics import timed
 
+CHUNK_SIZE = 64 * 1024
+
+# Elements whose content never shows up as filing text. ix:header holds the hidden
+# inline-XBRL facts that iXBRL 8-Ks carry at the top of the document.
+SKIP_TAGS = frozenset({"script", "style", "template", "ix:header"})
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_\-]+)', re.IGNORECASE)
+
+
+def sniff_encoding(head: bytes) -> str:
+    """Pick the document encoding from a BOM or a <meta charset> in the first chunk."""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    match = _CHARSET_RE.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+class _TextCollector:
+    """
+    lxml parser target that writes whitespace-normalized text as the parser emits it.
+
+    No tree is built: text goes straight into the output buffer, every element boundary
+    counts as whitespace, and runs of whitespace collapse to one space.
+    """
+
+    def __init__(self):
+        self.out = io.StringIO()
+        self.skip_depth = 0
+        self.pending_space = False
+        self.empty = True
+
+    def start(self, tag, attrib):
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+        self.pending_space = True
+
+    def end(self, tag):
+        if self.skip_depth:
+            self.skip_depth -= 1
+        self.pending_space = True
+
+    def data(self, text):
+        if self.skip_depth:
+            return
+        words = text.split()
+        if not words:
+            if text:
+                self.pending_space = True
+            return
+        if text[0].isspace():
+            self.pending_space = True
+        for i, word in enumerate(words):
+            if (i or self.pending_space) and not self.empty:
+                self.out.write(" ")
+            self.out.write(word)
+            self.empty = False
+            self.pending_space = False
+        if text[-1].isspace():
+            self.pending_space = True
+
+    def comment(self, text):
+        self.pending_space = True
+
+    def close(self):
+        return self.out.getvalue()
+
+
+@timed("parse")
 def extract_text_from_html(html_path):
     """
     Extracts plain text from an HTML SEC filing. Returns the text as a string.
+
+    The file is streamed through lxml's incremental HTML parser, so memory stays
+    proportional to the extracted text. Script, style and hidden ix:header blocks are
+    dropped and whitespace is collapsed to single spaces in the same pass.
     """
-    with open(html_path, 'r', encoding='utf-8') as f:
-        html = f.read()
-    soup = BeautifulSoup(html, "html.parser")
-    return soup.get_text(separator="\n").strip()
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector)
+    decoder = None
+    fed = False
+    with open(html_path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(sniff_encoding(chunk))()
+            try:
+                text = decoder.decode(chunk)
+            except UnicodeDecodeError:
+                # Undeclared legacy encoding: fall back to Windows-1252 for the rest
+                decoder = codecs.getincrementaldecoder("cp1252")(errors="replace")
+                text = decoder.decode(chunk)
+            if text:
+                parser.feed(text)
+                fed = True
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            parser.feed(tail)
+            fed = True
+    if not fed:
+        return ""
+    try:
+        return parser.close()
+    except etree.XMLSyntaxError:
+        return collector.close()
 
 if __name__ == "__main__":
     # Quick test: print the first 1000 characters of a parsed Apple 8-K
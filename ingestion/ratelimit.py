@@ -0,0 +1,119 @@
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process backend is available
+    fcntl = None
+
+# SEC EDGAR fair-access policy: at most 10 requests per second per client
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 1.0
+DEFAULT_STATE_PATH = "data/.edgar_ratelimit"
+
+_STATE = struct.Struct("ddd")  # tokens, last refill time, blocked until
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every thread in the process.
+
+    With `path` set, the bucket state lives in a small file guarded by an exclusive
+    `flock`, so worker processes on the same machine share one budget as well.
+    `block_for` pauses every holder of the bucket, e.g. after a 429 with Retry-After.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST, path: str = None):
+        self.rate = rate
+        self.burst = burst
+        self.path = path if fcntl is not None else None
+        self.lock = threading.Lock()
+        self.state = (burst, time.time(), 0.0)
+        if self.path:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._open()
+
+    def _open(self):
+        # flock is per open file, so each process needs its own descriptor.
+        # Open without truncating so concurrent processes keep the shared state.
+        self.pid = os.getpid()
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _update(self, fn):
+        """Apply fn to the shared (tokens, last, blocked_until) state atomically."""
+        with self.lock:
+            if not self.path:
+                self.state, result = fn(self.state)
+                return result
+            if self.pid != os.getpid():
+                self._open()
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(self.fd, _STATE.size, 0)
+                state = _STATE.unpack(data) if len(data) == _STATE.size else (self.burst, time.time(), 0.0)
+                state, result = fn(state)
+                os.pwrite(self.fd, _STATE.pack(*state), 0)
+                return result
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _take(self, state):
+        tokens, last, blocked_until = state
+        now = time.time()
+        if now < blocked_until:
+            return (tokens, now, blocked_until), blocked_until - now
+        tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+        if tokens >= 1:
+            return (tokens - 1, now, blocked_until), 0.0
+        return (tokens, now, blocked_until), (1 - tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a request may be sent. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self._update(self._take)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def block_for(self, seconds: float) -> None:
+        """Stop every user of the bucket from sending for `seconds`."""
+        until = time.time() + seconds
+
+        def block(state):
+            tokens, last, blocked_until = state
+            return (0.0, last, max(blocked_until, until)), None
+
+        self._update(block)
+
+    def close(self) -> None:
+        if self.path:
+            os.close(self.fd)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> TokenBucket:
+    """
+    Return the process-wide EDGAR limiter.
+
+    EDGAR_RATE_LIMIT sets requests per second. EDGAR_RATE_LIMIT_BACKEND is 'file'
+    (default, shared across processes via EDGAR_RATE_LIMIT_PATH) or 'thread'.
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend = os.getenv("EDGAR_RATE_LIMIT_BACKEND", "file")
+                _limiter = TokenBucket(
+                    rate=float(os.getenv("EDGAR_RATE_LIMIT", DEFAULT_RATE)),
+                    burst=float(os.getenv("EDGAR_RATE_LIMIT_BURST", DEFAULT_BURST)),
+                    path=os.getenv("EDGAR_RATE_LIMIT_PATH", DEFAULT_STATE_PATH) if backend == "file" else None,
+                )
+    return _limiter
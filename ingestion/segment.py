@@ -0,0 +1,130 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from telemetry.metrics import timed
+
+# Form 8-K item numbers and their official captions
+ITEM_TITLES = {
+    "1.01": "Entry into a Material Definitive Agreement",
+    "1.02": "Termination of a Material Definitive Agreement",
+    "1.03": "Bankruptcy or Receivership",
+    "1.04": "Mine Safety - Reporting of Shutdowns and Patterns of Violations",
+    "1.05": "Material Cybersecurity Incidents",
+    "2.01": "Completion of Acquisition or Disposition of Assets",
+    "2.02": "Results of Operations and Financial Condition",
+    "2.03": "Creation of a Direct Financial Obligation",
+    "2.04": "Triggering Events That Accelerate or Increase a Direct Financial Obligation",
+    "2.05": "Costs Associated with Exit or Disposal Activities",
+    "2.06": "Material Impairments",
+    "3.01": "Notice of Delisting or Failure to Satisfy a Continued Listing Rule",
+    "3.02": "Unregistered Sales of Equity Securities",
+    "3.03": "Material Modification to Rights of Security Holders",
+    "4.01": "Changes in Registrant's Certifying Accountant",
+    "4.02": "Non-Reliance on Previously Issued Financial Statements",
+    "5.01": "Changes in Control of Registrant",
+    "5.02": "Departure of Directors or Certain Officers; Election of Directors; Appointment of Certain Officers",
+    "5.03": "Amendments to Articles of Incorporation or Bylaws; Change in Fiscal Year",
+    "5.04": "Temporary Suspension of Trading Under Registrant's Employee Benefit Plans",
+    "5.05": "Amendments to the Registrant's Code of Ethics",
+    "5.06": "Change in Shell Company Status",
+    "5.07": "Submission of Matters to a Vote of Security Holders",
+    "5.08": "Shareholder Director Nominations",
+    "6.01": "ABS Informational and Computational Material",
+    "7.01": "Regulation FD Disclosure",
+    "8.01": "Other Events",
+    "9.01": "Financial Statements and Exhibits",
+}
+
+# Items that only list attachments; they carry no event of their own
+NON_SUBSTANTIVE_ITEMS = frozenset({"9.01"})
+# Exhibit series kept for classification (99.x = press releases and other additional exhibits)
+SUBSTANTIVE_EXHIBIT_PREFIXES = ("99.",)
+
+_ITEM_RE = re.compile(r'\bItem\s*(\d{1,2}\.\d{2})\b\.?', re.IGNORECASE)
+# Words that turn "Item 2.03" into a cross-reference rather than a heading
+_REFERENCE_WORDS = frozenset({"in", "under", "this", "to", "of", "and", "see", "per", "into", "by", "with", "pursuant"})
+_SIGNATURE_RE = re.compile(r'\bSIGNATURES?\b(?=\W{0,5}Pursuant to the requirements)', re.IGNORECASE)
+_EXHIBIT_INDEX_RE = re.compile(r'\bEXHIBIT INDEX\b')
+_EXHIBIT_RE = re.compile(r'\bEXHIBIT\s+(\d{1,3}\.\d{1,2})\b')
+
+
+@dataclass
+class Section:
+    kind: str               # 'cover', 'item', 'signature', 'exhibit_index' or 'exhibit'
+    number: Optional[str]   # item or exhibit number, e.g. '5.02' or '99.1'
+    title: str
+    start: int
+    end: int
+
+    def text(self, source: str) -> str:
+        return source[self.start:self.end].strip()
+
+
+def _item_headings(text: str) -> List[Tuple[int, str]]:
+    """Item headings in order, skipping cross-references like 'described in Item 1.01'."""
+    headings = []
+    last = None
+    for match in _ITEM_RE.finditer(text):
+        number = match.group(1)
+        before = text[max(0, match.start() - 20):match.start()].split()
+        if before and before[-1].lower().strip(',;:(') in _REFERENCE_WORDS:
+            continue
+        # Items are reported in ascending order; a lower or repeated number is a reference
+        if last is not None and tuple(map(int, number.split('.'))) <= tuple(map(int, last.split('.'))):
+            continue
+        headings.append((match.start(), number))
+        last = number
+    return headings
+
+
+def segment_8k(text: str) -> List[Section]:
+    """
+    Split an 8-K's text into cover page, Items, signature block, exhibit index and exhibits.
+
+    Returns the sections in document order with character offsets into `text`. A text
+    without any Item heading comes back as a single 'cover' section.
+    """
+    boundaries = [(pos, "item", number, ITEM_TITLES.get(number, "")) for pos, number in _item_headings(text)]
+    signature = _SIGNATURE_RE.search(text)
+    if signature:
+        boundaries.append((signature.start(), "signature", None, "Signatures"))
+    index = _EXHIBIT_INDEX_RE.search(text)
+    if index:
+        boundaries.append((index.start(), "exhibit_index", None, "Exhibit Index"))
+    # Exhibit bodies follow the signatures when they are part of the same document
+    tail_start = signature.start() if signature else len(text)
+    for match in _EXHIBIT_RE.finditer(text, tail_start):
+        boundaries.append((match.start(), "exhibit", match.group(1), f"Exhibit {match.group(1)}"))
+    boundaries.sort(key=lambda b: b[0])
+
+    sections = []
+    first = boundaries[0][0] if boundaries else len(text)
+    if first > 0 or not boundaries:
+        sections.append(Section("cover", None, "Cover Page", 0, first))
+    for i, (start, kind, number, title) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(text)
+        sections.append(Section(kind, number, title, start, end))
+    return sections
+
+
+@timed("segment")
+def substantive_text(text: str) -> Tuple[str, List[str]]:
+    """
+    Keep only the substantive sections of an 8-K for classification.
+
+    Drops the cover page, Item 9.01, signatures, the exhibit index and exhibits other
+    than 99.x press releases. Returns (text, item_numbers); the text starts with a
+    one-line hint naming the reported Items. Filings without recognizable Items are
+    returned unchanged.
+    """
+    sections = segment_8k(text)
+    items = [s for s in sections if s.kind == "item" and s.number not in NON_SUBSTANTIVE_ITEMS]
+    if not items:
+        return text, []
+    exhibits = [s for s in sections if s.kind == "exhibit" and s.number.startswith(SUBSTANTIVE_EXHIBIT_PREFIXES)]
+    numbers = [s.number for s in items]
+    hint = "Reported 8-K Items: " + "; ".join(
+        f"{n} {ITEM_TITLES[n]}" if n in ITEM_TITLES else n for n in numbers
+    )
+    body = "\n\n".join(s.text(text) for s in items + exhibits)
+    return f"{hint}\n\n{body}", numbers
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+DEFAULT_STORE_DIR = "data/filings"
+DEFAULT_FRESHNESS_SECONDS = 24 * 60 * 60
+
+
+class FilingStore:
+    """
+    On-disk store of downloaded filings, keyed by full URL.
+
+    Each filing is kept as the raw response bytes next to a JSON sidecar holding the
+    validators (ETag / Last-Modified) and the time it was last confirmed fresh.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR, freshness_seconds: Optional[float] = None):
+        self.root = root
+        if freshness_seconds is None:
+            freshness_seconds = float(os.getenv("FILING_FRESHNESS_SECONDS", DEFAULT_FRESHNESS_SECONDS))
+        self.freshness_seconds = freshness_seconds
+
+    def path_for(self, url: str) -> str:
+        """Local path of the stored body. The hash prefix keeps equal basenames apart."""
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+        basename = os.path.basename(urlsplit(url).path) or "index.htm"
+        return os.path.join(self.root, f"{digest}-{basename}")
+
+    def _meta_path(self, url: str) -> str:
+        return self.path_for(url) + ".json"
+
+    def metadata(self, url: str) -> Optional[dict]:
+        """Return the stored metadata for a URL, or None if the body is missing."""
+        if not os.path.exists(self.path_for(url)):
+            return None
+        try:
+            with open(self._meta_path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, meta: Optional[dict]) -> bool:
+        return bool(meta) and time.time() - meta.get("fetched_at", 0) < self.freshness_seconds
+
+    def conditional_headers(self, meta: Optional[dict]) -> dict:
+        """Headers that let the server answer 304 Not Modified for an unchanged filing."""
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def _write_meta(self, url: str, meta: dict) -> None:
+        tmp = f"{self._meta_path(url)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(url))
+
+    def save(self, url: str, content, headers) -> str:
+        """
+        Store a fresh response body and its validators. Returns the body path.
+        `content` is either bytes or an iterable of byte chunks.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path_for(url)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in ([content] if isinstance(content, bytes) else content):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._write_meta(url, {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type"),
+            "size": size,
+            "fetched_at": time.time(),
+        })
+        return path
+
+    def touch(self, url: str, meta: dict) -> str:
+        """Record that the stored copy was revalidated (304) just now."""
+        self._write_meta(url, {**meta, "fetched_at": time.time()})
+        return self.path_for(url)
@@ -3,155 +3,167 @@ import sys
 import argparse
 import json
 import uuid
-from ingestion.ingest import download_8k
+from ingestion.ingest import fetch_filing
 from ingestion.parse import extract_text_from_html
-from classify.classify import classify_event
-from classify.validator import validate_zero_shot, validate_cot
+from classify.classify import TEMPLATES, answer_path, classify_with_template
+from classify.evaluation import DEFAULT_EVAL_WORKERS, Checkpoint, checkpoint_path, rules_report, run_evaluation, summarize
+from classify.llm_client import resolve_model
+from classify.rules import compile_rules
 from data.db import insert_result
+from data.migrations import migrate
+from data.writer import get_writer
 from config.config import EventConfig
+from telemetry.metrics import format_summary, get_metrics, labels
+from telemetry.profiling import profile_request
 
-DATA_DIR = "data/filings"
 GROUND_TRUTH_PATH = "config/ground_truth.json"
 OUTPUTS_DIR = "outputs"
 
-def eval_ground_truth(template, config_path=None, store_in_db=False):
-    """Evaluate against ground truth examples."""
+def eval_ground_truth(template, config_path=None, store_in_db=False, workers=None, resume=False, model=None):
+    """
+    Evaluate against ground truth examples.
+
+    Examples are classified on `workers` threads (EVAL_WORKERS, default 4). Finished
+    examples are checkpointed under outputs/, and with `resume` a rerun of the same
+    evaluation skips them.
+    """
     print(f"\nStarting ground truth evaluation using {template} template...")
     with open(GROUND_TRUTH_PATH) as f:
         examples = json.load(f)
     print(f"Loaded {len(examples)} examples from ground truth.")
-    results = {}
     config = EventConfig(config_path)
     allowed_events = config.get_event_types()
-    
-    # Initialize metrics
-    total = len(examples)
-    correct_event = 0
-    correct_relevance = 0
-    confusion_matrix = {event: {event: 0 for event in allowed_events} for event in allowed_events}
-    
-    for i, ex in enumerate(examples, 1):
-        print(f"\nProcessing example {i}/{len(examples)}...")
-        print(f"Text: {ex['text'][:100]}...")  # Print first 100 chars of text
-        result = classify_event(ex['text'], allowed_events, template == 'cot.tpl')
-        # Try to parse model output as JSON
-        try:
-            parsed_output = json.loads(result)
-        except Exception:
-            parsed_output = result
-        # Generate a unique ID for this evaluation run
-        req_id = f"{ex.get('filing_id', 'unknown')}_{str(uuid.uuid4())[:8]}"
-        
-        # Validate the output
-        if template == 'zero_shot.tpl':
-            validation = validate_zero_shot(result, allowed_events)
-        else:
-            validation = validate_cot(result, allowed_events)
-            
-        print(f"Model output: {result}")
-        print(f"Validation: {validation}")
-        
-        # Get predicted event and relevance
-        if template == 'zero_shot.tpl':
-            predicted_event = parsed_output[0]['Event Type'] if parsed_output else None
-            predicted_relevance = parsed_output[0]['Relevant'] if parsed_output else None
-        else:
-            predicted_event = parsed_output['Events'][0]['Event Type'] if parsed_output.get('Events') else None
-            predicted_relevance = parsed_output['Events'][0]['Relevant'] if parsed_output.get('Events') else None
-            
-        # Update metrics
-        if predicted_event == ex['expected_event']:
-            correct_event += 1
-        if predicted_relevance == ex['expected_relevance']:
-            correct_relevance += 1
-            
-        # Update confusion matrix
-        if predicted_event and ex['expected_event']:
-            confusion_matrix[ex['expected_event']][predicted_event] += 1
-            
-        results[req_id] = {
-            'id': req_id,
-            'text': ex['text'],
-            'model_output': parsed_output,
-            'expected_event': ex['expected_event'],
-            'expected_relevance': ex['expected_relevance'],
-            'validation': validation
-        }
+    workers = workers or int(os.getenv("EVAL_WORKERS", DEFAULT_EVAL_WORKERS))
+
+    os.makedirs(OUTPUTS_DIR, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path(OUTPUTS_DIR, template, examples, allowed_events, model))
+    if resume:
+        print(f"Resuming from checkpoint '{checkpoint.path}'.")
+    else:
+        checkpoint.remove()
+
+    finished = [0]
+
+    def report(i, record):
+        finished[0] += 1
+        status = record['error'] or f"{record['predicted_event']} (validation: {record['validation']})"
+        print(f"[{finished[0]}] example {i + 1}/{len(examples)} in {record['latency_seconds']:.2f}s: {status}")
         # Insert into DB - only store model output if store_in_db is True
-        if store_in_db:
-            insert_result(
-                id=req_id, 
-                text=ex['text'], 
-                model_output=parsed_output,
-                validation=str(validation).lower()
-            )
-    
-    # Calculate and print metrics
-    event_accuracy = correct_event / total
-    relevance_accuracy = correct_relevance / total
-    
+        if store_in_db and record['error'] is None:
+            get_writer().submit(dict(
+                id=f"{record['filing_id']}_{str(uuid.uuid4())[:8]}",
+                text=record['text'],
+                model_output=record['model_output'],
+                validation=str(record['validation']).lower(),
+                model=record.get('model') or resolve_model(model),
+                config_version=config.version,
+                retries=record['retries'],
+                repairs=record['repairs']
+            ))
+
+    records = run_evaluation(examples, allowed_events, template, workers=workers,
+                             checkpoint=checkpoint, on_record=report, rules=compile_rules(config.events), model=model)
+    if store_in_db:
+        get_writer().flush()
+    metrics = summarize(records, allowed_events)
+    metrics['telemetry'] = get_metrics().summary()
+    results = {}
+    for record in records:
+        req_id = f"{record['filing_id']}_{record['key'][:8]}"
+        results[req_id] = dict(record, id=req_id)
+
+    latency = metrics['latency']
     print("\nEvaluation Metrics:")
-    print(f"Total examples: {total}")
-    print(f"Event accuracy: {event_accuracy:.2%}")
-    print(f"Relevance accuracy: {relevance_accuracy:.2%}")
+    print(f"Total examples: {metrics['total']} ({metrics['resumed']} resumed, {metrics['errors']} errors, "
+          f"{metrics['repairs']} repairs, {metrics['retries']} retries)")
+    print(f"Event accuracy: {metrics['event_accuracy']:.2%}")
+    print(f"Relevance accuracy: {metrics['relevance_accuracy']:.2%}")
+    if metrics['rules']['answered']:
+        print(f"Answered by rules: {metrics['rules']['answered']} ({metrics['rules']['short_circuit_rate']:.0%}), "
+              f"event accuracy {metrics['rules']['event_accuracy']:.2%}")
+    if metrics['escalations']['count']:
+        reasons = ", ".join(f"{k} {v}" for k, v in metrics['escalations']['reasons'].items())
+        print(f"Escalated to CoT: {metrics['escalations']['count']} ({metrics['escalations']['rate']:.0%}; {reasons})")
+    print("Answered by: " + ", ".join(f"{path} {n}" for path, n in metrics['answered_by'].items()))
+    if latency['count']:
+        print(f"Latency: p50 {latency['p50_seconds']:.2f}s, p95 {latency['p95_seconds']:.2f}s, "
+              f"max {latency['max_seconds']:.2f}s over {latency['count']} examples")
     print("\nConfusion Matrix:")
     for true_event in allowed_events:
         print(f"\nTrue {true_event}:")
         for pred_event in allowed_events:
-            count = confusion_matrix[true_event][pred_event]
+            count = metrics['confusion_matrix'][true_event][pred_event]
             if count > 0:
                 print(f"  Predicted {pred_event}: {count}")
-    
+
     # Save results to a JSON file
-    os.makedirs(OUTPUTS_DIR, exist_ok=True)
     output_file = os.path.join(OUTPUTS_DIR, f'evaluation_results_{str(uuid.uuid4())}.json')
     with open(output_file, 'w') as f:
-        json.dump({
-            'results': results,
-            'metrics': {
-                'total': total,
-                'event_accuracy': event_accuracy,
-                'relevance_accuracy': relevance_accuracy,
-                'confusion_matrix': confusion_matrix
-            }
-        }, f, indent=2)
+        json.dump({'results': results, 'metrics': metrics}, f, indent=2)
+    if metrics['errors']:
+        print(f"\n{metrics['errors']} examples failed; rerun with --resume to retry only those.")
+    else:
+        checkpoint.remove()
     print(f"\nEvaluation complete! Results saved to '{output_file}'.")
+    return metrics
+
+def report_rules(template, config_path=None, compare_llm=True, workers=None, model=None):
+    """Short-circuit rate of the rule pre-classifier on ground truth and its agreement with the LLM."""
+    with open(GROUND_TRUTH_PATH) as f:
+        examples = json.load(f)
+    config = EventConfig(config_path)
+    workers = workers or int(os.getenv("EVAL_WORKERS", DEFAULT_EVAL_WORKERS))
+    report = rules_report(examples, config.get_event_types(), compile_rules(config.events), template,
+                          compare_llm=compare_llm, workers=workers, model=model)
+    print(f"\nRules answered {report['answered']} of {report['total']} examples "
+          f"({report['short_circuit_rate']:.0%} skip the LLM).")
+    if report['answered']:
+        print(f"Against ground truth: event accuracy {report['event_accuracy']:.2%}, "
+              f"relevance accuracy {report['relevance_accuracy']:.2%}")
+    if report['relevance_decided']:
+        print(f"Relevance rules decided {report['relevance_decided']} examples, "
+              f"accuracy {report['relevance_rule_accuracy']:.2%}")
+    if 'llm_agreement' in report:
+        print(f"Agreement with the LLM ({template}): {report['llm_agreement']:.2%}")
+        for d in report['disagreements']:
+            print(f"  {d['filing_id']}: rules {d['rules']} vs LLM {d['llm']}")
+    return report
 
 def batch_process_urls(urls, template, model=None, config_path=None, store_in_db=True):
-    os.makedirs(DATA_DIR, exist_ok=True)
     config = EventConfig(config_path)
     allowed_events = config.get_event_types()
     results = {}
     for url in urls:
-        filename = url.split('/')[-1]
-        html_path = os.path.join(DATA_DIR, filename)
         print(f"\nDownloading filing from {url}...")
-        download_8k(url, html_path)
+        html_path = fetch_filing(url)
         print(f"Extracting text from {html_path}...")
         filing_text = extract_text_from_html(html_path)
         print(f"Classifying event using {template}...")
-        result = classify_event(filing_text, allowed_events, template == 'cot.tpl')
-        if template == 'zero_shot.tpl':
-            validation = validate_zero_shot(result, allowed_events)
-        else:
-            validation = validate_cot(result, allowed_events)
-        # Try to parse model output as JSON
-        try:
-            parsed_output = json.loads(result)
-        except Exception:
-            parsed_output = result
+        result = classify_with_template(filing_text, allowed_events, template, rules=compile_rules(config.events),
+                                        model=model)
+        parsed_output, validation = result.output, result.valid
         req_id = str(uuid.uuid4())
         results[req_id] = {
             'id': req_id,
             'url': url,
             'model_output': parsed_output,
-            'validation': validation
+            'validation': validation,
+            'retries': result.retries,
+            'repairs': result.repairs,
+            'source': result.source,
+            'answered_by': answer_path(result),
+            'escalation': result.escalation
         }
         # Insert into DB
         if store_in_db:
-            insert_result(id=req_id, url=url, model_output=parsed_output, validation=str(validation).lower())
-        print(f"Model Output: {result}")
+            get_writer().submit(dict(id=req_id, url=url, model_output=parsed_output, validation=str(validation).lower(),
+                                     model=result.model or resolve_model(model), config_version=config.version,
+                                     retries=result.retries, repairs=result.repairs,
+                                     answered_by=answer_path(result), escalation=result.escalation))
+        print(f"Model Output: {json.dumps(parsed_output)}")
         print(f"Validation Result: {validation}")
+    # Rows are written in batches in the background; wait for the last ones
+    get_writer().flush()
     output_file = os.path.join(OUTPUTS_DIR, f"batch_results_{str(uuid.uuid4())}.json")
     with open(output_file, 'w') as f:
         json.dump(results, f, indent=2)
@@ -161,15 +173,44 @@ def main():
     parser = argparse.ArgumentParser(description="SEC 8-K Event Classifier Orchestrator")
     parser.add_argument('--url', type=str, help='URL of the 8-K filing to process')
     parser.add_argument('--url-list', type=str, help='Path to file with one 8-K filing URL per line (batch mode)')
-    parser.add_argument('--template', type=str, default='zero_shot.tpl', choices=['zero_shot.tpl', 'cot.tpl'], help='Prompt template to use')
-    parser.add_argument('--model', type=str, default=None, help='Ollama model name (default: llama3)')
+    parser.add_argument('--template', type=str, default='zero_shot.tpl', choices=TEMPLATES,
+                        help="Prompt template to use; 'auto' runs zero-shot and escalates to CoT when needed")
+    parser.add_argument('--model', type=str, default=None, help='Model to ask; with LLM_BACKENDS only members serving it are used (default: OLLAMA_MODEL)')
     parser.add_argument('--ground-truth', action='store_true', help='Run batch evaluation on ground-truth examples')
     parser.add_argument('--config', type=str, help='Path to event configuration file')
+    parser.add_argument('--workers', type=int, default=None, help='Examples evaluated concurrently (default: EVAL_WORKERS or 4)')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted ground-truth evaluation from its checkpoint')
+    parser.add_argument('--rules-report', action='store_true', help='Report how many ground-truth examples the rule pre-classifier answers and whether the LLM agrees')
+    parser.add_argument('--rules-only', action='store_true', help='With --rules-report, skip the LLM comparison')
+    parser.add_argument('--metrics', action='store_true', help='Print per-stage latency and pipeline counters at the end')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile and tracemalloc; writes a .pstats file and a summary under outputs/profiles')
     args = parser.parse_args()
+    # Results are stored in the database; make sure its schema is current
+    migrate()
+
+    session = None
+    with labels(template=args.template, model=resolve_model(args.model) or ""):
+        try:
+            with profile_request("orchestrator", requested=args.profile, sample_rate=0, here=True) as session:
+                run(args)
+        finally:
+            if args.metrics:
+                print("\nTelemetry:")
+                print(format_summary())
+            if session is not None:
+                print(f"\nProfile written to {session.report_path} ({session.stats_path})")
+
+def run(args):
+    if args.rules_report:
+        report_rules(args.template, args.config, compare_llm=not args.rules_only, workers=args.workers,
+                     model=args.model)
+        return
 
     if args.ground_truth:
         # Run batch evaluation on all ground-truth examples
-        eval_ground_truth(args.template, args.config, store_in_db=False)
+        eval_ground_truth(args.template, args.config, store_in_db=False, workers=args.workers, resume=args.resume,
+                          model=args.model)
         return
 
     if args.url_list:
@@ -184,11 +225,8 @@ def main():
         sys.exit(1)
 
     # Step 1: Download the requested SEC filing
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filename = args.url.split('/')[-1]
-    html_path = os.path.join(DATA_DIR, filename)
     print(f"Downloading filing from {args.url}...")
-    download_8k(args.url, html_path)
+    html_path = fetch_filing(args.url)
 
     # Step 2: Extract plain text from the downloaded HTML
     print(f"Extracting text from {html_path}...")
@@ -198,33 +236,36 @@ def main():
     config = EventConfig(args.config)
     allowed_events = config.get_event_types()
     print(f"Classifying event using {args.template}...")
-    result = classify_event(filing_text, allowed_events, args.template == 'cot.tpl')
+    result = classify_with_template(filing_text, allowed_events, args.template, rules=compile_rules(config.events),
+                                    model=args.model)
+    parsed_output = result.output
     print("\nModel Output:")
-    print(result)
+    print(json.dumps(parsed_output))
 
-    # Step 4: Validate the LLM output
-    if args.template == 'zero_shot.tpl':
-        validation = validate_zero_shot(result, allowed_events)
-    else:
-        validation = validate_cot(result, allowed_events)
+    # Step 4: Validation happened while parsing the LLM output
+    validation = result.valid
     print("\nValidation Result:")
-    print(validation)
+    print(validation if validation else f"{validation} ({'; '.join(result.errors)})")
 
-    try:
-        parsed_output = json.loads(result)
-    except Exception:
-        parsed_output = result
     req_id = str(uuid.uuid4())
     single_result = {
         req_id: {
             'id': req_id,
             'url': args.url,
             'model_output': parsed_output,
-            'validation': validation
+            'validation': validation,
+            'retries': result.retries,
+            'repairs': result.repairs,
+            'source': result.source,
+            'answered_by': answer_path(result),
+            'escalation': result.escalation
         }
     }
     # Insert into DB
-    insert_result(id=req_id, url=args.url, model_output=parsed_output, validation=str(validation).lower())
+    insert_result(id=req_id, url=args.url, model_output=parsed_output, validation=str(validation).lower(),
+                  model=result.model or resolve_model(args.model), config_version=config.version,
+                  retries=result.retries, repairs=result.repairs,
+                  answered_by=answer_path(result), escalation=result.escalation)
     os.makedirs(OUTPUTS_DIR, exist_ok=True)
     output_file = os.path.join(OUTPUTS_DIR, f"single_result_{str(uuid.uuid4())}.json")
     with open(output_file, 'w') as f:
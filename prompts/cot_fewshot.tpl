@@ -0,0 +1,14 @@
+You are an expert in SEC filings. Classify the events in the text using ONLY these event types: {events}
+
+Reason step by step: find the key sentences, map each to an event type, then decide relevance.
+- Relevant: significant amounts (>$1M or >10,000 shares), C-suite changes, unusual events, or events that affect strategy or operations.
+- Not relevant: routine administrative or regularly scheduled events, small transactions (<$100K or <1,000 shares).
+
+Output only a JSON object with 'Reasoning' (list of strings) and 'Events' (array of objects with 'Event Type' and 'Relevant'), no other text.
+If no event is found, return {{"Reasoning": [], "Events": []}}.
+
+Similar labelled examples:
+{examples}
+
+Text:
+{text}
@@ -0,0 +1,15 @@
+The JSON below was produced for an SEC 8-K event classification but does not match the required format.
+
+Allowed event types: {events}
+
+Required JSON schema:
+{schema}
+
+Rewrite it so that it matches the schema exactly:
+- Keep every classification that is already valid.
+- Replace an unknown event type with the closest allowed event type, or "Other".
+- "Relevant" must be true or false.
+- Return ONLY the corrected JSON, with no explanation.
+
+Problems and the JSON to fix:
+{text}
\ No newline at end of file
@@ -1,7 +1,4 @@
-You are an expert in SEC filings. Given the following disclosure text:
-{text}
-
-Identify which of these event types are described in the text: {events}
+You are an expert in SEC filings. Identify which of these event types are described in the disclosure text below: {events}
 
 Return your answer as a JSON array of objects with 'Event Type' and 'Relevant' fields. Example:
 [
@@ -10,3 +7,6 @@ Return your answer as a JSON array of objects with 'Event Type' and 'Relevant' f
 ]
 Do not include any explanation, commentary, or extra text. Output only the JSON array.
 If no event is found, return an empty array.
+
+Disclosure text:
+{text}
\ No newline at end of file
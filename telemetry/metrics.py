@@ -0,0 +1,236 @@
+"""
+In-process latency histograms and counters, exported in Prometheus text format.
+
+    with span("parse"):
+        text = extract_text_from_html(path)
+    count("llm_cache_requests_total", result="hit")
+
+Spans are timed into the `filing_stage_seconds` histogram, labelled with the stage and
+the template and model of the work in progress (set once per filing with `labels()` and
+carried to worker threads by contextvars). `TELEMETRY=off` turns every call into a no-op.
+"""
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+STAGE_HISTOGRAM = "filing_stage_seconds"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Recent observations kept per series for the p50/p95 of summary()
+RECENT_SAMPLES = 1024
+
+HELP = {
+    STAGE_HISTOGRAM: "Time spent per filing processing stage",
+    "http_request_seconds": "API request latency by endpoint",
+    "llm_cache_requests_total": "LLM response cache lookups by result (hit or miss)",
+    "llm_calls_total": "Prompts sent to the LLM by kind (classify or repair)",
+    "validation_failures_total": "Model outputs that failed schema validation",
+    "llm_retries_total": "Full-prompt re-runs after unparseable output",
+    "llm_repairs_total": "Output-only repair passes",
+    "classifications_total": "Classifications by the path that answered",
+}
+
+_context_labels: contextvars.ContextVar = contextvars.ContextVar("telemetry_labels", default=())
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def telemetry_enabled() -> bool:
+    """Record spans and counters unless TELEMETRY=off."""
+    return os.getenv("TELEMETRY", "on").lower() not in ("off", "0", "false")
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of one labelled series, plus recent samples."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        ordered = sorted(self.recent)
+        if not ordered:
+            return None
+        return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+class Metrics:
+    """Thread-safe registry of histograms and counters keyed by name and label set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def summary(self) -> Dict[str, Dict[str, dict]]:
+        """
+        Plain-dict view for the CLI and tests: per histogram series its count, mean, p50,
+        p95 and total seconds, and per counter series its value. Series are keyed by their
+        labels rendered as 'k=v,k=v'.
+        """
+        with self._lock:
+            histograms = {
+                name: {
+                    _label_text(key): {
+                        "count": h.count,
+                        "total_seconds": h.sum,
+                        "mean_seconds": h.sum / h.count if h.count else None,
+                        "p50_seconds": h.percentile(50),
+                        "p95_seconds": h.percentile(95),
+                    }
+                    for key, h in series.items()
+                }
+                for name, series in self.histograms.items()
+            }
+            counters = {name: {_label_text(key): value for key, value in series.items()}
+                        for name, series in self.counters.items()}
+        return {"histograms": histograms, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        """All series in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for key, h in sorted(series.items()):
+                    for bound, bucket_count in zip(h.buckets, h.counts):
+                        lines.append(f"{name}_bucket{_label_block(key + (('le', repr(float(bound))),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_label_block(key + (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_label_block(key)} {h.sum}")
+                    lines.append(f"{name}_count{_label_block(key)} {h.count}")
+            for name, series in sorted(self.counters.items()):
+                lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_label_block(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in labels.items()))
+
+
+def _label_text(key: Labels) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_block(key: Labels) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+@contextmanager
+def labels(**values: str) -> Iterator[None]:
+    """Add labels (e.g. template, model) to every span recorded inside the block."""
+    merged = dict(_context_labels.get())
+    merged.update(values)
+    token = _context_labels.set(tuple(merged.items()))
+    try:
+        yield
+    finally:
+        _context_labels.reset(token)
+
+
+@contextmanager
+def span(stage: str, **extra: str) -> Iterator[None]:
+    """
+    Time a block into filing_stage_seconds{stage, template, model}. Template and model
+    come from the enclosing labels() block ('' when unknown); `extra` adds more labels.
+    """
+    if not telemetry_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        context = dict(_context_labels.get())
+        get_metrics().observe(STAGE_HISTOGRAM, time.perf_counter() - start, stage=stage,
+                              template=context.get("template", ""), model=context.get("model", ""), **extra)
+
+
+def timed(stage: str):
+    """Decorator form of span() for a function that is one stage."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name: str, seconds: float, **values: str) -> None:
+    """Record one value in a histogram other than the stage histogram."""
+    if telemetry_enabled():
+        get_metrics().observe(name, seconds, **values)
+
+
+def count(name: str, amount: float = 1, **values: str) -> None:
+    """Increment a counter."""
+    if telemetry_enabled():
+        get_metrics().inc(name, amount, **values)
+
+
+def format_summary(summary: Dict[str, Dict[str, dict]] = None) -> str:
+    """Human-readable table of the stage histogram and counters for the CLI."""
+    summary = summary or get_metrics().summary()
+    lines = []
+    stages = summary["histograms"].get(STAGE_HISTOGRAM, {})
+    if stages:
+        lines.append(f"{'stage':<40} {'count':>6} {'total s':>9} {'mean s':>8} {'p50 s':>8} {'p95 s':>8}")
+        for series, s in sorted(stages.items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append(f"{series:<40} {s['count']:>6} {s['total_seconds']:>9.3f} {s['mean_seconds']:>8.3f} "
+                         f"{s['p50_seconds']:>8.3f} {s['p95_seconds']:>8.3f}")
+    for name, series in sorted(summary["counters"].items()):
+        for key, value in sorted(series.items()):
+            lines.append(f"{name}{'{' + key + '}' if key else ''}: {value:g}")
+    return "\n".join(lines)
@@ -0,0 +1,220 @@
+"""
+Opt-in profiling of a single request or CLI run with cProfile and tracemalloc.
+
+    with profile_request("classify", requested=True) as session:
+        record = await pipeline.process(url)
+    session.report_path  # outputs/profiles/classify-....txt
+
+cProfile only sees the thread it is enabled in, so work is profiled where it runs:
+`profiled(fn, *args)` runs a call under its own profiler when a session is active in the
+current context (contextvars carry it into asyncio.to_thread workers), and the session
+merges every call's stats into one .pstats file and a top-N text summary. From Python
+3.12 only one profiler can be active per process; a call that starts while another is
+running goes unprofiled and is counted in the summary. tracemalloc is global, so its
+allocation summary includes other requests running at the same time.
+"""
+import asyncio
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, List, Optional
+
+DEFAULT_PROFILE_DIR = "outputs/profiles"
+DEFAULT_TOP_N = 30
+
+_active: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+# tracemalloc is process-wide: started by the first session that needs it, stopped by the last
+_tracing_lock = threading.Lock()
+_tracing_sessions = 0
+
+
+def profile_sample_rate() -> float:
+    """Fraction of API requests profiled without being asked (PROFILE_SAMPLE_RATE, default 0)."""
+    return float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+
+def memory_profiling_enabled() -> bool:
+    """Take a tracemalloc snapshot with each profile unless PROFILE_MEMORY=off."""
+    return os.getenv("PROFILE_MEMORY", "on").lower() not in ("off", "0", "false")
+
+
+class ProfileSession:
+    """
+    Profiles collected for one request, written out by `close()`.
+
+    Args:
+        name: Prefix of the output files
+        out_dir: Output directory (PROFILE_DIR, default outputs/profiles)
+        top_n: Functions and allocation sites listed in the summary (PROFILE_TOP_N)
+        memory: Record allocations with tracemalloc
+    """
+
+    def __init__(self, name: str, out_dir: str = None, top_n: int = None, memory: bool = None):
+        self.name = name
+        self.out_dir = out_dir or os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.top_n = top_n or int(os.getenv("PROFILE_TOP_N", DEFAULT_TOP_N))
+        self.memory = memory_profiling_enabled() if memory is None else memory
+        self.profiles: List[cProfile.Profile] = []
+        # Calls run without a profiler because another one was active (Python 3.12+)
+        self.unprofiled = 0
+        self.stats_path: Optional[str] = None
+        self.report_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._here: Optional[cProfile.Profile] = None
+        # Threads with a profiler of this session enabled; nested calls there are already covered
+        self._threads = set()
+        if self.memory:
+            _start_tracing()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn under a new profiler in the calling thread and keep its stats."""
+        thread = threading.get_ident()
+        if thread in self._threads:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # "Another profiling tool is already active": profiling must not fail the work
+            with self._lock:
+                self.unprofiled += 1
+            return fn(*args, **kwargs)
+        self._threads.add(thread)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self._threads.discard(thread)
+            with self._lock:
+                self.profiles.append(profiler)
+
+    def enable_here(self) -> None:
+        """Also profile everything the current thread runs until close() (for the CLI)."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return
+        self._here = profiler
+        self._threads.add(threading.get_ident())
+
+    def close(self) -> str:
+        """Write the merged .pstats file and the text summary; returns the summary path."""
+        if self._here is not None:
+            self._here.disable()
+            self.profiles.append(self._here)
+        elapsed = time.perf_counter() - self._start
+        snapshot = tracemalloc.take_snapshot() if self.memory and tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1] if snapshot else None
+        if self.memory:
+            _stop_tracing()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+        self.stats_path, self.report_path = base + ".pstats", base + ".txt"
+        out = io.StringIO()
+        out.write(f"Profile {self.name}: {elapsed:.3f}s wall time, {len(self.profiles)} profiled calls")
+        out.write(f" ({self.unprofiled} unprofiled: another profiler was active)\n" if self.unprofiled else "\n")
+        if self.profiles:
+            stats = pstats.Stats(*self.profiles, stream=out)
+            stats.dump_stats(self.stats_path)
+            out.write(f"\nTop {self.top_n} functions by cumulative time:\n")
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+        else:
+            self.stats_path = None
+        if snapshot is not None:
+            out.write(f"\nPeak traced memory {peak / 1e6:.1f} MB; top {self.top_n} allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:self.top_n]:
+                out.write(f"  {stat}\n")
+        with open(self.report_path, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return self.report_path
+
+
+def _start_tracing() -> None:
+    global _tracing_sessions
+    with _tracing_lock:
+        if _tracing_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        _tracing_sessions += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_sessions
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def current_session() -> Optional[ProfileSession]:
+    """The profile session of the current request, if it is being profiled."""
+    return _active.get()
+
+
+def profiled(fn, *args, **kwargs):
+    """Call fn, under the current request's profiler if there is one."""
+    session = _active.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    return session.call(fn, *args, **kwargs)
+
+
+def _open_session(name: str, requested: bool, sample_rate: Optional[float]) -> Optional[ProfileSession]:
+    rate = profile_sample_rate() if sample_rate is None else sample_rate
+    if not requested and random.random() >= rate:
+        return None
+    return ProfileSession(name)
+
+
+@contextmanager
+def profile_request(name: str, requested: bool = False, sample_rate: float = None,
+                    here: bool = False) -> Iterator[Optional[ProfileSession]]:
+    """
+    Profile the block when requested, or otherwise for a random fraction of calls.
+    Yields the session (None when not profiling); its report is written on exit.
+
+    Args:
+        name: Prefix of the output files
+        requested: Profile regardless of sampling
+        sample_rate: Fraction of unrequested calls to profile (default PROFILE_SAMPLE_RATE)
+        here: Also profile the current thread as a whole (CLI runs)
+    """
+    session = _open_session(name, requested, sample_rate)
+    if session is None:
+        yield None
+        return
+    if here:
+        session.enable_here()
+    token = _active.set(session)
+    try:
+        yield session
+    finally:
+        _active.reset(token)
+        session.close()
+
+
+@asynccontextmanager
+async def aprofile_request(name: str, requested: bool = False,
+                           sample_rate: float = None) -> AsyncIterator[Optional[ProfileSession]]:
+    """profile_request() for async handlers: the report is written in a worker thread, off the event loop."""
+    session = _open_session(name, requested, sample_rate)
+    if session is None:
+        yield None
+        return
+    token = _active.set(session)
+    try:
+        yield session
+    finally:
+        _active.reset(token)
+        await asyncio.to_thread(session.close)
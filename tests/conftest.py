@@ -0,0 +1,20 @@
+import pytest
+from classify import retrieval
+from ingestion import ratelimit
+
+@pytest.fixture(autouse=True)
+def disable_llm_cache(monkeypatch):
+    # Tests stub the LLM with different answers for the same text, so never share cached output
+    monkeypatch.setenv("LLM_CACHE", "off")
+
+@pytest.fixture(autouse=True)
+def isolated_fewshot_index(tmp_path, monkeypatch):
+    # CoT classifications build the few-shot index; keep it out of data/ in the working tree
+    monkeypatch.setenv("FEWSHOT_INDEX_PATH", str(tmp_path / "fewshot_index.npz"))
+    monkeypatch.setattr(retrieval, "_index", None)
+
+@pytest.fixture(autouse=True)
+def isolated_rate_limiter(tmp_path, monkeypatch):
+    # Keep the EDGAR limiter's state file out of data/ and apart from real runs
+    monkeypatch.setenv("EDGAR_RATE_LIMIT_PATH", str(tmp_path / ".edgar_ratelimit"))
+    monkeypatch.setattr(ratelimit, "_limiter", None)
@@ -0,0 +1,83 @@
+from classify import cache, classify
+from classify.cache import LLMCache, make_key
+
+def test_make_key_depends_on_every_input():
+    # Test that changing the model, template, events or text changes the cache key
+    base = make_key("llama3", "template {text}", ["Acquisition"], "Apple acquired a startup.")
+    assert base == make_key("llama3", "template {text}", ["Acquisition"], "Apple acquired a startup.")
+    assert base != make_key("llama3.2", "template {text}", ["Acquisition"], "Apple acquired a startup.")
+    assert base != make_key("llama3", "template v2 {text}", ["Acquisition"], "Apple acquired a startup.")
+    assert base != make_key("llama3", "template {text}", ["Acquisition", "Other"], "Apple acquired a startup.")
+    assert base != make_key("llama3", "template {text}", ["Acquisition"], "Apple acquired two startups.")
+
+def test_cache_memory_and_disk_tiers(tmp_path):
+    # Test that values survive a restart through the SQLite tier and are counted as hits
+    path = str(tmp_path / "cache.db")
+    c = LLMCache(path, memory_entries=2)
+    assert c.get("a") is None
+    c.put("a", "[]")
+    assert c.get("a") == "[]"
+    c.close()
+    c = LLMCache(path, memory_entries=2)
+    assert c.get("a") == "[]"
+    assert c.get("a") == "[]"
+    stats = c.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 0
+
+def test_cache_memory_lru_bound(tmp_path):
+    # Test that the in-memory tier keeps only the most recently used entries
+    c = LLMCache(str(tmp_path / "cache.db"), memory_entries=2)
+    for key in ("a", "b", "c"):
+        c.put(key, key)
+    assert list(c.memory) == ["b", "c"]
+    assert c.get("a") == "a"  # still on disk
+    assert list(c.memory) == ["c", "a"]
+
+def test_cache_size_based_eviction(tmp_path):
+    # Test that the disk tier evicts least recently used rows once it exceeds max_bytes
+    c = LLMCache(str(tmp_path / "cache.db"), max_bytes=30)
+    c.put("a", "x" * 10)
+    c.put("b", "x" * 10)
+    c.get("a")
+    c.put("c", "x" * 15)
+    assert c.stats()["disk_bytes"] <= 30
+    assert c.stats()["evictions"] == 1
+    c.memory.clear()
+    assert c.get("b") is None
+    assert c.get("a") == "x" * 10
+
+def test_classify_event_uses_cache(tmp_path, monkeypatch):
+    # Test that an identical classification is answered from the cache without calling the LLM
+    monkeypatch.setenv("LLM_CACHE", "on")
+    monkeypatch.setattr(cache, "_cache", LLMCache(str(tmp_path / "cache.db")))
+    # The canned zero-shot reply is invalid for CoT; don't spend calls repairing it
+    monkeypatch.setenv("LLM_MAX_REPAIRS", "0")
+    calls = []
+    def fake_llm(prompt, model=None):
+        calls.append(prompt)
+        return '[{"Event Type": "Acquisition", "Relevant": true}]'
+    monkeypatch.setattr(classify, "run_llama3", fake_llm)
+    first = classify.classify_event("Apple acquired a startup.", ["Acquisition", "Other"])
+    second = classify.classify_event("Apple acquired a startup.", ["Acquisition", "Other"])
+    assert first == second
+    assert len(calls) == 1
+    classify.classify_event("Apple acquired a startup.", ["Acquisition", "Other"], use_cot=True)
+    assert len(calls) == 2
+
+def test_cache_is_per_answering_model(tmp_path, monkeypatch):
+    # Test that one model's cached answer is never returned for another model, and results name their model
+    monkeypatch.setenv("LLM_CACHE", "on")
+    monkeypatch.setattr(cache, "_cache", LLMCache(str(tmp_path / "cache.db")))
+    calls = []
+    def fake_llm(prompt, model=None):
+        calls.append(prompt)
+        return '[{"Event Type": "Acquisition", "Relevant": true}]'
+    monkeypatch.setattr(classify, "run_llama3", fake_llm)
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    assert classify.classify("Apple acquired a startup.", ["Acquisition", "Other"]).model == "llama3"
+    monkeypatch.setenv("OLLAMA_MODEL", "mistral")
+    assert classify.classify("Apple acquired a startup.", ["Acquisition", "Other"]).model == "mistral"
+    assert classify.classify("Apple acquired a startup.", ["Acquisition", "Other"]).model == "mistral"
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+from classify import classify
+from classify.chunking import chunk_text, estimate_tokens, merge_outputs
+
+def test_chunk_text_respects_budget_and_overlaps():
+    # Test that chunks stay within the token budget, cover the text and overlap
+    text = " ".join(f"Sentence number {i} describes an event." for i in range(500))
+    chunks = chunk_text(text, max_tokens=200, overlap_tokens=20)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 200 for c in chunks)
+    assert chunks[0].startswith("Sentence number 0 ")
+    assert chunks[-1].endswith("Sentence number 499 describes an event.")
+    for a, b in zip(chunks, chunks[1:]):
+        assert b.split()[0] in a.split()[-30:]
+
+def test_chunk_text_short_text_single_chunk():
+    # Test that a text within budget is not split
+    assert chunk_text("The CFO resigned.", max_tokens=100) == ["The CFO resigned."]
+
+def test_merge_outputs_zero_shot():
+    # Test that zero-shot chunk outputs are de-duplicated in order with relevance OR-ed
+    outputs = [
+        [{"Event Type": "Personnel Change", "Relevant": False}],
+        [{"Event Type": "Acquisition", "Relevant": True}, {"Event Type": "Personnel Change", "Relevant": True}],
+        [],
+    ]
+    assert merge_outputs(outputs) == [
+        {"Event Type": "Personnel Change", "Relevant": True},
+        {"Event Type": "Acquisition", "Relevant": True},
+    ]
+
+def test_merge_outputs_cot():
+    # Test that CoT chunk outputs keep the {"Reasoning", "Events"} shape
+    outputs = [
+        {"Reasoning": ["a"], "Events": [{"Event Type": "Other", "Relevant": False}]},
+        {"Reasoning": ["a", "b"], "Events": [{"Event Type": "Other", "Relevant": False}]},
+    ]
+    assert merge_outputs(outputs, use_cot=True) == {
+        "Reasoning": ["a", "b"],
+        "Events": [{"Event Type": "Other", "Relevant": False}],
+    }
+
+def test_classify_event_chunks_long_text(monkeypatch):
+    # Test that a text over the context budget is classified per chunk and merged
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "1500")
+    prompts = []
+    def fake_llm(prompt, model=None):
+        prompts.append(prompt)
+        if "acquired" in prompt:
+            return '[{"Event Type": "Acquisition", "Relevant": true}]'
+        return '[{"Event Type": "Other", "Relevant": false}]'
+    monkeypatch.setattr(classify, "run_llama3", fake_llm)
+    text = "Routine disclosure text. " * 600 + "Apple acquired a startup. " + "More routine text. " * 600
+    result = classify.classify_event(text, ["Acquisition", "Other"])
+    assert len(prompts) > 2
+    assert result == [{"Event Type": "Other", "Relevant": False}, {"Event Type": "Acquisition", "Relevant": True}]
+    prompts.clear()
+    classify.classify_event("Apple acquired a startup.", ["Acquisition", "Other"])
+    assert len(prompts) == 1
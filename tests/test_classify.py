@@ -1,3 +1,4 @@
+import pytest
 from classify.classify import classify_event, load_event_types
 
 def test_classify_event_real_llm():
@@ -11,7 +12,7 @@ def test_classify_event_different_event(monkeypatch):
     # Test classify_event with a mocked LLM for a personnel change event
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Personnel Change", "Relevant": false}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Personnel Change", "Relevant": false}]')
     result = classify_event("The CFO resigned.", events, use_cot=False)
     assert any(event["Event Type"] == "Personnel Change" for event in result)
 
@@ -19,7 +20,7 @@ def test_classify_event_empty_input(monkeypatch):
     # Test classify_event with a mocked LLM and empty input
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[]')
     result = classify_event("", events, use_cot=False)
     assert result == []
 
@@ -28,32 +29,32 @@ def test_classify_event_zero_shot_diverse_companies(monkeypatch):
     events = load_event_types()
     
     # Apple Acquisition
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Acquisition", "Relevant": true}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Acquisition", "Relevant": true}]')
     result = classify_event("Apple announced the acquisition of a major AI startup.", events, use_cot=False)
     assert any(event["Event Type"] == "Acquisition" and event["Relevant"] for event in result)
     
     # Google Personnel Change
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Personnel Change", "Relevant": true}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Personnel Change", "Relevant": true}]')
     result = classify_event("Google's CFO will retire at the end of the quarter.", events, use_cot=False)
     assert any(event["Event Type"] == "Personnel Change" and event["Relevant"] for event in result)
     
     # Coca-Cola Acquisition
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Acquisition", "Relevant": false}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Acquisition", "Relevant": false}]')
     result = classify_event("Coca-Cola acquired a minority stake in a beverage startup.", events, use_cot=False)
     assert any(event["Event Type"] == "Acquisition" and not event["Relevant"] for event in result)
     
     # Delta Airlines Customer Event
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Customer Event", "Relevant": true}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Customer Event", "Relevant": true}]')
     result = classify_event("Delta Airlines signed a long-term contract with Boeing for new aircraft.", events, use_cot=False)
     assert any(event["Event Type"] == "Customer Event" and event["Relevant"] for event in result)
     
     # ExxonMobil Financial Event
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Financial Event", "Relevant": true}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Financial Event", "Relevant": true}]')
     result = classify_event("ExxonMobil reported a quarterly loss due to falling oil prices.", events, use_cot=False)
     assert any(event["Event Type"] == "Financial Event" and event["Relevant"] for event in result)
     
     # Ford Open Market Sale
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Open Market Sale", "Relevant": false}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Open Market Sale", "Relevant": false}]')
     result = classify_event("A director at Ford sold 1,500 shares in an open market transaction.", events, use_cot=False)
     assert any(event["Event Type"] == "Open Market Sale" and not event["Relevant"] for event in result)
 
@@ -62,32 +63,32 @@ def test_classify_event_cot_diverse_companies(monkeypatch):
     events = load_event_types()
     
     # Apple Acquisition (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["Apple acquired a major AI startup, which is an acquisition event.", "The acquisition is of a major AI startup, suggesting it\'s significant for Apple\'s future."], "Events": [{"Event Type": "Acquisition", "Relevant": true}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["Apple acquired a major AI startup, which is an acquisition event.", "The acquisition is of a major AI startup, suggesting it\'s significant for Apple\'s future."], "Events": [{"Event Type": "Acquisition", "Relevant": true}]}')
     result = classify_event("Apple announced the acquisition of a major AI startup.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Acquisition" and result["Events"][0]["Relevant"]
     
     # Google Personnel Change (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["Google\'s CFO is retiring, which is a personnel change event.", "The departure of a CFO is significant as it affects financial leadership."], "Events": [{"Event Type": "Personnel Change", "Relevant": true}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["Google\'s CFO is retiring, which is a personnel change event.", "The departure of a CFO is significant as it affects financial leadership."], "Events": [{"Event Type": "Personnel Change", "Relevant": true}]}')
     result = classify_event("Google's CFO will retire at the end of the quarter.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Personnel Change" and result["Events"][0]["Relevant"]
     
     # Coca-Cola Acquisition (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["Coca-Cola acquired a minority stake in a beverage startup, which is an acquisition event.", "A minority stake in a startup is less significant than a full acquisition."], "Events": [{"Event Type": "Acquisition", "Relevant": false}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["Coca-Cola acquired a minority stake in a beverage startup, which is an acquisition event.", "A minority stake in a startup is less significant than a full acquisition."], "Events": [{"Event Type": "Acquisition", "Relevant": false}]}')
     result = classify_event("Coca-Cola acquired a minority stake in a beverage startup.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Acquisition" and not result["Events"][0]["Relevant"]
     
     # Delta Airlines Customer Event (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["Delta Airlines entered into a significant contract with Boeing, which is a customer event.", "A long-term aircraft contract is significant for an airline\'s operations."], "Events": [{"Event Type": "Customer Event", "Relevant": true}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["Delta Airlines entered into a significant contract with Boeing, which is a customer event.", "A long-term aircraft contract is significant for an airline\'s operations."], "Events": [{"Event Type": "Customer Event", "Relevant": true}]}')
     result = classify_event("Delta Airlines signed a long-term contract with Boeing for new aircraft.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Customer Event" and result["Events"][0]["Relevant"]
     
     # ExxonMobil Financial Event (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["ExxonMobil reported a quarterly loss, which is a financial event.", "A quarterly loss is significant as it affects the company\'s financial performance."], "Events": [{"Event Type": "Financial Event", "Relevant": true}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["ExxonMobil reported a quarterly loss, which is a financial event.", "A quarterly loss is significant as it affects the company\'s financial performance."], "Events": [{"Event Type": "Financial Event", "Relevant": true}]}')
     result = classify_event("ExxonMobil reported a quarterly loss due to falling oil prices.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Financial Event" and result["Events"][0]["Relevant"]
     
     # Ford Open Market Sale (CoT)
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["A director at Ford sold shares in an open market transaction, which is an open market sale event.", "The sale of 1,500 shares by a director is relatively small and may not be significant."], "Events": [{"Event Type": "Open Market Sale", "Relevant": false}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["A director at Ford sold shares in an open market transaction, which is an open market sale event.", "The sale of 1,500 shares by a director is relatively small and may not be significant."], "Events": [{"Event Type": "Open Market Sale", "Relevant": false}]}')
     result = classify_event("A director at Ford sold 1,500 shares in an open market transaction.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Open Market Sale" and not result["Events"][0]["Relevant"]
 
@@ -138,14 +139,14 @@ def test_real_llm_zero_shot_automatic_sale():
 def test_mocked_llm_zero_shot_exxon(monkeypatch):
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Financial Event", "Relevant": true}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Financial Event", "Relevant": true}]')
     result = classify_event("ExxonMobil reported a quarterly loss due to falling oil prices.", events, use_cot=False)
     assert any(event["Event Type"] == "Financial Event" for event in result)
 
 def test_mocked_llm_zero_shot_ford(monkeypatch):
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '[{"Event Type": "Open Market Sale", "Relevant": false}]')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Open Market Sale", "Relevant": false}]')
     result = classify_event("A director at Ford sold 1,500 shares in an open market transaction.", events, use_cot=False)
     assert any(event["Event Type"] == "Open Market Sale" for event in result)
 
@@ -196,13 +197,105 @@ def test_real_llm_cot_automatic_sale():
 def test_mocked_llm_cot_exxon(monkeypatch):
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["ExxonMobil reported a quarterly loss, which is a financial event.", "A quarterly loss is significant as it affects the company\'s financial performance."], "Events": [{"Event Type": "Financial Event", "Relevant": true}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["ExxonMobil reported a quarterly loss, which is a financial event.", "A quarterly loss is significant as it affects the company\'s financial performance."], "Events": [{"Event Type": "Financial Event", "Relevant": true}]}')
     result = classify_event("ExxonMobil reported a quarterly loss due to falling oil prices.", events, use_cot=True)
     assert result["Events"][0]["Event Type"] == "Financial Event" and result["Events"][0]["Relevant"]
 
 def test_mocked_llm_cot_ford(monkeypatch):
     from classify import classify
     events = load_event_types()
-    monkeypatch.setattr(classify, "run_llama3", lambda prompt: '{"Reasoning": ["A director at Ford sold shares in an open market transaction, which is an open market sale event.", "The sale of 1,500 shares by a director is relatively small and may not be significant."], "Events": [{"Event Type": "Open Market Sale", "Relevant": false}]}')
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: '{"Reasoning": ["A director at Ford sold shares in an open market transaction, which is an open market sale event.", "The sale of 1,500 shares by a director is relatively small and may not be significant."], "Events": [{"Event Type": "Open Market Sale", "Relevant": false}]}')
     result = classify_event("A director at Ford sold 1,500 shares in an open market transaction.", events, use_cot=True)
-    assert result["Events"][0]["Event Type"] == "Open Market Sale" and not result["Events"][0]["Relevant"] 
\ No newline at end of file
+    assert result["Events"][0]["Event Type"] == "Open Market Sale" and not result["Events"][0]["Relevant"] 
+
+# --- SCHEMA AND REPAIR (unit, fast) ---
+def test_classify_sends_schema_and_repairs_output(monkeypatch):
+    # Test that the prompt carries the event JSON schema and invalid output is repaired without resending the filing
+    from classify import classify
+    events = load_event_types()
+    prompts = []
+    replies = iter(['[{"Event Type": "Merger", "Relevant": "yes"}]', '[{"Event Type": "Acquisition", "Relevant": true}]'])
+    def fake_llm(prompt, model=None):
+        prompts.append(prompt)
+        return next(replies)
+    monkeypatch.setattr(classify, "run_llama3", fake_llm)
+    result = classify.classify("Apple acquired a startup.", events)
+    assert result.valid and result.repairs == 1 and result.retries == 0
+    assert result.output == [{"Event Type": "Acquisition", "Relevant": True}]
+    assert prompts[0].schema["items"]["properties"]["Event Type"]["enum"] == events
+    assert "Apple acquired a startup." not in prompts[1]
+    assert "unknown type 'Merger'" in prompts[1]
+
+def test_classify_retries_unparseable_output(monkeypatch):
+    # Test that output that is still not JSON after repairs triggers a bounded full-prompt retry
+    from classify import classify
+    events = load_event_types()
+    monkeypatch.setenv("LLM_MAX_REPAIRS", "1")
+    replies = iter(["I cannot answer.", "Still no JSON.", '[{"Event Type": "Other", "Relevant": false}]'])
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: next(replies))
+    result = classify.classify("Routine text.", events)
+    assert result.valid and result.retries == 1 and result.repairs == 1
+    monkeypatch.setattr(classify, "run_llama3", lambda prompt, model=None: "never JSON")
+    with pytest.raises(ValueError):
+        classify.classify("Routine text.", events)
+
+# --- AUTO CASCADE (unit, fast) ---
+def cascade_llm(zero_shot, cot):
+    # Answers zero-shot prompts with one reply and CoT prompts (which ask for 'Reasoning') with another
+    calls = []
+    def llm(prompt, model=None):
+        use_cot = "'Reasoning'" in prompt
+        calls.append("cot" if use_cot else "zero_shot")
+        return cot if use_cot else zero_shot
+    return llm, calls
+
+COT_ANSWER = '{"Reasoning": ["An acquisition."], "Events": [{"Event Type": "Acquisition", "Relevant": true}]}'
+
+def test_auto_keeps_confident_zero_shot_answer(monkeypatch):
+    # Test that a clear zero-shot answer is used without a CoT call
+    from classify import classify
+    events = load_event_types()
+    llm, calls = cascade_llm('[{"Event Type": "Acquisition", "Relevant": true}]', COT_ANSWER)
+    monkeypatch.setattr(classify, "run_llama3", llm)
+    result = classify.classify_with_template("Apple acquired a startup.", events, "auto")
+    assert calls == ["zero_shot"] and result.escalation is None
+    assert classify.answer_path(result) == "Zero-Shot"
+
+@pytest.mark.parametrize("zero_shot, reason", [
+    ('[{"Event Type": "Other", "Relevant": false}]', "other"),
+    ('[]', "no events"),
+    ('[{"Event Type": "Acquisition", "Relevant": true}, {"Event Type": "Acquisition", "Relevant": false}]', "conflicting"),
+    ('[{"Event Type": "Merger", "Relevant": true}]', "invalid"),
+    ('I cannot answer.', "invalid"),
+])
+def test_auto_escalates_doubtful_answers(monkeypatch, zero_shot, reason):
+    # Test that invalid, empty, 'Other' and conflicting zero-shot answers are redone with CoT
+    from classify import classify
+    events = load_event_types()
+    monkeypatch.setenv("LLM_MAX_REPAIRS", "0")
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    llm, calls = cascade_llm(zero_shot, COT_ANSWER)
+    monkeypatch.setattr(classify, "run_llama3", llm)
+    result = classify.classify_with_template("Apple acquired a startup.", events, "auto")
+    assert calls == ["zero_shot", "cot"]
+    assert result.escalation == reason and classify.answer_path(result) == "Chain-of-Thought"
+    assert result.output["Events"] == [{"Event Type": "Acquisition", "Relevant": True}]
+
+def test_auto_escalates_on_low_confidence(monkeypatch):
+    # Test that an amount between the relevance thresholds escalates, and AUTO_MIN_CONFIDENCE tunes it
+    from classify import classify
+    from classify.rules import compile_rules
+    events = {"Open Market Sale": {"relevant": True, "relevance_rules": [
+        {"shares_at_least": 10000, "relevant": True}, {"shares_below": 1000, "relevant": False}]}, "Other": {"relevant": False}}
+    sale = '[{"Event Type": "Open Market Sale", "Relevant": true}]'
+    cot = '{"Reasoning": ["A mid-sized sale."], "Events": [{"Event Type": "Open Market Sale", "Relevant": false}]}'
+    llm, calls = cascade_llm(sale, cot)
+    monkeypatch.setattr(classify, "run_llama3", llm)
+    rules = compile_rules(events)
+    result = classify.classify_with_template("A director sold 5,000 shares.", list(events), "auto", rules=rules)
+    assert result.escalation == "low confidence" and calls == ["zero_shot", "cot"]
+    assert classify.classify_with_template("A director sold 50,000 shares.", list(events), "auto", rules=rules).escalation is None
+    monkeypatch.setenv("AUTO_MIN_CONFIDENCE", "0.4")
+    assert classify.classify_with_template("A director sold 5,000 shares.", list(events), "auto", rules=rules).escalation is None
+    with pytest.raises(ValueError):
+        classify.classify_with_template("text", list(events), "fast.tpl")
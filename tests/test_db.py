@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import sessionmaker
+from data import db
+from data.db import head_cursor, insert_result, list_results, list_results_since, make_engine
+from data.migrations import MIGRATIONS, current_version, migrate
+from data.models import Result
+
+@pytest.fixture
+def results_db(tmp_path, monkeypatch):
+    engine = make_engine(f"sqlite:///{tmp_path / 'filings.db'}")
+    migrate(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+def add_rows(n, start=datetime(2024, 1, 1)):
+    session = db.Session()
+    for i in range(n):
+        session.add(Result(id=f"r{i:03d}", url=f"https://example.com/{i % 3}.htm", text="filing text " * 100,
+                           model_output=[], company="Apple Inc." if i % 2 else "Google LLC",
+                           template="Zero-Shot", created_at=start + timedelta(seconds=i)))
+    session.commit()
+    session.close()
+
+def test_migrate_upgrades_legacy_database(tmp_path):
+    # Test that a database created by the old init_db script is upgraded in place and keeps its rows
+    engine = make_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        MIGRATIONS[0][2](conn)
+        conn.exec_driver_sql("INSERT INTO results (id, model_output) VALUES ('old', '[]')")
+    assert migrate(engine) == MIGRATIONS[-1][0]
+    assert migrate(engine) == current_version(engine)
+    with engine.connect() as conn:
+        columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(results)")}
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(results)")}
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    assert columns == {c.name for c in Result.__table__.columns}
+    assert {i.name for i in Result.__table__.indexes} <= indexes
+    session = sessionmaker(bind=engine)()
+    assert session.get(Result, "old").created_at is not None and session.get(Result, "old").seq == 1
+    session.add(Result(id="new", model_output=[]))
+    session.commit()
+    assert session.get(Result, "new").seq == 2
+    session.close()
+    engine.dispose()
+
+def test_list_results_keyset_pages(results_db):
+    # Test that pages come back newest first without gaps or repeats and without the filing text
+    add_rows(25)
+    seen, cursor = [], None
+    while True:
+        page, cursor = list_results(limit=10, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert [r["id"] for r in seen] == [f"r{i:03d}" for i in reversed(range(25))]
+    assert "text" not in seen[0] and seen[0]["created_at"].startswith("2024-01-01")
+
+def test_results_since_cursor_returns_only_new_rows(results_db):
+    # Test that the delta feed returns rows stored after the head cursor, oldest first, and nothing twice
+    add_rows(5)
+    cursor = head_cursor()
+    assert list_results_since(cursor) == ([], cursor)
+    session = db.Session()
+    for i in range(5, 8):
+        session.add(Result(id=f"r{i:03d}", model_output=[], created_at=datetime(2024, 1, 2, 0, 0, i)))
+    session.commit()
+    session.close()
+    page, cursor = list_results_since(cursor, limit=2, fields=["company"])
+    assert [r["id"] for r in page] == ["r005", "r006"] and set(page[0]) == {"id", "company"}
+    page, cursor = list_results_since(cursor, limit=2)
+    assert [r["id"] for r in page] == ["r007"]
+    assert list_results_since(cursor)[0] == []
+    assert [r["id"] for r in list_results_since(limit=2)[0]] == ["r000", "r001"]
+
+def test_results_since_returns_rows_committed_out_of_order(results_db):
+    # Test that a row committed after the cursor is returned even if its created_at is older
+    add_rows(3)
+    cursor = head_cursor()
+    session = db.Session()
+    session.add(Result(id="late", model_output=[], created_at=datetime(2023, 12, 31)))
+    session.commit()
+    session.close()
+    page, cursor = list_results_since(cursor)
+    assert [r["id"] for r in page] == ["late"] and "seq" not in page[0]
+    with db.Session() as session:
+        session.query(Result).filter(Result.id == "late").delete()
+        session.commit()
+    insert_result("after-delete", model_output=[])
+    assert [r["id"] for r in list_results_since(cursor)[0]] == ["after-delete"]
+    with pytest.raises(ValueError):
+        list_results_since("not-a-cursor")
+
+def test_list_results_projection_and_filters(results_db):
+    # Test field projection, exact-match filters and rejection of unknown fields
+    add_rows(10)
+    page, cursor = list_results(fields=["url"], company="Apple Inc.")
+    assert cursor is None
+    assert page[0] == {"id": "r009", "url": "https://example.com/0.htm"}
+    assert len(page) == 5
+    with pytest.raises(ValueError):
+        list_results(fields=["password"])
+    with pytest.raises(ValueError):
+        list_results(cursor="not-a-cursor")
+
+def test_list_results_uses_index(results_db):
+    # Test that the keyset page query is answered from the (created_at, id) index, not a table scan and sort
+    query = (select(Result.id).where(tuple_(Result.created_at, Result.id) < (datetime(2024, 1, 2), "r"))
+             .order_by(Result.created_at.desc(), Result.id.desc()).limit(11))
+    sql = str(query.compile(results_db, compile_kwargs={"literal_binds": True}))
+    with results_db.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    assert "ix_results_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
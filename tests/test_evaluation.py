@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from classify import evaluation
+from classify.evaluation import Checkpoint, percentile, run_evaluation, summarize
+from classify.validator import validate
+
+EVENTS = ["Acquisition", "Personnel Change", "Other"]
+EXAMPLES = [
+    {"filing_id": f"sample-{i}", "text": f"Example {i}: {event}", "expected_event": event, "expected_relevance": True}
+    for i, event in enumerate(EVENTS * 4)
+]
+
+class FakeLLM:
+    def __init__(self, fail_on=()):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.fail_on = set(fail_on)
+
+    def __call__(self, text, events, template="zero_shot.tpl", rules=None, model=None):
+        with self.lock:
+            self.calls.append(text)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if text in self.fail_on:
+            raise RuntimeError("Ollama returned an error")
+        return validate(json.dumps([{"Event Type": text.split(": ")[1], "Relevant": True}]), events, template == "cot.tpl")
+
+def test_evaluation_runs_examples_in_parallel(monkeypatch):
+    # Test that examples are classified concurrently and come back in input order
+    llm = FakeLLM()
+    monkeypatch.setattr(evaluation, "classify_with_template", llm)
+    records = run_evaluation(EXAMPLES, EVENTS, "zero_shot.tpl", workers=4)
+    assert llm.peak == 4
+    assert [r["filing_id"] for r in records] == [ex["filing_id"] for ex in EXAMPLES]
+    metrics = summarize(records, EVENTS)
+    assert metrics["event_accuracy"] == 1.0
+    assert metrics["confusion_matrix"]["Acquisition"]["Acquisition"] == 4
+    assert metrics["latency"]["count"] == 12
+    assert metrics["latency"]["p50_seconds"] >= 0.02
+
+def test_evaluation_resumes_from_checkpoint(monkeypatch, tmp_path):
+    # Test that a rerun skips checkpointed examples and retries only the failed ones
+    failing = EXAMPLES[5]["text"]
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    monkeypatch.setattr(evaluation, "classify_with_template", FakeLLM(fail_on={failing}))
+    first = run_evaluation(EXAMPLES, EVENTS, "zero_shot.tpl", workers=3, checkpoint=checkpoint)
+    assert summarize(first, EVENTS)["errors"] == 1
+    assert len(checkpoint.load()) == 11
+
+    llm = FakeLLM()
+    monkeypatch.setattr(evaluation, "classify_with_template", llm)
+    second = run_evaluation(EXAMPLES, EVENTS, "zero_shot.tpl", workers=3, checkpoint=checkpoint)
+    assert llm.calls == [failing]
+    metrics = summarize(second, EVENTS)
+    assert metrics["errors"] == 0 and metrics["resumed"] == 11
+    assert metrics["event_accuracy"] == 1.0
+
+def test_checkpoint_ignores_torn_line(tmp_path):
+    # Test that a partially written last line from a crash does not break resuming
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.append({"key": "a", "latency_seconds": 1.0})
+    with open(checkpoint.path, "a") as f:
+        f.write('{"key": "b", "lat')
+    assert list(checkpoint.load()) == ["a"]
+
+def test_percentile():
+    # Test nearest-rank percentiles used for the latency summary
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
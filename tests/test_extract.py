@@ -0,0 +1,23 @@
+from classify.extract import extract_facts
+
+def test_extract_share_counts():
+    # Test that share quantities are found with separators, decimals and scale words, and years are not
+    facts = extract_facts("The CEO bought 10,000 shares and 1.5 million Class A common shares; in 2023 its shares rose.")
+    assert facts.shares == [10000.0, 1500000.0]
+    assert facts.max_shares == 1500000.0
+    assert extract_facts("A director sold 500 restricted shares.").shares == [500.0]
+    assert extract_facts("No quantities here.").max_shares is None
+
+def test_extract_dollar_amounts():
+    # Test that dollar amounts are scaled by word and abbreviation
+    facts = extract_facts("A $5 billion buyback, a $250,000 bonus, US$2.5mm in fees and USD 300k in costs.")
+    assert facts.amounts == [5e9, 250000.0, 2.5e6, 300000.0]
+    assert facts.max_amount == 5e9
+
+def test_extract_titles():
+    # Test that officer titles are normalized and vice presidents are not counted as presidents
+    assert extract_facts("The Chief Financial Officer resigned.").titles == {"CFO", "Chief Officer"}
+    assert extract_facts("The VP of Marketing resigned.").titles == {"Vice President"}
+    assert extract_facts("The Senior Vice President left.").titles == {"Vice President"}
+    assert "Chairman" not in extract_facts("She is chair of the audit committee.").titles
+    assert extract_facts("The President and a director were appointed.").titles == {"President", "Director"}
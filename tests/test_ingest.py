@@ -1,4 +1,8 @@
-from ingestion.ingest import download_8k
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ingestion.ingest import download_8k, fetch_filing
+from ingestion.store import FilingStore
 
 def test_download_8k(tmp_path):
     # Test downloading a valid SEC 8-K filing and checking file content
@@ -23,4 +27,99 @@ def test_download_8k_overwrite(tmp_path):
     output_path.write_text("old content", encoding="utf-8")
     download_8k(url, str(output_path))
     content = output_path.read_text(encoding='utf-8')
-    assert "old content" not in content, "File was not overwritten as expected." 
\ No newline at end of file
+    assert "old content" not in content, "File was not overwritten as expected." 
+
+# --- FILING STORE TESTS (local stub server) ---
+
+class StubEdgarHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        body = self.server.bodies[self.path]
+        etag = f'"{len(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Tue, 12 Sep 2023 16:30:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def edgar():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEdgarHandler)
+    server.requests = []
+    server.bodies = {
+        "/a/d8k.htm": "<html><body>Caf\xe9 8-K</body></html>".encode("cp1252"),
+        "/b/d8k.htm": b"<html><body>Another 8-K</body></html>",
+    }
+    server.base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_filing_fresh_copy_skips_network(edgar, tmp_path):
+    # Test that a filing within the freshness window is served from disk without a request
+    store = FilingStore(str(tmp_path), freshness_seconds=3600)
+    first = fetch_filing(edgar.base + "/a/d8k.htm", store)
+    second = fetch_filing(edgar.base + "/a/d8k.htm", store)
+    assert first == second
+    assert len(edgar.requests) == 1
+
+def test_fetch_filing_revalidates_stale_copy(edgar, tmp_path):
+    # Test that a stale copy is revalidated with If-None-Match and kept on 304
+    store = FilingStore(str(tmp_path), freshness_seconds=0)
+    path = fetch_filing(edgar.base + "/a/d8k.htm", store)
+    assert fetch_filing(edgar.base + "/a/d8k.htm", store) == path
+    assert len(edgar.requests) == 2
+    assert edgar.requests[1][1]["If-None-Match"] == f'"{len(edgar.bodies["/a/d8k.htm"])}"'
+    assert "If-Modified-Since" in edgar.requests[1][1]
+    assert store.metadata(edgar.base + "/a/d8k.htm")["etag"]
+
+def test_fetch_filing_keys_by_full_url(edgar, tmp_path):
+    # Test that two filings with the same basename do not overwrite each other
+    store = FilingStore(str(tmp_path))
+    path_a = fetch_filing(edgar.base + "/a/d8k.htm", store)
+    path_b = fetch_filing(edgar.base + "/b/d8k.htm", store)
+    assert path_a != path_b
+    assert open(path_b, "rb").read() == edgar.bodies["/b/d8k.htm"]
+
+def test_fetch_filing_stores_raw_bytes(edgar, tmp_path):
+    # Test that the stored body is byte-for-byte what the server sent
+    store = FilingStore(str(tmp_path))
+    path = fetch_filing(edgar.base + "/a/d8k.htm", store)
+    assert open(path, "rb").read() == edgar.bodies["/a/d8k.htm"]
+
+def test_fetch_filing_honours_retry_after(edgar, tmp_path, monkeypatch):
+    # Test that a 429 with Retry-After is retried after the requested delay
+    import time
+    from ingestion import ingest
+    edgar.throttle = 1
+    original = StubEdgarHandler.do_GET
+    def throttled(self):
+        if self.server.throttle:
+            self.server.throttle -= 1
+            self.server.requests.append((self.path, dict(self.headers)))
+            self.send_response(429)
+            self.send_header("Retry-After", "0.3")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        original(self)
+    monkeypatch.setattr(StubEdgarHandler, "do_GET", throttled)
+    start = time.perf_counter()
+    path = fetch_filing(edgar.base + "/b/d8k.htm", FilingStore(str(tmp_path)))
+    assert time.perf_counter() - start >= 0.28
+    assert len(edgar.requests) == 2
+    assert open(path, "rb").read() == edgar.bodies["/b/d8k.htm"]
+    assert ingest.get_session() is ingest.get_session()
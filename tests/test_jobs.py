@@ -0,0 +1,148 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy.orm import sessionmaker
+from api import jobs as job_runner
+from api.jobs import JobRunner
+from api.pipeline import FilingPipeline
+from data import db, jobs
+from data.db import insert_result, make_engine
+from data.migrations import migrate
+from data.writer import ResultWriter
+
+@pytest.fixture
+def jobs_db(tmp_path, monkeypatch):
+    engine = make_engine(f"sqlite:///{tmp_path / 'filings.db'}")
+    migrate(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def processed(monkeypatch):
+    # Stand-in for download -> parse -> LLM -> DB: stores a result row and returns its record
+    processed = []
+
+    async def process(self, url):
+        if "slow" in url:
+            await asyncio.sleep(10)
+        if "bad" in url:
+            raise RuntimeError("download failed")
+        await asyncio.sleep(0.01)
+        result_id = f"result-{len(processed)}"
+        insert_result(id=result_id, url=url, text="", model_output=[{"Event Type": "Other", "Relevant": False}],
+                      validation="true", company="Apple Inc.")
+        processed.append(url)
+        return {'id': result_id, 'url': url}
+
+    monkeypatch.setattr(FilingPipeline, "process", process)
+    return processed
+
+async def wait_for_status(job_id, status, timeout=5.0):
+    for _ in range(int(timeout / 0.02)):
+        job = jobs.get_job(job_id)
+        if job['status'] == status:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job still {job['status']}")
+
+def test_job_runs_items_and_reports_progress(jobs_db, processed):
+    # Test that a queued job is processed in the background with per-item outcomes and results
+    urls = ["https://example.com/0.htm", "https://example.com/bad.htm", "https://example.com/2.htm"]
+
+    async def scenario():
+        runner = JobRunner(poll_seconds=0.05)
+        await runner.start()
+        job_id = jobs.create_job(urls, "zero_shot.tpl", ["Other"], "v1")
+        runner.notify()
+        job = await wait_for_status(job_id, jobs.PARTIAL)
+        await runner.stop()
+        return job_id, job
+
+    job_id, job = asyncio.run(scenario())
+    assert job['total'] == 3
+    assert job['counts'][jobs.DONE] == 2 and job['counts'][jobs.FAILED] == 1
+    items, next_after = jobs.job_results(job_id)
+    assert [item['url'] for item in items] == urls and next_after is None
+    assert items[0]['result']['company'] == "Apple Inc."
+    assert items[1]['error'] == "RuntimeError: download failed"
+    page, next_after = jobs.job_results(job_id, limit=1)
+    assert len(page) == 1 and jobs.job_results(job_id, after=next_after)[0] == items[1:]
+
+def test_job_with_only_failed_items_fails(jobs_db, processed):
+    # Test that a job whose every item failed ends 'failed' rather than 'completed'
+    urls = ["https://example.com/bad-0.htm", "https://example.com/bad-1.htm"]
+
+    async def scenario():
+        runner = JobRunner(poll_seconds=0.05)
+        await runner.start()
+        job_id = jobs.create_job(urls, "zero_shot.tpl", ["Other"])
+        runner.notify()
+        job = await wait_for_status(job_id, jobs.FAILED)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job['counts'][jobs.FAILED] == 2 and job['counts'][jobs.DONE] == 0
+    assert processed == []
+
+def test_cancel_stops_job(jobs_db, processed):
+    # Test that cancelling a running job stops its items and is reported in the status
+    async def scenario():
+        runner = JobRunner(concurrency=1, poll_seconds=0.05)
+        await runner.start()
+        job_id = jobs.create_job(["https://example.com/slow.htm", "https://example.com/1.htm"],
+                                 "zero_shot.tpl", ["Other"])
+        runner.notify()
+        await wait_for_status(job_id, jobs.RUNNING)
+        assert await runner.cancel(job_id)
+        assert not await runner.cancel(job_id)
+        await asyncio.sleep(0.1)
+        await runner.stop()
+        return jobs.get_job(job_id)
+
+    job = asyncio.run(scenario())
+    assert job['status'] == jobs.CANCELLED
+    assert job['counts'][jobs.CANCELLED] == 2
+    assert processed == []
+
+def test_interrupted_job_resumes_after_restart(jobs_db, processed):
+    # Test that items left running by a stopped runner are re-queued and finished by the next one
+    urls = [f"https://example.com/{i}.htm" for i in range(4)]
+    job_id = jobs.create_job(urls, "cot.tpl", ["Other"])
+    jobs.set_job_status(job_id, jobs.RUNNING)
+    jobs.mark_item(job_id, 0, jobs.DONE, "earlier-result")
+    jobs.mark_item(job_id, 1, jobs.RUNNING)
+
+    async def scenario():
+        runner = JobRunner(poll_seconds=0.05)
+        await runner.start()
+        job = await wait_for_status(job_id, jobs.COMPLETED)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job['counts'][jobs.DONE] == 4
+    assert sorted(processed) == urls[1:]
+
+def test_job_routes(jobs_db, processed, monkeypatch):
+    # Test that POST /jobs returns an id at once and GET /jobs/{id} reports the job
+    from fastapi.testclient import TestClient
+    from api.main import app
+    monkeypatch.setattr(job_runner, "_runner", JobRunner(poll_seconds=0.05))
+    # The app closes the writer on shutdown; keep the process-wide one open for other tests
+    monkeypatch.setattr("data.writer._writer", ResultWriter())
+    monkeypatch.setattr("api.main.warm_up", lambda: None)
+    monkeypatch.setattr("api.main.migrate", lambda: None)
+    with TestClient(app) as client:
+        response = client.post("/jobs", json={"urls": ["https://example.com/0.htm"]})
+        assert response.status_code == 202
+        job_id = response.json()['id']
+        for _ in range(250):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job['status'] == jobs.COMPLETED:
+                break
+            time.sleep(0.02)
+        assert job['status'] == jobs.COMPLETED and job['results'][0]['status'] == jobs.DONE
+        assert client.get("/jobs/missing").status_code == 404
+        assert client.post(f"/jobs/{job_id}/cancel").status_code == 409
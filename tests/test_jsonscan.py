@@ -0,0 +1,49 @@
+from classify.jsonscan import JSONScanner
+from classify.llm_client import generate_until_json
+from classify.validator import compile_schema, validate
+
+def feed_all(pieces):
+    scanner = JSONScanner()
+    for i, piece in enumerate(pieces):
+        if scanner.feed(piece):
+            return scanner, i
+    return scanner, None
+
+def test_scanner_stops_at_end_of_first_value():
+    # Test that the scanner completes on the fragment that closes the top-level value
+    pieces = ['Here is the answer:\n[{"Event Type": "Acq', 'uisition", "Relevant": true}', ']\n\nExplanation: ', 'more text']
+    scanner, index = feed_all(pieces)
+    assert index == 2
+    assert scanner.value == [{"Event Type": "Acquisition", "Relevant": True}]
+    assert scanner.text[scanner.end:] == "\n\nExplanation: "
+
+def test_scanner_ignores_brackets_in_strings():
+    # Test that brackets and escaped quotes inside string values do not end the value
+    text = '{"Reasoning": ["Item 2.01 ] closes {the deal}", "he said \\"]\\""], "Events": []} trailing'
+    scanner, index = feed_all(list(text))
+    assert index is not None
+    assert scanner.value["Events"] == []
+    assert scanner.text[scanner.end:] == ""
+
+def test_scanner_skips_non_json_brackets():
+    # Test that bracketed prose before the answer is skipped
+    scanner, _ = feed_all(["Classification [see below]: ", '[{"Event Type": "Other", "Relevant": false}]'])
+    assert scanner.value == [{"Event Type": "Other", "Relevant": False}]
+
+def test_scanner_incomplete():
+    # Test that a truncated answer never reports completion
+    scanner, index = feed_all(['[{"Event Type": "Other", ', '"Relevant": false}'])
+    assert index is None and not scanner.complete
+
+def test_scanner_skips_values_of_the_wrong_shape():
+    # Test that a bracketed number before the answer neither ends the stream nor becomes the parse
+    accepts = compile_schema(["Personnel Change", "Other"]).accepts
+    pieces = iter(["Per Item [5.02] and note [1]:\n", '[{"Event Type": "Personnel Change", ', '"Relevant": true}]', " trailing"])
+    def stream():
+        yield from pieces
+    assert generate_until_json(stream(), accepts) == 'Per Item [5.02] and note [1]:\n[{"Event Type": "Personnel Change", "Relevant": true}]'
+    assert next(pieces) == " trailing"
+    result = validate('Per Item [5.02]: [{"Event Type": "Personnel Change", "Relevant": true}]', ["Personnel Change", "Other"])
+    assert result.valid and result.output == [{"Event Type": "Personnel Change", "Relevant": True}]
+    # With nothing of the right shape, the first value is still returned so that it can be repaired
+    assert validate('See [1].', ["Other"]).output == [1]
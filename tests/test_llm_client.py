@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from classify.llm_client import (BackendPool, BackendUnavailable, OllamaHTTPBackend, PoolMember, SubprocessBackend,
+                                 astream_llama3, parse_backends, run_llama3, set_backend)
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.server.peers.add(self.client_address)
+        if body.get("model") == "missing":
+            payload, status = {"error": "model not found"}, 404
+        elif "prompt" in body and body.get("stream", True):
+            return self.stream_reply(body)
+        else:
+            payload, status = {"model": body["model"], "response": " " + self.server.reply + "\n", "done": True}, 200
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Health check (/api/version)
+        status = 503 if self.server.down else 200
+        data = json.dumps({"version": "stub"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_reply(self, body):
+        # NDJSON fragments like Ollama's streaming API, followed by chatter after the JSON
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        reply = self.server.reply
+        pieces = [reply[i:i + 7] for i in range(0, len(reply), 7)] + self.server.chatter
+        try:
+            for piece in pieces:
+                line = json.dumps({"model": body["model"], "response": piece, "done": False}).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+                self.server.pieces_sent += 1
+                time.sleep(self.server.piece_delay)
+            line = json.dumps({"model": body["model"], "response": "", "done": True}).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(line), line))
+            self.server.completed += 1
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.requests = []
+    server.peers = set()
+    server.reply = '[{"Event Type": "Acquisition", "Relevant": true}]'
+    server.chatter = []
+    server.piece_delay = 0
+    server.pieces_sent = 0
+    server.completed = 0
+    server.down = False
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    return server
+
+def stop_stub(server):
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def stub_server():
+    server = start_stub()
+    yield server
+    stop_stub(server)
+
+@pytest.fixture
+def stub_servers():
+    servers = [start_stub(), start_stub()]
+    yield servers
+    for server in servers:
+        stop_stub(server)
+
+def make_pool(servers, max_concurrency=1, models=None, **kwargs):
+    models = models or ["llama3"] * len(servers)
+    members = [PoolMember(OllamaHTTPBackend(host=f"http://127.0.0.1:{s.server_port}", model=model), max_concurrency)
+               for s, model in zip(servers, models)]
+    return BackendPool(members, health_interval=0, **kwargs)
+
+def test_http_backend_generate(stub_server, monkeypatch):
+    # Test that the HTTP backend posts to /api/generate with keep_alive and returns the stripped response
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}", keep_alive="10m")
+    assert backend.generate("Apple acquired a startup.") == stub_server.reply
+    request = stub_server.requests[0]
+    assert request["prompt"] == "Apple acquired a startup."
+    assert request["keep_alive"] == "10m"
+    assert request["stream"] is True
+    backend.close()
+
+def test_http_backend_blocking_generate(stub_server, monkeypatch):
+    # Test that LLM_EARLY_STOP=off waits for the whole completion in one response
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    monkeypatch.setenv("LLM_EARLY_STOP", "off")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    assert backend.generate("prompt") == stub_server.reply
+    assert stub_server.requests[0]["stream"] is False
+    backend.close()
+
+def test_http_backend_reuses_connection(stub_server, monkeypatch):
+    # Test that consecutive calls go over the same pooled keep-alive connection
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    # Early stop drops the connection on purpose to cancel generation
+    monkeypatch.setenv("LLM_EARLY_STOP", "off")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    for _ in range(5):
+        backend.generate("prompt")
+    assert len(stub_server.requests) == 5
+    assert len(stub_server.peers) == 1
+    backend.close()
+
+def test_http_backend_warm_up(stub_server, monkeypatch):
+    # Test that warm-up loads the model without sending a prompt
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    backend.warm_up()
+    assert stub_server.requests == [{"model": "llama3", "keep_alive": backend.keep_alive}]
+    backend.close()
+
+def test_http_backend_error(stub_server, monkeypatch):
+    # Test that a server-side error is surfaced as a RuntimeError
+    monkeypatch.setenv("OLLAMA_MODEL", "missing")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    with pytest.raises(RuntimeError):
+        backend.generate("prompt")
+    backend.close()
+
+def test_run_llama3_uses_backend(stub_server, monkeypatch):
+    # Test that run_llama3 goes through the process-wide backend
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    set_backend(OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}"))
+    try:
+        assert run_llama3("prompt") == stub_server.reply
+    finally:
+        set_backend(None)
+
+def test_http_backend_pins_template_prefix(stub_server, monkeypatch):
+    # Test that a rendered template prompt asks Ollama to keep its static prefix in context and follow its schema
+    from classify.templates import RenderedPrompt
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    backend.generate(RenderedPrompt("x" * 400, "filing text", schema={"type": "array"}))
+    request = stub_server.requests[0]
+    assert request["prompt"] == "x" * 400 + "filing text"
+    assert request["options"]["num_keep"] == 100
+    assert request["format"] == {"type": "array"}
+    backend.close()
+
+def test_http_backend_stops_after_json(stub_server, monkeypatch):
+    # Test that streaming stops at the end of the JSON answer instead of reading the chatter after it
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    stub_server.chatter = ["\n\nExplanation:"] + [" the filing describes an acquisition."] * 50
+    stub_server.piece_delay = 0.01
+    backend = OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}")
+    start = time.perf_counter()
+    assert backend.generate("prompt") == stub_server.reply
+    assert time.perf_counter() - start < 0.3
+    time.sleep(0.1)
+    assert stub_server.completed == 0
+    assert stub_server.pieces_sent < 20
+    backend.close()
+
+def test_astream_llama3_yields_partial_output(stub_server, monkeypatch):
+    # Test that the async iterator yields fragments as they arrive and ends with the JSON value
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    stub_server.chatter = [" Hope this helps!"]
+    set_backend(OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}"))
+
+    async def collect():
+        return [piece async for piece in astream_llama3("prompt")]
+
+    try:
+        pieces = asyncio.run(collect())
+    finally:
+        set_backend(None)
+    assert len(pieces) > 1
+    assert "".join(pieces) == stub_server.reply
+
+def test_subprocess_backend_kills_after_json(tmp_path, monkeypatch):
+    # Test that the `ollama run` process is killed once its output contains a complete JSON answer
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    shim = tmp_path / "ollama"
+    shim.write_text(
+        f"#!{sys.executable}\nimport sys, time\n"
+        "print('[{\"Event Type\": \"Other\", \"Relevant\": false}]', flush=True)\n"
+        "time.sleep(10)\nprint('more chatter')\n"
+    )
+    shim.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path) + os.pathsep + os.environ["PATH"])
+    start = time.perf_counter()
+    assert SubprocessBackend().generate("prompt") == '[{"Event Type": "Other", "Relevant": false}]'
+    assert time.perf_counter() - start < 5
+
+def test_run_llama3_passes_model(stub_server, monkeypatch):
+    # Test that an explicit model argument is sent instead of OLLAMA_MODEL
+    monkeypatch.setenv("OLLAMA_MODEL", "llama3")
+    set_backend(OllamaHTTPBackend(host=f"http://127.0.0.1:{stub_server.server_port}"))
+    try:
+        run_llama3("prompt", model="mistral")
+        run_llama3("prompt")
+    finally:
+        set_backend(None)
+    assert [r["model"] for r in stub_server.requests] == ["mistral", "llama3"]
+
+def test_parse_backends():
+    # Test the LLM_BACKENDS format: host, optional model and optional concurrency cap
+    assert parse_backends("http://a:11434=llama3.2:latest*4, http://b:11434") == [
+        ("http://a:11434", "llama3.2:latest", 4), ("http://b:11434", None, None)]
+
+def test_pool_balances_within_concurrency_caps(stub_servers):
+    # Test that concurrent requests are spread over both servers without exceeding either cap
+    for server in stub_servers:
+        server.piece_delay = 0.02
+    pool = make_pool(stub_servers, max_concurrency=2)
+    lock, active, peak = threading.Lock(), [0, 0], [0, 0]
+
+    def counted(i, stream):
+        def wrapper(prompt, model=None):
+            with lock:
+                active[i] += 1
+                peak[i] = max(peak[i], active[i])
+            try:
+                yield from stream(prompt, model)
+            finally:
+                with lock:
+                    active[i] -= 1
+        return wrapper
+
+    for i, member in enumerate(pool.members):
+        member.backend.stream = counted(i, member.backend.stream)
+    threads = [threading.Thread(target=pool.generate, args=("prompt",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [len(s.requests) for s in stub_servers] == [4, 4]
+    assert peak == [2, 2]
+    assert stub_servers[1].requests[0]["model"] == "llama3"
+    stats = pool.stats()
+    assert all(m["requests"] == 4 and m["outstanding"] == 0 and m["p95_seconds"] > 0 for m in stats)
+    pool.close()
+
+def test_pool_fails_over_and_ejects_unreachable_backend(stub_servers):
+    # Test that requests to a dead server are retried elsewhere and the dead server is ejected
+    dead, live = stub_servers
+    stop_stub(dead)
+    pool = make_pool(stub_servers, eject_after=2)
+    for _ in range(4):
+        assert pool.generate("prompt") == live.reply
+    dead_stats, live_stats = pool.stats()
+    assert not dead_stats["healthy"] and dead_stats["failures"] == 2
+    assert live_stats["requests"] == 4
+    pool.close()
+
+def test_pool_health_checks_eject_and_readmit(stub_servers):
+    # Test that the active health check takes a failing server out of rotation and brings it back
+    pool = make_pool(stub_servers)
+    stub_servers[0].down = True
+    pool.check_health()
+    assert [m["healthy"] for m in pool.stats()] == [False, True]
+    pool.generate("prompt")
+    assert len(stub_servers[0].requests) == 0
+    stub_servers[0].down = False
+    pool.check_health()
+    assert all(m["healthy"] for m in pool.stats())
+    pool.close()
+
+def test_pool_routes_by_model(stub_servers, monkeypatch):
+    # Test that a pool serving different models needs a named model and only sends requests to its members
+    monkeypatch.delenv("OLLAMA_MODEL", raising=False)
+    pool = make_pool(stub_servers, models=["model-0", "model-1"])
+    with pytest.raises(ValueError):
+        pool.generate("prompt")
+    pool.generate("prompt", model="model-1")
+    monkeypatch.setenv("OLLAMA_MODEL", "model-0")
+    assert pool.default_model() == "model-0"
+    pool.generate("prompt")
+    assert [r["model"] for r in stub_servers[0].requests] == ["model-0"]
+    assert [r["model"] for r in stub_servers[1].requests] == ["model-1"]
+    stub_servers[1].down = True
+    pool.check_health()
+    with pytest.raises(BackendUnavailable):
+        pool.generate("prompt", model="model-1")
+    pool.close()
+
+def test_classify_asks_the_requested_model(stub_servers, monkeypatch):
+    # Test that a model passed to classify_with_template reaches a mixed pool without OLLAMA_MODEL
+    from classify.classify import classify_with_template
+    monkeypatch.delenv("OLLAMA_MODEL", raising=False)
+    monkeypatch.setenv("LLM_CACHE", "off")
+    set_backend(make_pool(stub_servers, models=["model-0", "model-1"]))
+    try:
+        result = classify_with_template("Apple acquired a startup.", ["Acquisition", "Other"], "zero_shot.tpl",
+                                        model="model-1")
+    finally:
+        set_backend(None)
+    assert result.valid and result.model == "model-1"
+    assert stub_servers[0].requests == [] and [r["model"] for r in stub_servers[1].requests] == ["model-1"]
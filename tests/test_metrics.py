@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from classify import classify as classify_module
+from classify.classify import classify
+from telemetry.metrics import STAGE_HISTOGRAM, Metrics, format_summary, get_metrics, labels, span
+
+@pytest.fixture
+def metrics():
+    get_metrics().reset()
+    yield get_metrics()
+    get_metrics().reset()
+
+def test_histogram_renders_prometheus_text():
+    # Test that observations become cumulative buckets, sum and count per label set
+    registry = Metrics()
+    for value in (0.002, 0.02, 3.0):
+        registry.observe(STAGE_HISTOGRAM, value, stage="llm", template="cot.tpl", model="llama3")
+    registry.inc("llm_cache_requests_total", result="hit")
+    text = registry.render_prometheus()
+    assert "# TYPE filing_stage_seconds histogram" in text
+    assert 'filing_stage_seconds_bucket{model="llama3",stage="llm",template="cot.tpl",le="0.005"} 1' in text
+    assert 'filing_stage_seconds_bucket{model="llama3",stage="llm",template="cot.tpl",le="+Inf"} 3' in text
+    assert 'filing_stage_seconds_count{model="llama3",stage="llm",template="cot.tpl"} 3' in text
+    assert 'llm_cache_requests_total{result="hit"} 1' in text
+    series = registry.summary()["histograms"][STAGE_HISTOGRAM]["model=llama3,stage=llm,template=cot.tpl"]
+    assert series["count"] == 3 and series["p50_seconds"] == 0.02
+
+def test_span_labels_follow_worker_threads(metrics):
+    # Test that labels set around async work reach spans recorded in asyncio.to_thread workers
+    def parse():
+        with span("parse"):
+            return "text"
+
+    async def scenario():
+        with labels(template="auto", model="llama3"):
+            return await asyncio.to_thread(parse)
+
+    assert asyncio.run(scenario()) == "text"
+    assert "model=llama3,stage=parse,template=auto" in metrics.summary()["histograms"][STAGE_HISTOGRAM]
+    assert "stage=parse" in format_summary()
+
+def test_classify_counts_calls_failures_and_stages(metrics, monkeypatch):
+    # Test that a classification records prompt, LLM and validation spans plus repair counters
+    replies = iter(['[{"Event Type": "Merger", "Relevant": true}]', '[{"Event Type": "Other", "Relevant": false}]'])
+    monkeypatch.setattr(classify_module, "run_llama3", lambda prompt, model=None: next(replies))
+    assert classify("Routine text.", ["Other"]).valid
+    summary = metrics.summary()
+    stages = {key.split("stage=")[1].split(",")[0] for key in summary["histograms"][STAGE_HISTOGRAM]}
+    assert {"segment", "prompt", "llm", "validate"} <= stages
+    counters = summary["counters"]
+    assert counters["llm_calls_total"] == {"kind=classify": 1, "kind=repair": 1}
+    assert counters["validation_failures_total"] == {"": 1}
+    assert counters["llm_repairs_total"] == {"": 1}
+
+def test_metrics_endpoint(metrics, monkeypatch):
+    # Test that /metrics serves the registry in Prometheus text format and times API requests
+    from fastapi.testclient import TestClient
+    from api.main import app
+    client = TestClient(app)
+    assert client.get("/cache/stats").status_code == 200
+    assert client.post("/classify/", json={"url": "https://example.com/8k.htm", "template": "fast.tpl"}).status_code == 422
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_seconds_count{method="GET",route="/cache/stats",status="200"} 1' in response.text
+    assert 'http_request_seconds_count{method="POST",route="/classify/",status="422"} 1' in response.text
+
+def test_telemetry_off(metrics, monkeypatch):
+    # Test that TELEMETRY=off records nothing
+    monkeypatch.setenv("TELEMETRY", "off")
+    with span("parse"):
+        pass
+    assert metrics.summary() == {"histograms": {}, "counters": {}}
@@ -30,4 +30,34 @@ def test_extract_text_from_html_large(tmp_path):
     html_file = tmp_path / "large.html"
     html_file.write_text(html, encoding="utf-8")
     text = extract_text_from_html(str(html_file))
-    assert text.count("Line") == 10000 
\ No newline at end of file
+    assert text.count("Line") == 10000 
+
+def test_extract_text_from_html_raw_bytes(tmp_path):
+    # Test extracting text from a filing stored as raw non-UTF-8 bytes
+    html = '<html><head><meta charset="windows-1252"></head><body><p>Caf\xe9 \x93quoted\x94</p></body></html>'
+    html_file = tmp_path / "cp1252.html"
+    html_file.write_bytes(html.encode("latin-1"))
+    text = extract_text_from_html(str(html_file))
+    assert "Caf\xe9" in text
+    assert "“quoted”" in text
+
+def test_extract_text_from_html_drops_hidden_blocks(tmp_path):
+    # Test that script, style and hidden inline-XBRL header content is not extracted
+    html = ('<html><head><style>p {color: red}</style></head><body>'
+            '<div style="display:none"><ix:header><ix:hidden>dei:Hidden fact</ix:hidden></ix:header></div>'
+            '<p>Item 5.02 Departure</p><script>var x = 1;</script></body></html>')
+    html_file = tmp_path / "ixbrl.html"
+    html_file.write_text(html, encoding="utf-8")
+    assert extract_text_from_html(str(html_file)) == "Item 5.02 Departure"
+
+def test_extract_text_from_html_matches_previous_output(tmp_path):
+    # Test that the streaming extractor matches BeautifulSoup get_text plus whitespace cleanup
+    import re
+    from bs4 import BeautifulSoup
+    html = ('<html><body><p>AT&amp;T <b>Inc</b>.</p>\n\n<table><tr><td>Item&nbsp;1.01</td>'
+            '<td>Entry into a Material   Definitive Agreement</td></tr></table><!-- note -->'
+            '<p>Ap<span>ple</span> acquired a startup.</p>' + '<p>Line</p>' * 3000 + '</body></html>')
+    html_file = tmp_path / "filing.html"
+    html_file.write_text(html, encoding="utf-8")
+    expected = re.sub(r'\s+', ' ', BeautifulSoup(html, "html.parser").get_text(separator="\n").strip()).strip()
+    assert extract_text_from_html(str(html_file)) == expected
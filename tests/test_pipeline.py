@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+import pytest
+from api import pipeline
+from api.pipeline import FilingPipeline
+from classify.validator import ClassificationResult
+from data.models import Result
+
+class StageTracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+        self.inserted = []
+
+    def run(self, stage, value, delay):
+        with self.lock:
+            self.active[stage] = self.active.get(stage, 0) + 1
+            self.peak[stage] = max(self.peak.get(stage, 0), self.active[stage])
+        time.sleep(delay)
+        with self.lock:
+            self.active[stage] -= 1
+        return value
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = StageTracker()
+    monkeypatch.setattr(pipeline, "fetch_filing", lambda url: tracker.run("download", url, 0.01))
+    monkeypatch.setattr(pipeline, "parse_filing", lambda path: tracker.run("parse", f"text of {path}", 0.01))
+    monkeypatch.setattr(pipeline, "classify_filing", lambda text, events, template, rules: tracker.run("llm", ClassificationResult([{"Event Type": "Other", "Relevant": False}], True), 0.05))
+    monkeypatch.setattr(pipeline, "store_result", lambda row, durable: tracker.inserted.append(row))
+    return tracker
+
+def test_pipeline_preserves_input_order(tracker):
+    # Test that batch results come back in the same order as the input URLs
+    urls = [f"https://example.com/{i}.htm" for i in range(12)]
+    results = asyncio.run(FilingPipeline(["Other"], limits={"llm": 4}).run(urls))
+    assert [r["url"] for r in results] == urls
+    assert all(r["validation"] == "true" for r in results)
+    assert len(tracker.inserted) == 12
+    assert tracker.inserted[0]["template"] == "Zero-Shot"
+
+def test_pipeline_respects_stage_limits(tracker):
+    # Test that each stage overlaps with others but never exceeds its own concurrency limit
+    urls = [f"https://example.com/{i}.htm" for i in range(10)]
+    asyncio.run(FilingPipeline(["Other"], limits={"download": 3, "parse": 2, "llm": 2}).run(urls))
+    assert tracker.peak["download"] <= 3
+    assert tracker.peak["parse"] <= 2
+    assert tracker.peak["llm"] == 2
+
+def test_pipeline_scales_with_llm_slots(tracker):
+    # Test that more LLM slots shorten the wall time of a batch
+    urls = [f"https://example.com/{i}.htm" for i in range(8)]
+    start = time.perf_counter()
+    asyncio.run(FilingPipeline(["Other"], limits={"llm": 1}).run(urls))
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    asyncio.run(FilingPipeline(["Other"], limits={"llm": 4}).run(urls))
+    parallel = time.perf_counter() - start
+    assert parallel < serial / 2
+
+def test_pipeline_stream_yields_results_as_they_complete(tracker, monkeypatch):
+    # Test that streamed records arrive in completion order, after being stored, and failures don't end the stream
+    def fetch(url):
+        if "bad" in url:
+            raise IOError("not found")
+        return tracker.run("download", url, 0.3 if "slow" in url else 0.01)
+    monkeypatch.setattr(pipeline, "fetch_filing", fetch)
+    urls = ["https://example.com/slow.htm", "https://example.com/bad.htm", "https://example.com/fast.htm"]
+
+    async def collect():
+        records = []
+        async for record in FilingPipeline(["Other"], limits={"llm": 4}).stream(urls):
+            records.append((record, len(tracker.inserted)))
+        return records
+
+    records = asyncio.run(collect())
+    assert [r["index"] for r, _ in records] == [1, 2, 0]
+    assert records[0][0]["error"] == "OSError: not found"
+    assert records[1][1] >= 1 and records[1][0]["url"] == urls[2]
+    assert len(tracker.inserted) == 2
+
+def test_identical_filings_in_flight_run_once(tracker):
+    # Test that concurrent requests for the same filing and settings share one execution and one row
+    async def scenario():
+        first = FilingPipeline(["Other"], config_version="v1")
+        second = FilingPipeline(["Other"], config_version="v1")
+        other_template = FilingPipeline(["Other"], "cot.tpl", config_version="v1")
+        url = "https://example.com/same.htm"
+        return await asyncio.gather(first.process(url), second.process(url), other_template.process(url))
+
+    a, b, c = asyncio.run(scenario())
+    assert a == b and a is not b
+    assert c["id"] != a["id"]
+    assert len(tracker.inserted) == 2
+    assert not pipeline.inflight.stats()["in_flight"]
+
+def test_cancelled_caller_does_not_cancel_shared_work(tracker):
+    # Test that one caller giving up leaves the execution running for the other caller
+    async def scenario():
+        url = "https://example.com/shared.htm"
+        leaving = asyncio.create_task(FilingPipeline(["Other"]).process(url))
+        staying = asyncio.create_task(FilingPipeline(["Other"]).process(url))
+        await asyncio.sleep(0.02)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(scenario())["validation"] == "true"
+    assert len(tracker.inserted) == 1
+
+def test_reuse_returns_stored_result_without_download(tracker, monkeypatch):
+    # Test that reuse mode answers from a fresh stored result and skips every stage
+    stored = Result(id="stored", url="https://example.com/0.htm", model_output=[], validation="true",
+                    company="Apple Inc.", retries=0, repairs=1)
+    lookups = []
+    def find(url, template, model, config_version, since):
+        lookups.append((template, config_version))
+        return stored if url == stored.url else None
+    monkeypatch.setattr(pipeline, "find_reusable_result", find)
+    reusing = FilingPipeline(["Other"], config_version="v1", reuse_max_age=3600)
+    records = asyncio.run(reusing.run([stored.url, "https://example.com/1.htm"]))
+    assert records[0]["id"] == "stored" and records[0]["reused"] and records[0]["repairs"] == 1
+    assert "reused" not in records[1]
+    assert tracker.peak["download"] == 1 and len(tracker.inserted) == 1
+    assert lookups[0] == ("Zero-Shot", "v1")
+
+def test_stage_limits_are_shared_across_pipelines(tracker, monkeypatch):
+    # Test that concurrent requests share the server-wide LLM limit instead of each getting their own
+    monkeypatch.setenv("BATCH_LLM_CONCURRENCY", "2")
+    async def scenario():
+        first, second = FilingPipeline(["Other"]), FilingPipeline(["Other"])
+        await asyncio.gather(first.run([f"https://example.com/a{i}.htm" for i in range(4)]),
+                             second.run([f"https://example.com/b{i}.htm" for i in range(4)]))
+    asyncio.run(scenario())
+    assert tracker.peak["llm"] == 2 and len(tracker.inserted) == 8
+
+def test_stage_limits_from_env(monkeypatch):
+    # Test that per-stage limits can be configured through the environment
+    monkeypatch.setenv("BATCH_LLM_CONCURRENCY", "6")
+    assert pipeline.stage_limits()["llm"] == 6
@@ -0,0 +1,76 @@
+import asyncio
+import cProfile
+import pstats
+from api import pipeline
+from classify.validator import ClassificationResult
+from telemetry.profiling import ProfileSession, current_session, profile_request, profiled
+
+def slow_stage():
+    return sum(i * i for i in range(20000))
+
+def test_profile_covers_worker_threads(tmp_path, monkeypatch):
+    # Test that calls in asyncio.to_thread workers are merged into one pstats file and a top-N summary
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+
+    async def scenario():
+        with profile_request("unit", requested=True) as session:
+            await asyncio.gather(*(asyncio.to_thread(profiled, slow_stage) for _ in range(3)))
+        return session
+
+    session = asyncio.run(scenario())
+    assert len(session.profiles) == 3 and current_session() is None
+    stats = pstats.Stats(session.stats_path)
+    assert any(name == "slow_stage" for _, _, name in stats.stats)
+    report = open(session.report_path).read()
+    assert "functions by cumulative time" in report and "slow_stage" in report
+    assert "allocation sites" in report
+
+def test_profile_sampling(tmp_path, monkeypatch):
+    # Test that unrequested calls are profiled only at PROFILE_SAMPLE_RATE, and nested calls are not re-profiled
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    with profile_request("unit") as session:
+        assert session is None and profiled(slow_stage) > 0
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "1")
+    with profile_request("unit") as session:
+        assert profiled(profiled, slow_stage) > 0
+    assert len(session.profiles) == 1
+    with profile_request("unit", sample_rate=0) as session:
+        assert session is None
+    assert ProfileSession("empty", out_dir=str(tmp_path), memory=False).close().endswith(".txt")
+
+def test_busy_profiler_runs_work_unprofiled(tmp_path, monkeypatch):
+    # Test that a stage whose profiler cannot start (Python 3.12+: one per process) still runs and is counted
+    class BusyProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+
+    async def scenario():
+        with profile_request("unit", requested=True) as session:
+            results = await asyncio.gather(*(asyncio.to_thread(profiled, slow_stage) for _ in range(3)))
+        return session, results
+
+    session, results = asyncio.run(scenario())
+    assert all(results) and session.unprofiled == 3 and session.stats_path is None
+    assert "3 unprofiled" in open(session.report_path).read()
+
+def test_classify_endpoint_profiles_on_request(tmp_path, monkeypatch):
+    # Test that ?profile=1 and X-Profile profile a request and return the report path in X-Profile-Report
+    from fastapi.testclient import TestClient
+    from api.main import app
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(pipeline, "fetch_filing", lambda url: "filing.htm")
+    monkeypatch.setattr(pipeline, "parse_filing", lambda path: "Acme Corp announced a merger.")
+    monkeypatch.setattr(pipeline, "classify_filing", lambda text, events, template, rules:
+                        ClassificationResult([{"Event Type": "Other", "Relevant": False}], True))
+    monkeypatch.setattr(pipeline, "store_result", lambda row, durable: None)
+    client = TestClient(app)
+    body = {"url": "https://example.com/8k.htm", "template": "zero_shot.tpl"}
+    assert "X-Profile-Report" not in client.post("/classify/", json=body).headers
+    for response in (client.post("/classify/?profile=1", json=body),
+                     client.post("/classify/", json=body, headers={"X-Profile": "1"})):
+        assert response.status_code == 200
+        report = open(response.headers["X-Profile-Report"]).read()
+        assert "<lambda>" in report
+    assert len(list(tmp_path.glob("classify-*.pstats"))) == 2
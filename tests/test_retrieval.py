@@ -0,0 +1,67 @@
+import json
+import numpy as np
+from classify import classify as classify_module
+from classify import retrieval
+from classify.classify import classify
+from classify.retrieval import ExampleIndex, format_examples, load_examples
+
+EXAMPLES = [
+    {"text": "The CEO purchased 15,000 shares in the open market.", "expected_event": "Open Market Purchase", "expected_relevance": True},
+    {"text": "A director sold 500 shares to fund a personal expense.", "expected_event": "Open Market Sale", "expected_relevance": False},
+    {"text": "The CFO resigned effective immediately.", "expected_event": "Personnel Change", "expected_relevance": True},
+    {"text": "Apple acquired a small software company.", "expected_event": "Acquisition", "expected_relevance": False},
+]
+
+def test_search_ranks_similar_examples_first():
+    # Test that the nearest examples come first and an example never retrieves itself
+    index = ExampleIndex()
+    assert index.sync(EXAMPLES) == 4
+    assert index.search("The CFO of Ford resigned.", 1)[0]["expected_event"] == "Personnel Change"
+    assert index.search("A director sold 700 shares.", 1)[0]["expected_event"] == "Open Market Sale"
+    assert EXAMPLES[2] not in index.search(EXAMPLES[2]["text"], 4)
+    assert len(index.search("anything", 2)) == 2
+
+def test_index_persists_and_updates_incrementally(tmp_path, monkeypatch):
+    # Test that a reloaded index only tokenizes added examples and drops removed ones
+    path = str(tmp_path / "index.npz")
+    ExampleIndex(path).sync(EXAMPLES[:3])
+    reloaded = ExampleIndex(path)
+    assert len(reloaded) == 3
+    tokenized = []
+    real_tokenize = retrieval.tokenize
+    monkeypatch.setattr(retrieval, "tokenize", lambda text: tokenized.append(text) or real_tokenize(text))
+    assert reloaded.sync(EXAMPLES[1:]) == 1
+    assert tokenized == [EXAMPLES[3]["text"]]
+    assert [e["text"] for e in ExampleIndex(path).examples] == [e["text"] for e in EXAMPLES[1:]]
+    # Same term counts as an index built from scratch (terms of removed examples are left at zero)
+    fresh = ExampleIndex()
+    fresh.sync(EXAMPLES[1:])
+    totals = reloaded.counts.sum(axis=0)
+    assert np.array_equal(np.sort(totals[totals > 0]), np.sort(fresh.counts.sum(axis=0)))
+
+def test_load_examples_prefers_first_file(tmp_path):
+    # Test that the example bank wins over ground truth for the same text
+    bank, truth = tmp_path / "bank.json", tmp_path / "truth.json"
+    bank.write_text(json.dumps([dict(EXAMPLES[0], reasoning=["Large purchase by the CEO."])]))
+    truth.write_text(json.dumps(EXAMPLES[:2]))
+    examples = load_examples([str(bank), str(truth), str(tmp_path / "missing.json")])
+    assert len(examples) == 2 and examples[0]["reasoning"] == ["Large purchase by the CEO."]
+    assert '"Reasoning": ["Large purchase by the CEO."]' in format_examples(examples[:1])
+
+def test_cot_prompt_uses_retrieved_examples(monkeypatch):
+    # Test that CoT prompts carry the nearest examples instead of the static ones
+    index = ExampleIndex()
+    index.sync(EXAMPLES)
+    monkeypatch.setattr(classify_module, "get_index", lambda: index)
+    prompts = []
+    def llm(prompt, model=None):
+        prompts.append(prompt)
+        return '{"Reasoning": [], "Events": [{"Event Type": "Personnel Change", "Relevant": true}]}'
+    monkeypatch.setattr(classify_module, "run_llama3", llm)
+    monkeypatch.setenv("FEWSHOT_K", "1")
+    events = ["Personnel Change", "Open Market Sale", "Other"]
+    assert classify("The COO resigned.", events, use_cot=True).valid
+    assert EXAMPLES[2]["text"] in prompts[0] and EXAMPLES[0]["text"] not in prompts[0]
+    monkeypatch.setattr(classify_module, "get_index", lambda: None)
+    classify("The COO resigned.", events, use_cot=True)
+    assert len(prompts[1]) > 4 * len(prompts[0])
@@ -0,0 +1,112 @@
+import json
+import pytest
+from classify import classify as classify_module
+from classify import evaluation
+from classify.classify import classify
+from classify.extract import extract_facts
+from classify.rules import compile_rules, rule_output
+from config.config import EventConfig
+
+EVENTS = {
+    "Personnel Change": {"relevant": True, "patterns": [r"\bresign(?:ed|s)?\b", r"\bItem\s+5\.02\b"]},
+    "Automatic Sale under Rule 10b5-1": {"relevant": False, "patterns": [r"\b10b5-1\b"]},
+    "Open Market Sale": {"relevant": True, "relevance_rules": [
+        {"shares_at_least": 10000, "relevant": True},
+        {"shares_below": 1000, "relevant": False},
+    ]},
+    "Other": {"relevant": False},
+}
+
+def no_llm(prompt, model=None):
+    raise AssertionError("the LLM should not be called")
+
+def test_rules_answer_only_unambiguous_text():
+    # Test that exactly one matching event type is an answer and anything else is left to the LLM
+    rules = compile_rules(EVENTS)
+    match = rules.match("Item 5.02 The CFO resigned effective March 1.")
+    assert (match.event_type, match.relevant) == ("Personnel Change", True)
+    assert rules.match("The director sold 500 shares under a Rule 10b5-1 plan.").event_type == "Automatic Sale under Rule 10b5-1"
+    assert rules.match("The CFO resigned and sold shares under a 10b5-1 plan.") is None
+    assert rules.match("A director sold 500 shares in the open market.") is None
+    assert rules.match("The CFO resigned.", ["Open Market Sale", "Other"]) is None
+    assert compile_rules(EVENTS) is rules
+
+def test_classify_short_circuits_on_rule_match(monkeypatch):
+    # Test that a rule match is returned as validated output without an LLM call, in both shapes
+    monkeypatch.setattr(classify_module, "run_llama3", no_llm)
+    rules = compile_rules(EVENTS)
+    result = classify("The COO resigned.", list(EVENTS), rules=rules)
+    assert result.valid and result.source == "rules"
+    assert result.output == [{"Event Type": "Personnel Change", "Relevant": True}]
+    cot = classify("The COO resigned.", list(EVENTS), use_cot=True, rules=rules)
+    assert cot.valid and cot.output == rule_output(rules.match("The COO resigned."), use_cot=True)
+
+def test_classify_sends_ambiguous_text_to_llm(monkeypatch):
+    # Test that unmatched text, and every text with RULES_PRECLASSIFY=off, goes to the LLM
+    calls = []
+    def llm(prompt, model=None):
+        calls.append(prompt)
+        return '[{"Event Type": "Open Market Sale", "Relevant": true}]'
+    monkeypatch.setattr(classify_module, "run_llama3", llm)
+    rules = compile_rules(EVENTS)
+    assert classify("A director sold shares.", list(EVENTS), rules=rules).source == "llm"
+    monkeypatch.setenv("RULES_PRECLASSIFY", "off")
+    assert classify("The COO resigned.", list(EVENTS), rules=rules).source == "llm"
+    assert len(calls) == 2
+
+def test_configured_rules_on_ground_truth():
+    # Test that the shipped patterns short-circuit part of ground truth without wrong answers
+    config = EventConfig()
+    with open("config/ground_truth.json") as f:
+        examples = json.load(f)
+    report = evaluation.rules_report(examples, config.get_event_types(), compile_rules(config.events), compare_llm=False)
+    assert report["short_circuit_rate"] >= 0.25
+    assert report["event_accuracy"] == 1.0 and report["relevance_accuracy"] == 1.0
+
+def test_rules_report_measures_llm_agreement(monkeypatch):
+    # Test that answered examples are re-run through the LLM alone and disagreements are listed
+    monkeypatch.setattr(classify_module, "run_llama3", lambda prompt, model=None: '[{"Event Type": "Personnel Change", "Relevant": false}]')
+    examples = [
+        {"filing_id": "a", "text": "The CFO resigned.", "expected_event": "Personnel Change", "expected_relevance": True},
+        {"filing_id": "b", "text": "A director sold shares.", "expected_event": "Open Market Sale", "expected_relevance": True},
+    ]
+    report = evaluation.rules_report(examples, list(EVENTS), compile_rules(EVENTS), workers=1)
+    assert report["answered"] == 1 and report["short_circuit_rate"] == 0.5
+    assert report["llm_agreement"] == 0.0
+    assert report["disagreements"][0]["llm"] == {"Event Type": "Personnel Change", "Relevant": False}
+
+def test_relevance_rules_decide_by_thresholds():
+    # Test that the first applicable rule decides relevance and that nothing is decided between thresholds
+    rules = compile_rules(EVENTS)
+    assert rules.relevance_for("Open Market Sale", extract_facts("sold 25,000 shares")) is True
+    assert rules.relevance_for("Open Market Sale", extract_facts("sold 500 shares")) is False
+    assert rules.relevance_for("Open Market Sale", extract_facts("sold 5,000 shares")) is None
+    assert rules.relevance_for("Open Market Sale", extract_facts("sold shares")) is None
+    assert rules.relevance_for("Other", extract_facts("sold 500 shares")) is None
+    with pytest.raises(ValueError):
+        compile_rules({"Other": {"relevant": False, "relevance_rules": [{"shares_over": 5, "relevant": True}]}})
+
+def test_relevance_rules_override_llm(monkeypatch):
+    # Test that rules overwrite the LLM's relevance (noting it in CoT reasoning) unless RELEVANCE_RULES=off
+    zero_shot = lambda prompt, model=None: '[{"Event Type": "Open Market Sale", "Relevant": true}]'
+    monkeypatch.setattr(classify_module, "run_llama3", zero_shot)
+    rules = compile_rules(EVENTS)
+    text = "A director sold 500 shares in the open market."
+    result = classify(text, list(EVENTS), rules=rules)
+    assert result.valid and result.output == [{"Event Type": "Open Market Sale", "Relevant": False}]
+    monkeypatch.setattr(classify_module, "run_llama3", lambda prompt, model=None: json.dumps(
+        {"Reasoning": ["A director sold shares."], "Events": [{"Event Type": "Open Market Sale", "Relevant": True}]}))
+    cot = classify(text, list(EVENTS), use_cot=True, rules=rules)
+    assert cot.output["Events"] == [{"Event Type": "Open Market Sale", "Relevant": False}]
+    assert cot.output["Reasoning"][0] == "A director sold shares." and len(cot.output["Reasoning"]) == 2
+    monkeypatch.setattr(classify_module, "run_llama3", zero_shot)
+    monkeypatch.setenv("RELEVANCE_RULES", "off")
+    assert classify(text, list(EVENTS), rules=rules).output == [{"Event Type": "Open Market Sale", "Relevant": True}]
+
+def test_configured_relevance_rules_on_ground_truth():
+    # Test that the shipped relevance rules decide part of ground truth without wrong answers
+    config = EventConfig()
+    with open("config/ground_truth.json") as f:
+        examples = json.load(f)
+    report = evaluation.rules_report(examples, config.get_event_types(), compile_rules(config.events), compare_llm=False)
+    assert report["relevance_decided"] >= 10 and report["relevance_rule_accuracy"] == 1.0
@@ -0,0 +1,46 @@
+from ingestion.segment import segment_8k, substantive_text
+
+FILING = (
+    "UNITED STATES SECURITIES AND EXCHANGE COMMISSION FORM 8-K CURRENT REPORT Apple Inc. "
+    "(Exact name of Registrant as specified in its charter) "
+    "Item 1.01 Entry into a Material Definitive Agreement. The Company entered into a credit agreement. "
+    "Item 2.03 Creation of a Direct Financial Obligation. The information set forth under Item 1.01 "
+    "is incorporated by reference into this Item 2.03. "
+    "Item 5.02 Departure of Directors or Certain Officers. The CFO resigned. "
+    "Item 9.01 Financial Statements and Exhibits. (d) Exhibits 99.1 Press release. "
+    "SIGNATURE Pursuant to the requirements of the Securities Exchange Act of 1934, the registrant "
+    "has duly caused this report to be signed. "
+    "EXHIBIT 99.1 Apple announces CFO transition."
+)
+
+def test_segment_8k_sections_and_offsets():
+    # Test that an 8-K splits into cover, items, signature and exhibit sections with offsets
+    sections = segment_8k(FILING)
+    assert [(s.kind, s.number) for s in sections] == [
+        ("cover", None), ("item", "1.01"), ("item", "2.03"), ("item", "5.02"),
+        ("item", "9.01"), ("signature", None), ("exhibit", "99.1"),
+    ]
+    assert sections[0].start == 0 and sections[-1].end == len(FILING)
+    assert all(a.end == b.start for a, b in zip(sections, sections[1:]))
+    assert sections[3].text(FILING) == "Item 5.02 Departure of Directors or Certain Officers. The CFO resigned."
+
+def test_segment_8k_skips_cross_references():
+    # Test that 'under Item 1.01' and 'this Item 2.03' are not treated as headings
+    numbers = [s.number for s in segment_8k(FILING) if s.kind == "item"]
+    assert numbers.count("1.01") == 1 and numbers.count("2.03") == 1
+
+def test_substantive_text_drops_boilerplate():
+    # Test that only substantive items and press-release exhibits are kept, with item hints
+    text, items = substantive_text(FILING)
+    assert items == ["1.01", "2.03", "5.02"]
+    assert text.startswith("Reported 8-K Items: 1.01 Entry into a Material Definitive Agreement")
+    assert "The CFO resigned." in text
+    assert "Apple announces CFO transition." in text
+    assert "Exact name of Registrant" not in text
+    assert "duly caused this report" not in text
+    assert "Financial Statements and Exhibits" not in text.split("\n\n", 1)[1]
+
+def test_substantive_text_passthrough():
+    # Test that text without Item headings is returned unchanged
+    text = "Apple announced the acquisition of a major AI startup."
+    assert substantive_text(text) == (text, [])
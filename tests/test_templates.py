@@ -0,0 +1,50 @@
+import json
+import pytest
+from classify.templates import CompiledTemplate, RenderedPrompt, get_template
+
+EVENTS = ["Acquisition", "Personnel Change", "Other"]
+
+@pytest.mark.parametrize("name", ["zero_shot.tpl", "cot.tpl"])
+def test_prompt_prefix_is_stable_across_filings(name):
+    # Test that two filings share a byte-identical prefix and only differ in the trailing text
+    template = get_template(name)
+    first = template.render("Apple acquired a startup.", EVENTS)
+    second = template.render("Google's CFO will retire.", EVENTS)
+    assert first.prefix == second.prefix
+    assert first.startswith(first.prefix) and second.startswith(second.prefix)
+    assert first.endswith("Apple acquired a startup.")
+    assert json.dumps(EVENTS) in first.prefix
+
+@pytest.mark.parametrize("name", ["zero_shot.tpl", "cot.tpl"])
+def test_render_matches_str_format(name):
+    # Test that the compiled template renders the same prompt as str.format on the file
+    template = get_template(name)
+    text = "The CEO purchased 10,000 shares {not a placeholder}."
+    assert template.render(text, EVENTS) == template.source.format(text=text, events=json.dumps(EVENTS))
+
+def test_get_template_loads_once():
+    # Test that templates are compiled once and prefixes rendered once per event list
+    assert get_template("cot.tpl") is get_template("cot.tpl")
+    template = get_template("cot.tpl")
+    assert template.prefix(EVENTS) is template.prefix(list(EVENTS))
+
+def test_compiled_template_requires_text_last():
+    # Test that a template with placeholders after {text} is rejected
+    with pytest.raises(ValueError):
+        CompiledTemplate("bad.tpl", "{text}\nEvents: {events}")
+    with pytest.raises(ValueError):
+        get_template("nonexistent.tpl")
+
+def test_rendered_prompt_is_str():
+    # Test that a rendered prompt behaves as a plain string for existing callers
+    prompt = RenderedPrompt("prefix ", "text")
+    assert prompt == "prefix text" and isinstance(prompt, str)
+
+def test_examples_slot_follows_static_prefix():
+    # Test that few-shot examples are rendered after the cached prefix and before the filing text
+    template = get_template("cot_fewshot.tpl")
+    first = template.render("Apple acquired a startup.", EVENTS, examples="Input: \"a\"")
+    second = template.render("The CFO resigned.", EVENTS, examples="Input: \"b\"")
+    assert first.prefix == second.prefix and "{examples}" not in first
+    assert first.index("Input: \"a\"") >= len(first.prefix) and first.endswith("Apple acquired a startup.\n")
+    assert len(get_template("cot_fewshot.tpl").source) < len(get_template("cot.tpl").source) / 5
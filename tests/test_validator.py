@@ -55,4 +55,25 @@ def test_validate_cot_malformed():
     # Test validate_cot with malformed JSON output
     allowed_events = ["Acquisition", "Other"]
     malformed_output = '{"Reasoning": ["Reasoning here"], "Events": [{"Event Type": "Acquisition"}'
-    assert validate_cot(malformed_output, allowed_events) is False 
\ No newline at end of file
+    assert validate_cot(malformed_output, allowed_events) is False 
+
+def test_validate_cot_embedded_in_prose():
+    # Test that a nested CoT object surrounded by prose is extracted whole, not cut at the first '}'
+    from classify.validator import extract_json_block, validate
+    allowed_events = ["Acquisition", "Other"]
+    output = 'Sure! {"Reasoning": ["Step {1}"], "Events": [{"Event Type": "Acquisition", "Relevant": true}, {"Event Type": "Other", "Relevant": false}]} Done.'
+    assert extract_json_block(output).endswith('"Relevant": false}]}')
+    result = validate(output, allowed_events, use_cot=True)
+    assert result.valid is True
+    assert [e["Event Type"] for e in result.events] == ["Acquisition", "Other"]
+
+def test_validate_returns_errors_for_parsed_output():
+    # Test that already-parsed output is validated without re-parsing and reports what is wrong
+    from classify.validator import compile_schema, validate
+    allowed_events = ["Acquisition", "Other"]
+    result = validate([{"Event Type": "Unknown", "Relevant": "yes"}], allowed_events)
+    assert result.valid is False
+    assert len(result.errors) == 2
+    assert result.first_event == {"Event Type": "Unknown", "Relevant": "yes"}
+    assert compile_schema(allowed_events) is compile_schema(list(allowed_events))
+    assert validate("no json here", allowed_events).output is None
@@ -0,0 +1,85 @@
+import threading
+import time
+import pytest
+from sqlalchemy.orm import sessionmaker
+from data import db
+from data.db import make_engine
+from data.migrations import migrate
+from data.models import Result
+from data.writer import ResultWriter
+
+class RecordingInsert:
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, rows):
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append([row["id"] for row in rows])
+
+@pytest.fixture
+def results_db(tmp_path, monkeypatch):
+    engine = make_engine(f"sqlite:///{tmp_path / 'filings.db'}")
+    migrate(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+def test_writer_groups_rows_into_batches():
+    # Test that many queued rows are written in a few transactions of at most batch_size rows
+    insert = RecordingInsert(delay=0.01)
+    writer = ResultWriter(batch_size=50, flush_ms=1000, insert=insert)
+    for i in range(200):
+        writer.submit({"id": f"r{i}"})
+    writer.flush()
+    assert sum(len(b) for b in insert.batches) == 200
+    assert len(insert.batches) <= 6
+    assert max(len(b) for b in insert.batches) <= 50
+
+def test_writer_flushes_after_interval():
+    # Test that a partial batch is written once flush_ms has passed, without an explicit flush
+    insert = RecordingInsert()
+    writer = ResultWriter(batch_size=100, flush_ms=20, insert=insert)
+    future = writer.submit({"id": "only"})
+    future.result(timeout=1)
+    assert insert.batches == [["only"]]
+
+def test_durable_submit_waits_for_commit(results_db):
+    # Test that a durable write is visible in the database as soon as submit returns
+    writer = ResultWriter(batch_size=10, flush_ms=50)
+    writer.submit({"id": "durable", "model_output": []}, durable=True)
+    session = db.Session()
+    assert session.get(Result, "durable") is not None
+    session.close()
+
+def test_writer_isolates_bad_rows(results_db):
+    # Test that a failing row (duplicate id) does not drop the other rows of its batch
+    db.insert_result(id="dup", model_output=[])
+    writer = ResultWriter(batch_size=10, flush_ms=50)
+    futures = [writer.submit({"id": rid, "model_output": []}) for rid in ("a", "dup", "b")]
+    writer.close()
+    assert futures[1].exception() is not None
+    assert futures[0].exception() is None and futures[2].exception() is None
+    assert writer.failed == 1 and writer.rows_written == 2
+    session = db.Session()
+    assert session.query(Result).count() == 3
+    session.close()
+    with pytest.raises(RuntimeError):
+        writer.submit({"id": "late", "model_output": []})
+
+def test_delete_endpoints_flush_queued_rows(results_db, monkeypatch):
+    # Test that deleting right after a result is queued removes it instead of 404ing or letting it reappear
+    from api import routes
+    monkeypatch.setattr(routes, "Session", db.Session)
+    writer = ResultWriter(batch_size=10, flush_ms=60000)
+    monkeypatch.setattr(routes, "get_writer", lambda: writer)
+    writer.submit({"id": "queued", "model_output": []})
+    routes.delete_result("queued")
+    writer.submit({"id": "later", "model_output": []})
+    routes.delete_all_results()
+    session = db.Session()
+    assert session.query(Result).count() == 0
+    session.close()
+    writer.close()
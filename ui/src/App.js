@@ -32,6 +32,21 @@ import ExpandMoreIcon from '@mui/icons-material/ExpandMore';
 import Collapse from '@mui/material/Collapse';
 
 const API_BASE = 'http://localhost:8000';
+// Rows requested per page from /results/all/ and /results/since/
+const RESULTS_PAGE_SIZE = 100;
+
+// One page of stored results, newest first. Pass the previous page's nextCursor for the
+// next (older) page; the first page also returns X-Since-Cursor for polling /results/since/.
+async function fetchResultPage(cursor = null) {
+  const query = `?limit=${RESULTS_PAGE_SIZE}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+  const res = await fetch(`${API_BASE}/results/all/${query}`);
+  if (!res.ok) throw new Error('API error');
+  return {
+    rows: await res.json(),
+    nextCursor: res.headers.get('X-Next-Cursor'),
+    sinceCursor: res.headers.get('X-Since-Cursor') || '',
+  };
+}
 
 const theme = createTheme({
   palette: {
@@ -77,6 +92,8 @@ function App() {
   const [allResults, setAllResults] = useState([]);
   const [allLoading, setAllLoading] = useState(false);
   const [allError, setAllError] = useState('');
+  // Cursor of the next older page of all results; null once every page is loaded
+  const [allNextCursor, setAllNextCursor] = useState(null);
 
   // Accordion state
   const [expanded, setExpanded] = useState('single');
@@ -100,14 +117,35 @@ function App() {
   const [deleteStatus, setDeleteStatus] = useState('');
   const [deleteAllStatus, setDeleteAllStatus] = useState('');
 
-  // Live results auto-refresh
+  // Live results auto-refresh: the newest page once, then only rows stored since the last poll.
+  // Older pages are loaded on demand with "Load More".
   useEffect(() => {
+    let sinceCursor = null;
     const fetchResults = async () => {
       try {
-        const res = await fetch(`${API_BASE}/results/all/`);
-        if (!res.ok) throw new Error('API error');
-        const data = await res.json();
-        setAllResults(data);
+        if (sinceCursor === null) {
+          const { rows, nextCursor, sinceCursor: cursor } = await fetchResultPage();
+          sinceCursor = cursor;
+          setAllResults(rows);
+          setAllNextCursor(nextCursor);
+          return;
+        }
+        let more = true;
+        while (more) {
+          const query = `?limit=${RESULTS_PAGE_SIZE}` + (sinceCursor ? `&cursor=${encodeURIComponent(sinceCursor)}` : '');
+          const res = await fetch(`${API_BASE}/results/since/${query}`);
+          if (!res.ok) throw new Error('API error');
+          const data = await res.json();
+          sinceCursor = res.headers.get('X-Next-Cursor') || sinceCursor;
+          more = data.length === RESULTS_PAGE_SIZE;
+          if (data.length) {
+            setAllResults(prev => {
+              const fresh = data.reverse();
+              const ids = new Set(fresh.map(r => r.id));
+              return [...fresh, ...prev.filter(r => !ids.has(r.id))];
+            });
+          }
+        }
       } catch (err) {
         setAllError('Failed to fetch all results.');
       }
@@ -161,14 +199,25 @@ function App() {
     setBatchSuccess(false);
     try {
       const urls = batchUrls.split('\n').map(u => u.trim()).filter(Boolean);
-      const res = await fetch(`${API_BASE}/batch/`, {
+      // Results are streamed as NDJSON and shown as soon as each filing is done
+      const res = await fetch(`${API_BASE}/batch/stream`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
         body: JSON.stringify({ urls, template: batchTemplate })
       });
       if (!res.ok) throw new Error('API error');
-      const data = await res.json();
-      setBatchResults(data.results || []);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        const records = lines.filter(Boolean).map(line => JSON.parse(line)).filter(r => !r.error);
+        if (records.length) setBatchResults(prev => [...prev, ...records]);
+      }
       setBatchSuccess(true);
     } catch (err) {
       setBatchError('Failed to classify batch.');
@@ -219,10 +268,9 @@ function App() {
     setAllError('');
     setAllResults([]);
     try {
-      const res = await fetch(`${API_BASE}/results/all/`);
-      if (!res.ok) throw new Error('API error');
-      const data = await res.json();
-      setAllResults(data);
+      const { rows, nextCursor } = await fetchResultPage();
+      setAllResults(rows);
+      setAllNextCursor(nextCursor);
     } catch (err) {
       setAllError('Failed to fetch all results.');
     } finally {
@@ -230,6 +278,25 @@ function App() {
     }
   };
 
+  // Append the next older page; rows the delta feed already added are not repeated
+  const handleLoadMoreResults = async () => {
+    if (!allNextCursor) return;
+    setAllLoading(true);
+    setAllError('');
+    try {
+      const { rows, nextCursor } = await fetchResultPage(allNextCursor);
+      setAllResults(prev => {
+        const ids = new Set(prev.map(r => r.id));
+        return [...prev, ...rows.filter(r => !ids.has(r.id))];
+      });
+      setAllNextCursor(nextCursor);
+    } catch (err) {
+      setAllError('Failed to fetch more results.');
+    } finally {
+      setAllLoading(false);
+    }
+  };
+
   // Handlers for toggling
   const handleToggleBatchRow = id => {
     setOpenBatchRows(prev => ({ ...prev, [id]: !prev[id] }));
@@ -260,6 +327,7 @@ function App() {
       const res = await fetch(`${API_BASE}/results/all/`, { method: 'DELETE' });
       if (!res.ok) throw new Error('Delete all failed');
       setAllResults([]);
+      setAllNextCursor(null);
     } catch (err) {
       alert('Failed to delete all results.');
     }
@@ -340,6 +408,7 @@ function App() {
                   <Select value={singleTemplate} onChange={e => setSingleTemplate(e.target.value)} fullWidth>
                     <MenuItem value="zero_shot.tpl">Zero-Shot</MenuItem>
                     <MenuItem value="cot.tpl">Chain-of-Thought</MenuItem>
+                    <MenuItem value="auto">Auto (Zero-Shot, CoT when needed)</MenuItem>
                   </Select>
                   <Button type="submit" variant="contained" color="primary" disabled={singleLoading}>
                     {singleLoading ? <CircularProgress size={24} /> : 'Classify'}
@@ -374,6 +443,7 @@ function App() {
                   <Select value={batchTemplate} onChange={e => setBatchTemplate(e.target.value)} fullWidth>
                     <MenuItem value="zero_shot.tpl">Zero-Shot</MenuItem>
                     <MenuItem value="cot.tpl">Chain-of-Thought</MenuItem>
+                    <MenuItem value="auto">Auto (Zero-Shot, CoT when needed)</MenuItem>
                   </Select>
                   <Button type="submit" variant="contained" color="primary" disabled={batchLoading}>
                     {batchLoading ? <CircularProgress size={24} /> : 'Classify Batch'}
@@ -546,6 +616,13 @@ function App() {
                 </TableBody>
               </Table>
             </TableContainer>
+            {allNextCursor && (
+              <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                <Button variant="outlined" onClick={handleLoadMoreResults} disabled={allLoading}>
+                  {allLoading ? <CircularProgress size={24} /> : 'Load More'}
+                </Button>
+              </Box>
+            )}
           </CardContent>
         </Card>
       </Container>